@@ -0,0 +1,181 @@
+"""
+Benchmark of ctestgen runner overhead on synthetic test trees with stand-in tools.
+
+    python benchmarks/runner_benchmark.py --tests-count 2000 --output benchmark.json
+
+Reports discovery and result writing costs, per-test overhead of the runner
+over the bare tool and scaling of throughput with workers count as JSON.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ctestgen.runner import BasicTestRunner, TestRunResult, TestResultsWriter, find_tests, get_program_response, \
+    get_default_workers_count, Metrics
+
+
+TOOLS = {
+    'true': ['true'],
+    'sleep': ['sh', '-c', 'sleep 0.01', 'sh'],
+    'large_output': ['sh', '-c', 'head -c 1048576 /dev/zero | tr "\\0" a', 'sh']
+}
+
+TREE_SHAPES = ('many_small_dirs', 'few_huge_dirs', 'deep')
+
+
+class BenchmarkTestRunner(BasicTestRunner):
+    def _process_program_response(self, test_dir, test_filename, program_response):
+        return TestRunResult(TestRunResult.ResultType.SUCCESS, program_response[0][:100], test_filename)
+
+
+def generate_tests_tree(base_dir, shape, tests_count):
+    """
+    Creates tests_count small C files in base_dir:
+    many_small_dirs - 5 tests per directory, few_huge_dirs - 2 directories,
+    deep - directories nested 20 levels deep with tests on every level.
+    """
+    if shape == 'many_small_dirs':
+        test_dirs = [os.path.join(base_dir, 'dir_' + str(dir_idx)) for dir_idx in range((tests_count + 4) // 5)]
+    elif shape == 'few_huge_dirs':
+        test_dirs = [os.path.join(base_dir, 'dir_' + str(dir_idx)) for dir_idx in range(2)]
+    elif shape == 'deep':
+        test_dirs = [os.path.join(base_dir, *['level_' + str(level) for level in range(depth + 1)])
+                     for depth in range(20)]
+    else:
+        raise ValueError('Unknown tree shape: ' + shape)
+    for test_dir in test_dirs:
+        os.makedirs(test_dir, exist_ok=True)
+    for test_idx in range(tests_count):
+        test_path = os.path.join(test_dirs[test_idx % len(test_dirs)], 'test_' + str(test_idx) + '.c')
+        with open(test_path, 'w') as test_file:
+            test_file.write('int main() { return ' + str(test_idx % 7) + '; }\n')
+
+
+def measure_discovery(tests_dir, work_dir):
+    index_file_path = os.path.join(work_dir, 'discovery_index.json')
+    start_time = time.perf_counter()
+    tests = find_tests(tests_dir, ['.c'])
+    walk_time = time.perf_counter() - start_time
+    find_tests(tests_dir, ['.c'], index_file_path)
+    start_time = time.perf_counter()
+    find_tests(tests_dir, ['.c'], index_file_path)
+    indexed_time = time.perf_counter() - start_time
+    return {'dirs_count': len(tests), 'tests_count': sum(len(test_filenames) for test_filenames in tests.values()),
+            'scan_time': walk_time, 'indexed_scan_time': indexed_time}
+
+
+def measure_writing(work_dir, results_count, output_size=100):
+    writer_dir = os.path.join(work_dir, 'writer')
+    os.makedirs(writer_dir, exist_ok=True)
+    writer = TestResultsWriter(os.path.join(writer_dir, 'success.txt'), os.path.join(writer_dir, 'fail.txt'),
+                               os.path.join(writer_dir, 'results.json'),
+                               timings_output_file_path=os.path.join(writer_dir, 'timings.jsonl'))
+    metrics = Metrics()
+    test_output = 'a' * output_size
+    start_time = time.perf_counter()
+    for result_idx in range(results_count):
+        test_result = TestRunResult(TestRunResult.ResultType.SUCCESS, test_output, 'test_' + str(result_idx) + '.c',
+                                    duration=0.001)
+        writer.write('tests', test_result)
+        metrics.add_test_result(test_result.result_type, test_result.test_filename)
+    metrics.finish_time = metrics.start_time
+    writer.write_results(metrics)
+    writing_time = time.perf_counter() - start_time
+    return {'results_count': results_count, 'time': writing_time, 'time_per_result': writing_time / results_count}
+
+
+def measure_bare_tool(tool_arguments, test_path, runs_count):
+    start_time = time.perf_counter()
+    for _ in range(runs_count):
+        get_program_response(tool_arguments + [test_path], None)
+    return (time.perf_counter() - start_time) / runs_count
+
+
+def measure_run(tests_dir, work_dir, tool_arguments, workers_count, execution_engine='pool'):
+    runner = BenchmarkTestRunner(tool_arguments, tests_dir, runner_name='benchmark',
+                                 output_base_dir=os.path.join(work_dir, 'runner_output'),
+                                 print_test_info=False, print_run_progress=False, print_global_metrics=False,
+                                 print_testsets_metrics=False, schedule_by_duration=False,
+                                 execution_engine=execution_engine, max_workers=workers_count)
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        runner.run()
+    run_time = time.perf_counter() - start_time
+    tests_count = runner.global_metrics.tests_count
+    return {'workers_count': workers_count, 'execution_engine': execution_engine, 'tests_count': tests_count,
+            'time': run_time, 'tests_per_second': tests_count / run_time}
+
+
+def run_benchmark(tests_count, shapes, tools, workers_counts, execution_engines):
+    benchmark_results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'default_workers_count': get_default_workers_count(),
+        'tests_count': tests_count,
+        'shapes': dict()
+    }
+    work_dir = tempfile.mkdtemp(prefix='ctestgen_benchmark_')
+    try:
+        for shape in shapes:
+            shape_dir = os.path.join(work_dir, shape)
+            tests_dir = os.path.join(shape_dir, 'tests')
+            generate_tests_tree(tests_dir, shape, tests_count)
+            shape_results = {'discovery': measure_discovery(tests_dir, shape_dir),
+                             'writing': measure_writing(shape_dir, tests_count),
+                             'tools': dict()}
+            some_test_dir, some_test_filenames = next(iter(find_tests(tests_dir, ['.c']).items()))
+            some_test_path = os.path.join(some_test_dir, next(iter(some_test_filenames)))
+            for tool in tools:
+                bare_tool_time = measure_bare_tool(TOOLS[tool], some_test_path, min(tests_count, 200))
+                runs = [measure_run(tests_dir, shape_dir, TOOLS[tool], workers_count, execution_engine)
+                        for execution_engine in execution_engines for workers_count in workers_counts]
+                for run in runs:
+                    run['overhead_per_test'] = run['time'] * run['workers_count'] / run['tests_count'] - \
+                                               bare_tool_time
+                    single_worker_runs = [single_worker_run for single_worker_run in runs
+                                          if single_worker_run['workers_count'] == 1 and
+                                          single_worker_run['execution_engine'] == run['execution_engine']]
+                    if len(single_worker_runs) != 0:
+                        run['speedup'] = run['tests_per_second'] / single_worker_runs[0]['tests_per_second']
+                shape_results['tools'][tool] = {'bare_tool_time': bare_tool_time, 'runs': runs}
+            benchmark_results['shapes'][shape] = shape_results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return benchmark_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of ctestgen runner overhead')
+    parser.add_argument('--tests-count', type=int, default=1000)
+    parser.add_argument('--shapes', nargs='+', choices=TREE_SHAPES, default=list(TREE_SHAPES))
+    parser.add_argument('--tools', nargs='+', choices=sorted(TOOLS.keys()), default=sorted(TOOLS.keys()))
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='workers counts, 1 and powers of 2 up to available CPUs by default')
+    parser.add_argument('--engines', nargs='+', choices=BasicTestRunner.EXECUTION_ENGINES, default=['pool'])
+    parser.add_argument('--output', default=None, help='JSON file for results, stdout by default')
+    arguments = parser.parse_args()
+    workers_counts = arguments.workers
+    if workers_counts is None:
+        workers_counts = [1]
+        while workers_counts[-1] * 2 <= get_default_workers_count():
+            workers_counts.append(workers_counts[-1] * 2)
+    benchmark_results = run_benchmark(arguments.tests_count, arguments.shapes, arguments.tools, workers_counts,
+                                      arguments.engines)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(benchmark_results, output_file, indent=2)
+    else:
+        print(json.dumps(benchmark_results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
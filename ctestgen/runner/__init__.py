@@ -1,3 +1,21 @@
 from ctestgen.runner.utils import *
+from ctestgen.runner.workers import get_available_cpus, get_cgroup_cpu_limit, get_default_workers_count, \
+    get_available_memory, pin_process_to_cpu, WorkersThrottle
+from ctestgen.runner.discovery import find_tests, iter_tests, get_file_extension, TestsDiscoveryIndex
+from ctestgen.runner.results_writer import TestResultsWriter
+from ctestgen.runner.journal import TestRunJournal
+from ctestgen.runner.result_cache import TestResultCache, get_file_digest, get_executable_identity
+from ctestgen.runner.distributed import TestCoordinator, run_worker_agent
+from ctestgen.runner.merge_results import merge_results, read_metrics_file, read_results_file
+from ctestgen.runner.duration_history import TestDurationHistory
+from ctestgen.runner.flakiness_history import TestFlakinessHistory
+from ctestgen.runner.progress import RunProgress
+from ctestgen.runner.results_store import TestResultsStore, ResultsDiff
+from ctestgen.runner.failure_clusters import OutputSignatures, FailureClusters, DEFAULT_OUTPUT_SCRUBBERS
 from ctestgen.runner.runner import TestRunner
 from ctestgen.runner.basic_test_runner import BasicTestRunner
+from ctestgen.runner.compiling_test_runner import CompilingTestRunner, find_compiler
+from ctestgen.runner.tool_server import ToolServer, ToolServerCrashed
+from ctestgen.runner.server_test_runner import ServerTestRunner
+from ctestgen.runner.matrix_test_runner import MatrixTestRunner
+from ctestgen.runner.reducer import TestReducer
@@ -0,0 +1,40 @@
+import argparse
+
+from ctestgen.runner import merge_results, TestResultsStore
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m ctestgen.runner')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    merge_parser = subparsers.add_parser('merge', help='merge results.json and metrics.txt of several runs')
+    merge_parser.add_argument('merged_output_dir')
+    merge_parser.add_argument('output_dirs', nargs='+')
+    diff_parser = subparsers.add_parser('diff', help='compare results of two runs in results store')
+    diff_parser.add_argument('results_store_path')
+    diff_parser.add_argument('run_a')
+    diff_parser.add_argument('run_b')
+    diff_parser.add_argument('--slowdown-ratio', type=float, default=1.5)
+    diff_parser.add_argument('--min-slowdown', type=float, default=0.1)
+    arguments = parser.parse_args()
+    if arguments.command == 'merge':
+        _, merged_global_metrics = merge_results(arguments.output_dirs, arguments.merged_output_dir)
+        print('Global:\n' + str(merged_global_metrics))
+    elif arguments.command == 'diff':
+        results_store = TestResultsStore(arguments.results_store_path)
+        results_diff = results_store.diff(arguments.run_a, arguments.run_b,
+                                          arguments.slowdown_ratio, arguments.min_slowdown)
+        results_store.close()
+        print('Newly failing: ' + str(len(results_diff.newly_failing)))
+        for test_key in results_diff.newly_failing:
+            print('  ' + test_key)
+        print('Newly passing: ' + str(len(results_diff.newly_passing)))
+        for test_key in results_diff.newly_passing:
+            print('  ' + test_key)
+        print('Slowed down: ' + str(len(results_diff.slowed_down)))
+        for test_key, duration_a, duration_b in results_diff.slowed_down:
+            print('  %s %.3fs -> %.3fs' % (test_key, duration_a, duration_b))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,65 @@
 import os
+import sys
+import asyncio
+import itertools
+import time
 from abc import abstractmethod
-from ctestgen.runner import TestRunner, get_program_response, \
-    find_environment_variables, TestRunResult
+from ctestgen.runner import TestRunner, get_program_response, get_program_response_async, \
+    find_environment_variables, TestRunResult, ProgramLimitExceeded, \
+    TestResultCache, get_executable_identity, get_test_key
+from ctestgen.runner.runner import _run_worker_method
 
 
 class BasicTestRunner(TestRunner):
-    def __init__(self, run_arguments, *args, print_test_info=True, **kwargs):
+    EXECUTION_ENGINES = ('pool', 'asyncio')
+
+    def __init__(self, run_arguments, *args, print_test_info=True, execution_engine='pool', batch_size=1,
+                 timeout=None, cpu_time_limit=None, memory_limit=None,
+                 result_cache_dir=None, result_cache_max_size=1024 * 1024 * 1024,
+                 result_cache_env_variables=(), invalidate_result_cache=False, output_capture_limit=None,
+                 **kwargs):
         super().__init__(*args, **kwargs)
+        if execution_engine not in BasicTestRunner.EXECUTION_ENGINES:
+            raise ValueError('Unknown execution engine: ' + str(execution_engine))
         self.run_arguments = run_arguments
         self.print_test_info = print_test_info
+        self.execution_engine = execution_engine
+        if batch_size > 1 and \
+                type(self)._process_batch_program_response is BasicTestRunner._process_batch_program_response:
+            raise ValueError('Batched runs require _process_batch_program_response to be overridden')
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit = memory_limit
+        self.result_cache = TestResultCache(result_cache_dir, result_cache_max_size) \
+            if result_cache_dir is not None else None
+        self.result_cache_env_variables = result_cache_env_variables
+        self.invalidate_result_cache = invalidate_result_cache
+        self.output_capture_limit = output_capture_limit
+        self._tool_identity = None
+        self._skip_cached_results = False
+
+    def _start_run(self, tests, order_tests=True):
+        if self.result_cache is not None and self.invalidate_result_cache:
+            self.result_cache.clear()
+        return super()._start_run(tests, order_tests)
+
+    def _finish_run(self, tests, remaining_tests_counts):
+        super()._finish_run(tests, remaining_tests_counts)
+        if self.result_cache is not None:
+            self.result_cache.evict()
+
+    def _retry_tests(self, retried_tests, remaining_tests_counts, env):
+        # Retried tests are run again, their cached results are not used
+        self._skip_cached_results = True
+        try:
+            return super()._retry_tests(retried_tests, remaining_tests_counts, env)
+        finally:
+            self._skip_cached_results = False
+
+    def _on_final_test_result(self, test_dir, test_result, remaining_tests_counts):
+        self._cache_test_result(test_result.result_cache_key, test_result)
+        return super()._on_final_test_result(test_dir, test_result, remaining_tests_counts)
 
     def _get_env(self):
         return find_environment_variables()
@@ -17,8 +68,303 @@ class BasicTestRunner(TestRunner):
     def _process_program_response(self, test_dir, test_filename, program_response) -> TestRunResult:
         pass
 
+    def _process_batch_program_response(self, test_dir, test_filenames, program_response):
+        """
+        Splits response of the program, that was run with several test files at once,
+        into list of TestRunResult for every test filename.
+        Returning None means that the batch failed as a whole,
+        and its tests are run one by one.
+        """
+        return None
+
+    def _get_tool_executable(self):
+        return self.run_arguments[0]
+
+    def _get_test_arguments(self, test_dir, test_filename):
+        return self.run_arguments + [os.path.join(test_dir, test_filename)]
+
+    def _get_batch_arguments(self, test_dir, test_filenames):
+        return self.run_arguments + [os.path.join(test_dir, test_filename) for test_filename in test_filenames]
+
+    def _get_output_spill_path(self, test_dir, test_filename):
+        """
+        Returns path prefix of files with full outputs of test, that are cut by output_capture_limit,
+        outputs of retries get their own files.
+        """
+        if self.output_capture_limit is None or self.output_dir is None:
+            return None
+        output_spill_path = os.path.join(self.output_dir, 'outputs',
+                                         get_test_key(self.test_base_dir, test_dir, test_filename))
+        if self._attempt != 0:
+            output_spill_path += '.attempt_' + str(self._attempt + 1)
+        return output_spill_path
+
+    def _get_result_cache_key(self, test_dir, test_filename, env):
+        """
+        Key of test result in cache, depends on test file contents, program arguments,
+        selected environment variables, identity of the tool executable and run limits.
+        """
+        if self._tool_identity is None:
+            self._tool_identity = get_executable_identity(self._get_tool_executable(), env)
+        env = env or dict()
+        key_parts = [
+            self.__class__.__module__ + '.' + self.__class__.__qualname__,
+            self._get_test_arguments(test_dir, test_filename),
+            {variable: env.get(variable) for variable in self.result_cache_env_variables},
+            self._tool_identity,
+            [self.timeout, self.cpu_time_limit, self.memory_limit]
+        ]
+        return TestResultCache.make_key(os.path.join(test_dir, test_filename), key_parts)
+
+    def _get_cached_test_result(self, test_dir, test_filename, env):
+        """
+        Returns cache key of test and its cached result, if it exists and the test is not retried.
+        """
+        if self.result_cache is None:
+            return None, None
+        result_cache_key = self._get_result_cache_key(test_dir, test_filename, env)
+        if self._skip_cached_results:
+            return result_cache_key, None
+        return result_cache_key, self.result_cache.get(result_cache_key, test_filename)
+
+    def _cache_test_result(self, result_cache_key, test_result):
+        """
+        Caches final result of test, after its last attempt, in the main process.
+        """
+        if result_cache_key is not None and \
+                test_result.result_type in (TestRunResult.ResultType.SUCCESS, TestRunResult.ResultType.FAIL):
+            self.result_cache.put(result_cache_key, test_result)
+
+    @staticmethod
+    def _get_limit_exceeded_result(test_filename, limit_exceeded):
+        return TestRunResult(limit_exceeded.result_type,
+                             str(limit_exceeded) + '\n' + limit_exceeded.stdout + limit_exceeded.stderr,
+                             test_filename)
+
     def _on_test(self, test_dir, test_filename, env):
         if self.print_test_info:
             print(test_filename)
-        program_response = get_program_response(self.run_arguments + [os.path.join(test_dir, test_filename)], env)
-        return self._process_program_response(test_dir, test_filename, program_response)
+        result_cache_key, test_result = self._get_cached_test_result(test_dir, test_filename, env)
+        if test_result is not None:
+            return test_result
+        test_result = self._run_test(test_dir, test_filename, env)
+        test_result.result_cache_key = result_cache_key
+        return test_result
+
+    def _get_test_result(self, test_dir, test_filename, program_response):
+        """
+        Returns result of processed program response, that keeps path of full output of the test,
+        if the output was cut.
+        """
+        test_result = self._process_program_response(test_dir, test_filename, program_response)
+        stdout_file_path, stderr_file_path = program_response.output_file_paths
+        test_result.output_file_path = stdout_file_path if stdout_file_path is not None else stderr_file_path
+        return test_result
+
+    def _run_test(self, test_dir, test_filename, env):
+        start_time = time.perf_counter()
+        try:
+            program_response = get_program_response(self._get_test_arguments(test_dir, test_filename), env,
+                                                    timeout=self.timeout,
+                                                    cpu_time_limit=self.cpu_time_limit,
+                                                    memory_limit=self.memory_limit,
+                                                    output_limit=self.output_capture_limit,
+                                                    output_spill_path=self._get_output_spill_path(test_dir,
+                                                                                                  test_filename))
+        except ProgramLimitExceeded as limit_exceeded:
+            return self._get_limit_exceeded_result(test_filename, limit_exceeded) \
+                .set_resource_usage(time.perf_counter() - start_time, limit_exceeded.resource_usage)
+        duration = time.perf_counter() - start_time
+        return self._get_test_result(test_dir, test_filename, program_response) \
+            .set_resource_usage(duration, program_response.resource_usage)
+
+    def _get_test_batches(self, scheduled_tests):
+        """
+        Groups tests of every directory in batches of batch_size,
+        batches follow the order of their first tests.
+        """
+        pending_batches = dict()
+        for test_dir, test_filename in scheduled_tests:
+            batch = pending_batches.setdefault(test_dir, [])
+            batch.append(test_filename)
+            if len(batch) == self.batch_size:
+                yield test_dir, pending_batches.pop(test_dir)
+        for test_dir, batch in pending_batches.items():
+            yield test_dir, batch
+
+    def _get_batch_timeout(self, test_filenames):
+        return self.timeout * len(test_filenames) if self.timeout is not None else None
+
+    def _check_batch_results(self, test_filenames, batch_results):
+        if batch_results is None or len(batch_results) != len(test_filenames):
+            return None
+        if sorted(test_result.test_filename for test_result in batch_results) != sorted(test_filenames):
+            return None
+        return batch_results
+
+    @staticmethod
+    def _share_batch_resource_usage(batch_results, duration, resource_usage):
+        """
+        Sets equal shares of batch duration and resource usage to its tests.
+        """
+        if batch_results is None:
+            return
+        batch_size = len(batch_results)
+        if resource_usage is not None:
+            resource_usage = {'user_time': resource_usage['user_time'] / batch_size,
+                              'system_time': resource_usage['system_time'] / batch_size,
+                              'max_rss': resource_usage['max_rss']}
+        for test_result in batch_results:
+            test_result.set_resource_usage(duration / batch_size, resource_usage)
+
+    def _get_cached_batch_results(self, test_dir, test_filenames, env):
+        """
+        Returns cached results of the batch tests and cache keys of the rest of them.
+        """
+        if self.print_test_info:
+            print(' '.join(test_filenames))
+        test_results = []
+        batch_cache_keys = dict()
+        for test_filename in test_filenames:
+            result_cache_key, test_result = self._get_cached_test_result(test_dir, test_filename, env)
+            if test_result is not None:
+                test_results.append(test_result)
+            else:
+                batch_cache_keys[test_filename] = result_cache_key
+        return test_results, batch_cache_keys
+
+    def _on_tests_batch(self, test_dir, test_filenames, env):
+        """
+        Runs program once for all not cached tests of the batch,
+        falls back to single runs if the batch fails.
+        Returns list of (test_dir, test_result) pairs.
+        """
+        test_results, batch_cache_keys = self._get_cached_batch_results(test_dir, test_filenames, env)
+        batch_filenames = list(batch_cache_keys.keys())
+        batch_results = None
+        if len(batch_filenames) > 1:
+            start_time = time.perf_counter()
+            try:
+                program_response = get_program_response(self._get_batch_arguments(test_dir, batch_filenames), env,
+                                                        timeout=self._get_batch_timeout(batch_filenames),
+                                                        cpu_time_limit=self.cpu_time_limit,
+                                                        memory_limit=self.memory_limit)
+            except ProgramLimitExceeded:
+                pass
+            else:
+                duration = time.perf_counter() - start_time
+                batch_results = self._check_batch_results(
+                    batch_filenames, self._process_batch_program_response(test_dir, batch_filenames, program_response))
+                self._share_batch_resource_usage(batch_results, duration, program_response.resource_usage)
+        if batch_results is None:
+            batch_results = [self._run_test(test_dir, test_filename, env) for test_filename in batch_filenames]
+        for test_result in batch_results:
+            test_result.result_cache_key = batch_cache_keys[test_result.test_filename]
+        test_results += batch_results
+        return [(test_dir, test_result) for test_result in test_results]
+
+    async def _on_test_async(self, test_dir, test_filename, env):
+        if self.print_test_info:
+            print(test_filename)
+        start_time = time.perf_counter()
+        result_cache_key, test_result = self._get_cached_test_result(test_dir, test_filename, env)
+        if test_result is not None:
+            test_result.duration = time.perf_counter() - start_time
+        else:
+            test_result = await self._run_test_async(test_dir, test_filename, env)
+            test_result.result_cache_key = result_cache_key
+        return test_dir, test_result
+
+    async def _run_test_async(self, test_dir, test_filename, env):
+        start_time = time.perf_counter()
+        try:
+            program_response = await get_program_response_async(
+                self._get_test_arguments(test_dir, test_filename), env,
+                timeout=self.timeout, cpu_time_limit=self.cpu_time_limit, memory_limit=self.memory_limit,
+                output_limit=self.output_capture_limit,
+                output_spill_path=self._get_output_spill_path(test_dir, test_filename))
+        except ProgramLimitExceeded as limit_exceeded:
+            return self._get_limit_exceeded_result(test_filename, limit_exceeded) \
+                .set_resource_usage(time.perf_counter() - start_time)
+        duration = time.perf_counter() - start_time
+        return self._get_test_result(test_dir, test_filename, program_response).set_resource_usage(duration)
+
+    async def _on_tests_batch_async(self, test_dir, test_filenames, env):
+        """
+        Coroutine version of _on_tests_batch.
+        """
+        test_results, batch_cache_keys = self._get_cached_batch_results(test_dir, test_filenames, env)
+        batch_filenames = list(batch_cache_keys.keys())
+        batch_results = None
+        if len(batch_filenames) > 1:
+            start_time = time.perf_counter()
+            try:
+                program_response = await get_program_response_async(
+                    self._get_batch_arguments(test_dir, batch_filenames), env,
+                    timeout=self._get_batch_timeout(batch_filenames),
+                    cpu_time_limit=self.cpu_time_limit, memory_limit=self.memory_limit)
+            except ProgramLimitExceeded:
+                pass
+            else:
+                duration = time.perf_counter() - start_time
+                batch_results = self._check_batch_results(
+                    batch_filenames, self._process_batch_program_response(test_dir, batch_filenames, program_response))
+                self._share_batch_resource_usage(batch_results, duration, None)
+        if batch_results is None:
+            batch_results = [await self._run_test_async(test_dir, test_filename, env)
+                             for test_filename in batch_filenames]
+        for test_result in batch_results:
+            test_result.result_cache_key = batch_cache_keys[test_result.test_filename]
+        test_results += batch_results
+        return [(test_dir, test_result) for test_result in test_results]
+
+    def _run_tests(self, scheduled_tests, env):
+        if self.batch_size > 1:
+            return self._run_test_batches(scheduled_tests, env)
+        if self.execution_engine == 'asyncio':
+            return self._run_coroutines(self._on_test_async(test_dir, test_filename, env)
+                                        for test_dir, test_filename in scheduled_tests)
+        return super()._run_tests(scheduled_tests, env)
+
+    def _run_test_batches(self, scheduled_tests, env):
+        test_batches = self._get_test_batches(scheduled_tests)
+        if self.execution_engine == 'asyncio':
+            batches_results = self._run_coroutines(self._on_tests_batch_async(test_dir, test_filenames, env)
+                                                   for test_dir, test_filenames in test_batches)
+        else:
+            batches_results = self._run_in_pool(_run_worker_method,
+                                                (('_on_tests_batch', test_batch) for test_batch in test_batches), env)
+        for batch_results in batches_results:
+            yield from batch_results
+
+    def _run_coroutines(self, coroutines, workers_count=None):
+        """
+        Runs tool processes directly from the event loop of this process,
+        no more than workers count of coroutines at once, responses are processed here too.
+        Yields results of coroutines in order of completion.
+        """
+        workers_count = workers_count if workers_count is not None else self._get_workers_count()
+        print("Using asyncio engine with " + str(workers_count) + " concurrent processes")
+        workers_throttle = self._create_workers_throttle(workers_count)
+        loop = asyncio.ProactorEventLoop() if sys.platform == 'win32' else asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        coroutines = iter(coroutines)
+        pending_tasks = set()
+        try:
+            while True:
+                tasks_limit = workers_throttle.get_limit() if workers_throttle is not None else workers_count
+                for coroutine in itertools.islice(coroutines, max(0, tasks_limit - len(pending_tasks))):
+                    pending_tasks.add(loop.create_task(coroutine))
+                if len(pending_tasks) == 0:
+                    break
+                done_tasks, pending_tasks = loop.run_until_complete(
+                    asyncio.wait(pending_tasks, return_when=asyncio.FIRST_COMPLETED))
+                for task in done_tasks:
+                    yield task.result()
+        finally:
+            for task in pending_tasks:
+                task.cancel()
+            if len(pending_tasks) != 0:
+                loop.run_until_complete(asyncio.wait(pending_tasks))
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,173 @@
+import os
+import sys
+import asyncio
+import shutil
+import uuid
+from ctestgen.runner import BasicTestRunner, TestRunResult, TestResultCache, get_program_response, \
+    get_program_response_async, get_executable_identity, ProgramLimitExceeded
+from ctestgen.runner.utils import _get_safe_filename
+
+
+def find_compiler(env=None):
+    """
+    Returns compiler from CC environment variable, or cc, or gcc, that is found in PATH.
+    """
+    env = env if env is not None else os.environ
+    if env.get('CC'):
+        return env['CC']
+    for compiler in ('cc', 'gcc'):
+        if shutil.which(compiler, path=env.get('PATH')) is not None:
+            return compiler
+    return 'cc'
+
+
+class CompilingTestRunner(BasicTestRunner):
+    """
+    Compiles every test with compiler and runs the compiled program
+    with run_arguments, the program response is passed to _process_program_response.
+    With asyncio engine compilation and execution are separate stages
+    with their own limits of concurrent processes, so they overlap.
+    Compiled programs are cached in object_cache_dir by test contents,
+    compiler and its flags.
+    """
+    def __init__(self, *args, compiler=None, compiler_flags=None, run_arguments=None,
+                 execution_engine='asyncio', compile_workers_count=None, run_workers_count=None,
+                 compile_timeout=None, object_cache_dir=None, object_cache_max_size=1024 * 1024 * 1024,
+                 **kwargs):
+        if kwargs.get('batch_size', 1) > 1:
+            raise ValueError('Compiled tests can not be run in batches')
+        super().__init__(run_arguments if run_arguments is not None else [], *args,
+                         execution_engine=execution_engine, **kwargs)
+        self.compiler = compiler if compiler is not None else find_compiler()
+        self.compiler_flags = compiler_flags if compiler_flags is not None else ['-w']
+        self.compile_workers_count = compile_workers_count
+        self.run_workers_count = run_workers_count
+        self.compile_timeout = compile_timeout
+        self.object_cache_dir = object_cache_dir if object_cache_dir is not None \
+            else os.path.join(self.output_base_dir, _get_safe_filename(self.runner_name) + '_objects')
+        self.object_cache_max_size = object_cache_max_size
+        self._compiler_identity = None
+        self._compile_semaphore = None
+        self._run_semaphore = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_compile_semaphore'] = None
+        state['_run_semaphore'] = None
+        return state
+
+    def _finish_run(self, tests, remaining_tests_counts):
+        super()._finish_run(tests, remaining_tests_counts)
+        TestResultCache(self.object_cache_dir, self.object_cache_max_size).evict()
+
+    def _get_tool_executable(self):
+        return self.compiler
+
+    def _get_compile_arguments(self, test_dir, test_filename, object_path):
+        return [self.compiler] + self.compiler_flags + [os.path.join(test_dir, test_filename), '-o', object_path]
+
+    def _get_object_path(self, test_dir, test_filename):
+        """
+        Returns path of compiled test in object cache, that depends on test contents,
+        identity of the compiler and its flags.
+        """
+        if self._compiler_identity is None:
+            self._compiler_identity = get_executable_identity(self.compiler)
+        object_key = TestResultCache.make_key(os.path.join(test_dir, test_filename),
+                                              [self._compiler_identity, self.compiler_flags])
+        object_path = os.path.join(self.object_cache_dir, object_key[:2], object_key)
+        if sys.platform == 'win32':
+            object_path += '.exe'
+        return object_path
+
+    def _get_test_arguments(self, test_dir, test_filename):
+        return [os.path.abspath(self._get_object_path(test_dir, test_filename))] + self.run_arguments
+
+    def _process_compilation_response(self, test_dir, test_filename, program_response):
+        """
+        Returns TestRunResult for test, that was not compiled.
+        """
+        return TestRunResult(TestRunResult.ResultType.FAIL,
+                             'Compilation failed\n' + program_response[0] + program_response[1], test_filename)
+
+    def _prepare_compilation(self, test_dir, test_filename):
+        """
+        Returns object path and temporary path to compile test to,
+        or None instead of the latter, if test is already compiled.
+        """
+        object_path = self._get_object_path(test_dir, test_filename)
+        if os.path.exists(object_path):
+            os.utime(object_path)
+            return object_path, None
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        return object_path, object_path + '.' + uuid.uuid4().hex + '.tmp'
+
+    def _finish_compilation(self, test_dir, test_filename, object_path, temp_object_path, program_response):
+        if program_response.returncode != 0:
+            if os.path.exists(temp_object_path):
+                os.remove(temp_object_path)
+            return self._process_compilation_response(test_dir, test_filename, program_response)
+        os.replace(temp_object_path, object_path)
+        return None
+
+    def _compile_test(self, test_dir, test_filename, env):
+        """
+        Returns TestRunResult, if test was not compiled, otherwise None.
+        """
+        object_path, temp_object_path = self._prepare_compilation(test_dir, test_filename)
+        if temp_object_path is None:
+            return None
+        try:
+            program_response = get_program_response(
+                self._get_compile_arguments(test_dir, test_filename, temp_object_path), env,
+                timeout=self.compile_timeout)
+        except ProgramLimitExceeded as limit_exceeded:
+            return self._get_limit_exceeded_result(test_filename, limit_exceeded)
+        return self._finish_compilation(test_dir, test_filename, object_path, temp_object_path, program_response)
+
+    async def _compile_test_async(self, test_dir, test_filename, env):
+        object_path, temp_object_path = self._prepare_compilation(test_dir, test_filename)
+        if temp_object_path is None:
+            return None
+        try:
+            program_response = await get_program_response_async(
+                self._get_compile_arguments(test_dir, test_filename, temp_object_path), env,
+                timeout=self.compile_timeout)
+        except ProgramLimitExceeded as limit_exceeded:
+            return self._get_limit_exceeded_result(test_filename, limit_exceeded)
+        return self._finish_compilation(test_dir, test_filename, object_path, temp_object_path, program_response)
+
+    def _run_test(self, test_dir, test_filename, env):
+        compilation_result = self._compile_test(test_dir, test_filename, env)
+        if compilation_result is not None:
+            return compilation_result
+        return super()._run_test(test_dir, test_filename, env)
+
+    async def _run_test_async(self, test_dir, test_filename, env):
+        async with self._compile_semaphore:
+            compilation_result = await self._compile_test_async(test_dir, test_filename, env)
+        if compilation_result is not None:
+            return compilation_result
+        async with self._run_semaphore:
+            return await super()._run_test_async(test_dir, test_filename, env)
+
+    async def _on_pipeline_test_async(self, test_dir, test_filename, env, compile_workers_count, run_workers_count):
+        if self._compile_semaphore is None:
+            self._compile_semaphore = asyncio.Semaphore(compile_workers_count)
+            self._run_semaphore = asyncio.Semaphore(run_workers_count)
+        return await self._on_test_async(test_dir, test_filename, env)
+
+    def _run_tests(self, scheduled_tests, env):
+        if self.execution_engine != 'asyncio':
+            return super()._run_tests(scheduled_tests, env)
+        workers_count = self._get_workers_count()
+        compile_workers_count = self.compile_workers_count or workers_count
+        run_workers_count = self.run_workers_count or workers_count
+        print("Compiling with " + str(compile_workers_count) + " and running with " +
+              str(run_workers_count) + " concurrent processes")
+        self._compile_semaphore = None
+        self._run_semaphore = None
+        return self._run_coroutines((self._on_pipeline_test_async(test_dir, test_filename, env,
+                                                                  compile_workers_count, run_workers_count)
+                                     for test_dir, test_filename in scheduled_tests),
+                                    compile_workers_count + run_workers_count)
@@ -0,0 +1,139 @@
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_file_extension(filename):
+    """
+    Returns all suffixes of filename, the same as ''.join(pathlib.Path(filename).suffixes).
+    """
+    if filename.endswith('.'):
+        return ''
+    filename = filename.lstrip('.')
+    extension_start = filename.find('.')
+    return filename[extension_start:] if extension_start != -1 else ''
+
+
+class TestsDiscoveryIndex:
+    """
+    Test filenames and subdirectories of every directory of the tests tree,
+    keyed by directory modification time, that changes when its entries change.
+    Only directories with changed modification time are scanned again.
+    """
+    def __init__(self, index_file_path, test_filename_extensions):
+        self.index_file_path = index_file_path
+        self.test_filename_extensions = sorted(test_filename_extensions)
+        self.dirs = dict()
+        self._updated_dirs = dict()
+
+    def load(self):
+        if self.index_file_path is not None and os.path.exists(self.index_file_path):
+            with open(self.index_file_path, 'r') as index_file:
+                index = json.load(index_file)
+            if index.get('test_filename_extensions') == self.test_filename_extensions:
+                self.dirs = index['dirs']
+        return self
+
+    def save(self):
+        """
+        Saves directories, that were scanned or looked up since loading.
+        """
+        if self.index_file_path is None:
+            return
+        index_dir = os.path.dirname(self.index_file_path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        temp_index_file_path = self.index_file_path + '.tmp'
+        with open(temp_index_file_path, 'w') as index_file:
+            json.dump({'test_filename_extensions': self.test_filename_extensions, 'dirs': self._updated_dirs},
+                      index_file)
+        os.replace(temp_index_file_path, self.index_file_path)
+
+    def scan_dir(self, dir_path):
+        """
+        Returns test filenames and subdirectory names of directory.
+        """
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return [], []
+        dir_entry = self.dirs.get(dir_path)
+        if dir_entry is None or dir_entry[0] != dir_mtime:
+            test_filenames = []
+            subdir_names = []
+            try:
+                with os.scandir(dir_path) as dir_entries:
+                    for entry in dir_entries:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            if not entry.is_symlink():
+                                subdir_names.append(entry.name)
+                        elif get_file_extension(entry.name) in self.test_filename_extensions:
+                            test_filenames.append(entry.name)
+            except OSError:
+                return [], []
+            dir_entry = [dir_mtime, test_filenames, subdir_names]
+        self._updated_dirs[dir_path] = dir_entry
+        return dir_entry[1], dir_entry[2]
+
+
+def _walk_tests_subtree(root_dir, discovery_index, discovered_tests, stop_event):
+    try:
+        dirs_stack = [root_dir]
+        while len(dirs_stack) != 0 and not stop_event.is_set():
+            dir_path = dirs_stack.pop()
+            test_filenames, subdir_names = discovery_index.scan_dir(dir_path)
+            if len(test_filenames) != 0:
+                discovered_tests.put((dir_path, set(test_filenames)))
+            dirs_stack += [os.path.join(dir_path, subdir_name) for subdir_name in reversed(subdir_names)]
+    finally:
+        discovered_tests.put(None)
+
+
+def iter_tests(base_dir, test_filename_extensions, index_file_path=None, workers_count=8):
+    """
+    Yields pairs of directory and set of test filenames from it as they are found.
+    Top level subtrees of base_dir are scanned in parallel threads.
+    If index_file_path is given, discovery index is loaded from it and saved to it,
+    so directories, that were not changed since previous discovery, are not scanned.
+    If the generator is closed before the whole tree is walked, walking threads stop,
+    and only directories, that were scanned, are saved to the index.
+    """
+    discovery_index = TestsDiscoveryIndex(index_file_path, test_filename_extensions).load()
+    stop_event = threading.Event()
+    try:
+        test_filenames, subdir_names = discovery_index.scan_dir(base_dir)
+        if len(test_filenames) != 0:
+            yield base_dir, set(test_filenames)
+        discovered_tests = queue.Queue()
+        with ThreadPoolExecutor(max(1, workers_count)) as executor:
+            try:
+                walk_futures = [executor.submit(_walk_tests_subtree, os.path.join(base_dir, subdir_name),
+                                                discovery_index, discovered_tests, stop_event)
+                                for subdir_name in subdir_names]
+                walking_subtrees_count = len(walk_futures)
+                while walking_subtrees_count != 0:
+                    discovered_test_dir = discovered_tests.get()
+                    if discovered_test_dir is None:
+                        walking_subtrees_count -= 1
+                    else:
+                        yield discovered_test_dir
+                for walk_future in walk_futures:
+                    walk_future.result()
+            finally:
+                stop_event.set()
+    finally:
+        discovery_index.save()
+
+
+def find_tests(base_dir, test_filename_extensions, index_file_path=None, workers_count=8):
+    """
+    Returns dictionary that collects pairs of
+    directory and test filenames from it.
+    """
+    return dict(iter_tests(base_dir, test_filename_extensions, index_file_path, workers_count))
@@ -0,0 +1,189 @@
+import collections
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from ctestgen.runner import run_timed_test
+from ctestgen.runner.utils import _encode_test_result, _decode_test_result
+
+
+def _send_message(output_file, message):
+    output_file.write(json.dumps(message).encode() + b'\n')
+    output_file.flush()
+
+
+def _receive_message(input_file):
+    line = input_file.readline()
+    if not line:
+        return None
+    return json.loads(line.decode())
+
+
+class _CoordinatorRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        connection_id = id(self)
+        try:
+            while True:
+                message = _receive_message(self.rfile)
+                if message is None:
+                    break
+                if message['type'] == 'get':
+                    _send_message(self.wfile, coordinator._lease_test(connection_id))
+                elif message['type'] == 'result':
+                    coordinator._complete_test(message['id'], _decode_test_result(message['result']))
+                    _send_message(self.wfile, {'type': 'ack'})
+        except (OSError, ValueError):
+            pass
+        finally:
+            coordinator._release_tests(connection_id)
+
+
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class TestCoordinator:
+    """
+    Serves tests over TCP to worker agents, that run them and send results back.
+    Every served test is leased to the agent, if it is not completed in lease_timeout seconds
+    or the agent disconnects, the test is served again. Late results of served again tests are ignored.
+    Messages are JSON lines, no authentication is done, so it must be used in trusted networks only.
+    """
+    def __init__(self, address, scheduled_tests, test_base_dir, lease_timeout=600):
+        self.lease_timeout = lease_timeout
+        self._tests = [(test_dir, os.path.relpath(test_dir, test_base_dir), test_filename)
+                       for test_dir, test_filename in scheduled_tests]
+        self._pending_tests = collections.deque(range(len(self._tests)))
+        self._leases = dict()
+        self._completed_tests = bytearray(len(self._tests))
+        self._completed_count = 0
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._server = _CoordinatorServer(address, _CoordinatorRequestHandler)
+        self._server.coordinator = self
+        self._server_thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def results(self):
+        """
+        Yields (test_dir, test_result) pairs as results are received,
+        until all tests are completed.
+        """
+        received_count = 0
+        while received_count < len(self._tests):
+            try:
+                test_result = self._results.get(timeout=1)
+            except queue.Empty:
+                self._release_expired_tests()
+                continue
+            received_count += 1
+            yield test_result
+
+    def _lease_test(self, connection_id):
+        with self._lock:
+            while len(self._pending_tests) != 0:
+                test_id = self._pending_tests.popleft()
+                if self._completed_tests[test_id]:
+                    continue
+                self._leases[test_id] = (time.monotonic() + self.lease_timeout, connection_id)
+                _, test_rel_dir, test_filename = self._tests[test_id]
+                return {'type': 'test', 'id': test_id, 'test_dir': test_rel_dir, 'test_filename': test_filename}
+            if self._completed_count == len(self._tests):
+                return {'type': 'done'}
+            return {'type': 'wait'}
+
+    def _complete_test(self, test_id, test_result):
+        with self._lock:
+            self._leases.pop(test_id, None)
+            if self._completed_tests[test_id]:
+                return
+            self._completed_tests[test_id] = 1
+            self._completed_count += 1
+        self._results.put((self._tests[test_id][0], test_result))
+
+    def _release_tests(self, connection_id):
+        with self._lock:
+            for test_id, (_, lease_connection_id) in list(self._leases.items()):
+                if lease_connection_id == connection_id:
+                    del self._leases[test_id]
+                    self._pending_tests.appendleft(test_id)
+
+    def _release_expired_tests(self):
+        current_time = time.monotonic()
+        with self._lock:
+            for test_id, (lease_deadline, _) in list(self._leases.items()):
+                if lease_deadline < current_time:
+                    del self._leases[test_id]
+                    self._pending_tests.appendleft(test_id)
+
+
+def _connect_to_coordinator(coordinator_address, connect_timeout, wait_interval, queue_done=None):
+    """
+    Returns connection to coordinator, or None if connection is refused
+    after queue_done is set by another agent.
+    """
+    connect_deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            return socket.create_connection(tuple(coordinator_address))
+        except ConnectionRefusedError:
+            if queue_done is not None and queue_done.is_set():
+                return None
+            if time.monotonic() > connect_deadline:
+                raise
+            time.sleep(wait_interval)
+
+
+def run_worker_agent(runner, coordinator_address, env, connect_timeout=10, wait_interval=0.5, queue_done=None):
+    """
+    Pulls tests from coordinator, runs them with runner._on_test and sends results back,
+    until coordinator has no more tests. Coordinator, that is not started yet,
+    is waited for connect_timeout seconds. Returns count of run tests.
+    Coordinator stops as soon as all results are received, so connection, that is reset
+    after the agent was served, or refused after queue_done event is set by another agent,
+    is the end of tests too.
+    """
+    tests_count = 0
+    connection = _connect_to_coordinator(coordinator_address, connect_timeout, wait_interval, queue_done)
+    if connection is None:
+        return tests_count
+    with connection:
+        connection_file = connection.makefile('rwb')
+        try:
+            while True:
+                _send_message(connection_file, {'type': 'get'})
+                message = _receive_message(connection_file)
+                if message is None or message['type'] == 'done':
+                    break
+                if message['type'] == 'wait':
+                    time.sleep(wait_interval)
+                    continue
+                test_dir = os.path.normpath(os.path.join(runner.test_base_dir, message['test_dir']))
+                test_result = run_timed_test(runner, test_dir, message['test_filename'], env)
+                _send_message(connection_file, {'type': 'result', 'id': message['id'],
+                                                'result': _encode_test_result(test_result)})
+                if _receive_message(connection_file) is None:
+                    break
+                tests_count += 1
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
+            pass
+    if queue_done is not None:
+        queue_done.set()
+    return tests_count
@@ -0,0 +1,63 @@
+import json
+import os
+import statistics
+
+
+class TestDurationHistory:
+    """
+    Smoothed durations of tests from previous runs, stored in JSON file,
+    that are used to run longest expected tests first.
+    Tests are identified by their paths relative to tests base dir.
+    """
+    def __init__(self, history_file_path, smoothing=0.5, default_duration=None):
+        self.history_file_path = history_file_path
+        self.smoothing = smoothing
+        self.default_duration = default_duration
+        self.durations = dict()
+
+    def load(self):
+        if os.path.exists(self.history_file_path):
+            with open(self.history_file_path, 'r') as history_file:
+                self.durations = json.load(history_file)
+        return self
+
+    def save(self):
+        history_dir = os.path.dirname(self.history_file_path)
+        if history_dir and not os.path.exists(history_dir):
+            os.makedirs(history_dir)
+        temp_history_file_path = self.history_file_path + '.tmp'
+        with open(temp_history_file_path, 'w') as history_file:
+            json.dump(self.durations, history_file)
+        os.replace(temp_history_file_path, self.history_file_path)
+
+    def update(self, test_key, duration):
+        previous_duration = self.durations.get(test_key)
+        if previous_duration is not None:
+            duration = self.smoothing * duration + (1 - self.smoothing) * previous_duration
+        self.durations[test_key] = round(duration, 6)
+
+    def prune(self, is_existing_test):
+        """
+        Removes durations of tests, for which is_existing_test(test_key) returns False.
+        """
+        self.durations = {test_key: duration for test_key, duration in self.durations.items()
+                          if is_existing_test(test_key)}
+
+    def get_default_duration(self):
+        """
+        Estimated duration of tests without history: default_duration if it is set,
+        median of known durations otherwise.
+        """
+        if self.default_duration is not None:
+            return self.default_duration
+        if len(self.durations) == 0:
+            return 0
+        return statistics.median(self.durations.values())
+
+    def sort_tests(self, scheduled_tests, get_test_key):
+        """
+        Returns (test_dir, test_filename) pairs, sorted by expected duration descending.
+        """
+        default_duration = self.get_default_duration()
+        return sorted(scheduled_tests,
+                      key=lambda test: self.durations.get(get_test_key(*test), default_duration), reverse=True)
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import re
+
+from ctestgen.runner import TestRunResult
+
+
+DEFAULT_OUTPUT_SCRUBBERS = (
+    (r'0x[0-9a-fA-F]+', '0x?'),
+    (r'(?:[A-Za-z]:)?(?:[\\/][\w.\-+]+)+', '<path>'),
+    (r':\d+(?::\d+)?', ':?')
+)
+
+
+class OutputSignatures:
+    """
+    Normalises outputs of tests by replacing matches of scrubbers (pairs of regular expression
+    and replacement), and name of the test itself, and returns signature of normalised output.
+    """
+    def __init__(self, scrubbers=DEFAULT_OUTPUT_SCRUBBERS):
+        self.scrubbers = [(re.compile(pattern), replacement) for pattern, replacement in scrubbers]
+
+    def normalise(self, test_filename, test_output):
+        test_output = test_output.replace(test_filename, '<test>')
+        for pattern, replacement in self.scrubbers:
+            test_output = pattern.sub(replacement, test_output)
+        return test_output
+
+    def get_signature(self, test_filename, test_output):
+        normalised_output = self.normalise(test_filename, test_output)
+        return hashlib.sha1(normalised_output.encode()).hexdigest()[:16], normalised_output
+
+
+class FailureClusters:
+    """
+    Groups tests, that did not succeed, by result type and signature of their output,
+    every cluster keeps tests count, normalised output and
+    first representative_tests_count tests.
+    """
+    def __init__(self, representative_tests_count=5):
+        self.representative_tests_count = representative_tests_count
+        self.clusters = dict()
+
+    @staticmethod
+    def is_clustered(test_result):
+        return test_result.result_type not in (TestRunResult.ResultType.SUCCESS, TestRunResult.ResultType.FLAKY)
+
+    def add(self, test_dir, test_result, signature, normalised_output):
+        if not FailureClusters.is_clustered(test_result):
+            return
+        cluster_key = (test_result.result_type, signature)
+        cluster = self.clusters.get(cluster_key)
+        if cluster is None:
+            cluster = {'signature': signature, 'result_type': test_result.result_type.name, 'count': 0,
+                       'output': normalised_output, 'tests': []}
+            self.clusters[cluster_key] = cluster
+        cluster['count'] += 1
+        if len(cluster['tests']) < self.representative_tests_count:
+            cluster['tests'].append(os.path.join(test_dir, test_result.test_filename))
+
+    def get_sorted_clusters(self):
+        return sorted(self.clusters.values(), key=lambda cluster: cluster['count'], reverse=True)
+
+    def get_description(self, clusters_count=None, output_lines_count=3):
+        """
+        Returns text report of largest clusters with first lines of their outputs.
+        """
+        cluster_descriptions = []
+        for cluster in self.get_sorted_clusters()[:clusters_count]:
+            output_lines = cluster['output'].strip().splitlines()[:output_lines_count]
+            cluster_descriptions.append(
+                cluster['signature'] + ' ' + cluster['result_type'] + ' ' + str(cluster['count']) + ' tests\n' +
+                ''.join('  | ' + output_line + '\n' for output_line in output_lines) +
+                ''.join('  ' + test_path + '\n' for test_path in cluster['tests']))
+        return 'Failure clusters: ' + str(len(self.clusters)) + '\n' + ''.join(cluster_descriptions)
+
+    def write_report(self, output_dir):
+        """
+        Writes clusters.txt and clusters.json to output dir.
+        """
+        with open(os.path.join(output_dir, 'clusters.txt'), 'w') as clusters_file:
+            clusters_file.write(self.get_description(output_lines_count=20))
+        with open(os.path.join(output_dir, 'clusters.json'), 'w') as clusters_file:
+            json.dump(self.get_sorted_clusters(), clusters_file)
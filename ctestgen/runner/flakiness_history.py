@@ -0,0 +1,50 @@
+import json
+import os
+
+
+class TestFlakinessHistory:
+    """
+    Smoothed flakiness of tests from previous runs, stored in JSON file.
+    Flakiness of test is 1 for runs, where it passed only on retry, and 0 otherwise,
+    tests with smoothed flakiness of flaky_threshold or more are known flaky.
+    Tests are identified by their paths relative to tests base dir.
+    """
+    def __init__(self, history_file_path, smoothing=0.3, flaky_threshold=0.1):
+        self.history_file_path = history_file_path
+        self.smoothing = smoothing
+        self.flaky_threshold = flaky_threshold
+        self.flakiness = dict()
+
+    def load(self):
+        if os.path.exists(self.history_file_path):
+            with open(self.history_file_path, 'r') as history_file:
+                self.flakiness = json.load(history_file)
+        return self
+
+    def save(self):
+        history_dir = os.path.dirname(self.history_file_path)
+        if history_dir and not os.path.exists(history_dir):
+            os.makedirs(history_dir)
+        temp_history_file_path = self.history_file_path + '.tmp'
+        with open(temp_history_file_path, 'w') as history_file:
+            json.dump(self.flakiness, history_file)
+        os.replace(temp_history_file_path, self.history_file_path)
+
+    def update(self, test_key, flaky):
+        flakiness = 1.0 if flaky else 0.0
+        previous_flakiness = self.flakiness.get(test_key)
+        if previous_flakiness is not None:
+            flakiness = self.smoothing * flakiness + (1 - self.smoothing) * previous_flakiness
+        if flakiness < 0.001:
+            self.flakiness.pop(test_key, None)
+        else:
+            self.flakiness[test_key] = round(flakiness, 3)
+
+    def is_flaky(self, test_key):
+        return self.flakiness.get(test_key, 0) >= self.flaky_threshold
+
+    def sort_tests(self, scheduled_tests, get_test_key):
+        """
+        Returns (test_dir, test_filename) pairs with known flaky tests moved to the end.
+        """
+        return sorted(scheduled_tests, key=lambda test: self.is_flaky(get_test_key(*test)))
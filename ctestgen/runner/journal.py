@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+from ctestgen.runner.utils import _encode_test_result, _decode_test_result
+
+
+def _get_complete_lines_size(journal_file, chunk_size=64 * 1024):
+    """
+    Returns size of the file without its last line, if it is not terminated by newline.
+    """
+    journal_file.seek(0, os.SEEK_END)
+    position = journal_file.tell()
+    while position > 0:
+        chunk_start = max(0, position - chunk_size)
+        journal_file.seek(chunk_start)
+        chunk = journal_file.read(position - chunk_start)
+        newline_idx = chunk.rfind(b'\n')
+        if newline_idx != -1:
+            return chunk_start + newline_idx + 1
+        position = chunk_start
+    return 0
+
+
+class TestRunJournal:
+    """
+    Append-only journal of completed tests of the run as JSON lines.
+    Every result is passed to operating system as soon as it is added
+    and synced to disk every sync_interval seconds, so results survive crash
+    of the run and it can be resumed. Incomplete last line, left by crash,
+    is ignored by read() and cut off by open().
+    """
+    def __init__(self, journal_file_path, sync_interval=1):
+        self.journal_file_path = journal_file_path
+        self.sync_interval = sync_interval
+        self._journal_file = None
+        self._last_sync_time = time.monotonic()
+
+    def open(self):
+        self._journal_file = open(self.journal_file_path, 'ab', buffering=0)
+        with open(self.journal_file_path, 'rb') as journal_file:
+            complete_lines_size = _get_complete_lines_size(journal_file)
+        self._journal_file.truncate(complete_lines_size)
+        return self
+
+    def add(self, test_dir, test_result):
+        journal_record = _encode_test_result(test_result)
+        journal_record['test_dir'] = test_dir
+        self._journal_file.write(json.dumps(journal_record).encode() + b'\n')
+        if time.monotonic() - self._last_sync_time >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._journal_file.fileno())
+        self._last_sync_time = time.monotonic()
+
+    def close(self):
+        if self._journal_file is not None:
+            self.sync()
+            self._journal_file.close()
+            self._journal_file = None
+
+    @staticmethod
+    def read(journal_file_path):
+        """
+        Yields (test_dir, test_result) pairs of completed tests.
+        """
+        if not os.path.exists(journal_file_path):
+            return
+        with open(journal_file_path, 'rb') as journal_file:
+            for line in journal_file:
+                if not line.endswith(b'\n'):
+                    break
+                journal_record = json.loads(line.decode())
+                yield journal_record['test_dir'], _decode_test_result(journal_record)
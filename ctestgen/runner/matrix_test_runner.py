@@ -0,0 +1,184 @@
+import json
+import os
+
+from ctestgen.runner import TestRunResult, init_output_dir
+from ctestgen.runner.merge_results import _METRICS_FIELDS
+from ctestgen.runner.runner import _run_worker_matrix_test
+
+
+class MatrixTestRunner:
+    """
+    Runs the same tests with several runners, that are configurations of the run
+    (tool, its arguments, limits), as one run: tests are found and environment is probed once,
+    tests are ordered once, by the first runner, and (test, runner) tasks of every test
+    go to one pool of workers back to back, so the test file is read by all runners,
+    while it is in page cache.
+    Every runner writes results and metrics to its own output dir, side-by-side summary
+    of runners and tests with different results are written to output_base_dir.
+    Tests are run one by one in the pool, whatever execution engine and batch size runners have,
+    pool settings (max_workers, pin_workers, throttle) are taken from the first runner.
+    """
+    def __init__(self, test_runners, matrix_name='matrix', output_base_dir=None, differing_tests_count=20):
+        self.test_runners = list(test_runners)
+        if len(self.test_runners) == 0:
+            raise ValueError('Matrix requires at least one runner')
+        runner_names = [test_runner.runner_name for test_runner in self.test_runners]
+        if len(set(runner_names)) != len(runner_names):
+            raise ValueError('Runners of matrix should have different names: ' + ', '.join(runner_names))
+        for test_runner in self.test_runners:
+            if test_runner.test_base_dir != self.test_runners[0].test_base_dir:
+                raise ValueError('Runners of matrix should have the same test base dir')
+            if test_runner.lazy_discovery or test_runner.coordinator_address is not None or \
+                    test_runner.resume is not None:
+                raise ValueError('Runners of matrix do not support lazy discovery, coordinator and resume')
+        self.matrix_name = matrix_name
+        self.output_base_dir = output_base_dir if output_base_dir is not None \
+            else self.test_runners[0].output_base_dir
+        self.differing_tests_count = differing_tests_count
+        self.output_dir = None
+        self.tests_result_types = dict()
+        self._tests_runners = None
+        self._pending_result_types = None
+
+    def _get_test_result_callback(self, runner_idx, test_result_callback):
+        """
+        Returns callback of runner, that stores result type of test
+        and calls callback, that the runner had.
+        Result types of test are kept until all runners of the test return its results,
+        then they are stored in tests_result_types, only if they differ.
+        """
+        def on_test_result(test_dir, test_result):
+            test = (test_dir, test_result.test_filename)
+            result_types = self._pending_result_types.get(test)
+            if result_types is None:
+                result_types = bytearray(len(self.test_runners))
+                self._pending_result_types[test] = result_types
+            result_types[runner_idx] = test_result.result_type.value + 1
+            if len(self.test_runners) - result_types.count(0) == bin(self._tests_runners.get(test, 0)).count('1'):
+                del self._pending_result_types[test]
+                self._add_result_types(test, result_types)
+            if test_result_callback is not None:
+                test_result_callback(test_dir, test_result)
+        return on_test_result
+
+    def _add_result_types(self, test, result_types):
+        if len(set(result_types) - {0}) > 1:
+            self.tests_result_types[test] = result_types
+
+    def get_differing_tests(self):
+        """
+        Returns list of (test_dir, test_filename, result type names by runners)
+        of tests, that have different results in runners, that ran them.
+        Result type name is None, if test was not run by the runner.
+        """
+        differing_tests = []
+        for (test_dir, test_filename), result_types in self.tests_result_types.items():
+            differing_tests.append((test_dir, test_filename,
+                                    [TestRunResult.ResultType(result_type - 1).name if result_type != 0 else None
+                                     for result_type in result_types]))
+        return sorted(differing_tests)
+
+    def get_summary(self, differing_tests):
+        """
+        Returns table of global metrics of runners side by side and first differing tests.
+        """
+        runner_names = [test_runner.runner_name for test_runner in self.test_runners]
+        column_width = max([12] + [len(runner_name) for runner_name in runner_names]) + 2
+        rows = [('', runner_names),
+                ('Time', ['%.3fs' % (test_runner.global_metrics.finish_time -
+                                     test_runner.global_metrics.start_time).total_seconds()
+                          for test_runner in self.test_runners])]
+        for field_name, metrics_field in _METRICS_FIELDS.items():
+            rows.append((field_name, [str(getattr(test_runner.global_metrics, metrics_field))
+                                      for test_runner in self.test_runners]))
+        summary = ''.join(row_name.ljust(24) + ''.join(value.rjust(column_width) for value in values) + '\n'
+                          for row_name, values in rows)
+        summary += 'Tests with different results: ' + str(len(differing_tests)) + '\n'
+        for test_dir, test_filename, result_type_names in differing_tests[:self.differing_tests_count]:
+            summary += os.path.join(test_dir, test_filename) + ': ' + \
+                       ', '.join(runner_name + ' ' + str(result_type_name)
+                                 for runner_name, result_type_name in zip(runner_names, result_type_names)) + '\n'
+        return summary
+
+    @staticmethod
+    def _get_tests_runners(runs):
+        """
+        Returns dictionary of scheduled tests and bit masks of runners, that run them,
+        in order of tests of the first runner, followed by tests, that it does not run.
+        """
+        tests_runners = dict()
+        for runner_idx, (scheduled_tests, _) in enumerate(runs):
+            runner_bit = 1 << runner_idx
+            for test in scheduled_tests:
+                tests_runners[test] = tests_runners.get(test, 0) | runner_bit
+        return tests_runners
+
+    def _get_tasks(self, stopped_runners):
+        """
+        Yields (runner index, test dir, test filename) tasks of every test for all its runners
+        back to back, tasks of runners, that were stopped by max_failures, are skipped.
+        """
+        for (test_dir, test_filename), runners_mask in self._tests_runners.items():
+            for runner_idx in range(len(self.test_runners)):
+                if runners_mask >> runner_idx & 1 and runner_idx not in stopped_runners:
+                    yield runner_idx, test_dir, test_filename
+
+    def run(self):
+        first_runner = self.test_runners[0]
+        tests = first_runner._find_tests()
+        env = first_runner._get_env()
+        test_result_callbacks = [test_runner.test_result_callback for test_runner in self.test_runners]
+        self.tests_result_types = dict()
+        self._pending_result_types = dict()
+        for runner_idx, test_runner in enumerate(self.test_runners):
+            test_runner.test_result_callback = self._get_test_result_callback(runner_idx,
+                                                                              test_runner.test_result_callback)
+        runs = [test_runner._start_run(tests, order_tests=runner_idx == 0)
+                for runner_idx, test_runner in enumerate(self.test_runners)]
+        self._tests_runners = self._get_tests_runners(runs)
+        remaining_tests_counts_of_runners = [remaining_tests_counts for _, remaining_tests_counts in runs]
+        del runs
+        retried_tests_of_runners = [dict() for _ in self.test_runners]
+        stopped_runners = set()
+        try:
+            for test_runner in self.test_runners:
+                test_runner._open_journal()
+            print("Running " + str(len(self.test_runners)) + " configurations: " +
+                  ', '.join(test_runner.runner_name for test_runner in self.test_runners))
+            tests_results = first_runner._run_in_pool(_run_worker_matrix_test, self._get_tasks(stopped_runners),
+                                                      env, worker_runner=self.test_runners)
+            for runner_idx, test_dir, test_result in tests_results:
+                if runner_idx in stopped_runners:
+                    continue
+                if not self.test_runners[runner_idx]._process_tests_results(
+                        [(test_dir, test_result)], remaining_tests_counts_of_runners[runner_idx],
+                        retried_tests_of_runners[runner_idx]):
+                    stopped_runners.add(runner_idx)
+            for runner_idx, test_runner in enumerate(self.test_runners):
+                if runner_idx not in stopped_runners:
+                    test_runner._retry_tests(retried_tests_of_runners[runner_idx],
+                                             remaining_tests_counts_of_runners[runner_idx], env)
+        finally:
+            for test_runner, test_result_callback in zip(self.test_runners, test_result_callbacks):
+                test_runner._close_run()
+                test_runner.test_result_callback = test_result_callback
+            # Tests, that were not run by all their runners because of max_failures
+            for test, result_types in self._pending_result_types.items():
+                self._add_result_types(test, result_types)
+            self._tests_runners = None
+            self._pending_result_types = None
+        for test_runner, remaining_tests_counts in zip(self.test_runners, remaining_tests_counts_of_runners):
+            test_runner._finish_run(tests, remaining_tests_counts)
+
+        differing_tests = self.get_differing_tests()
+        summary = self.get_summary(differing_tests)
+        print('Matrix:\n' + summary)
+        self.output_dir = init_output_dir(self.output_base_dir, self.matrix_name)
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w') as summary_file:
+            summary_file.write(summary)
+        with open(os.path.join(self.output_dir, 'differing_tests.json'), 'w') as differing_tests_file:
+            json.dump({'runners': [test_runner.runner_name for test_runner in self.test_runners],
+                       'output_dirs': [test_runner.output_dir for test_runner in self.test_runners],
+                       'tests': [[os.path.join(test_dir, test_filename), result_type_names]
+                                 for test_dir, test_filename, result_type_names in differing_tests]},
+                      differing_tests_file)
@@ -0,0 +1,106 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from ctestgen.runner import Metrics, MetricsEncoder, decode_metrics, init_metrics_output_file, init_results_file, \
+    find_results_file, open_results_file
+
+
+_METRICS_FIELDS = {
+    'Tests count': 'tests_count',
+    'Successful count': 'successful_count',
+    'Failed count': 'failed_count',
+    'Timeout count': 'timeout_count',
+    'Resource exceeded count': 'resource_exceeded_count',
+    'Flaky count': 'flaky_count'
+}
+
+
+def parse_timedelta_string(timedelta_string):
+    """
+    Inverse of get_timedelta_string.
+    """
+    hours, minutes, seconds = re.match(r'\s*([\d.]+)h - ([\d.]+)m - ([\d.]+)s', timedelta_string).groups()
+    return timedelta(hours=float(hours), minutes=float(minutes), seconds=float(seconds))
+
+
+def read_metrics_file(metrics_file_path):
+    """
+    Returns testsets metrics and global metrics, written by TestRunner to metrics.txt,
+    global metrics is None if it was not written.
+    Start time of every metrics is the moment of reading.
+    """
+    testsets_metrics = dict()
+    global_metrics = None
+    current_metrics = None
+    start_time = datetime.now()
+    with open(metrics_file_path, 'r') as metrics_file:
+        for line in metrics_file:
+            line = line.rstrip('\n')
+            if line.startswith('Testdir: '):
+                current_metrics = Metrics(start_time=start_time, finish_time=start_time)
+                testsets_metrics[line[len('Testdir: '):]] = current_metrics
+            elif line == 'Global:':
+                current_metrics = Metrics(start_time=start_time, finish_time=start_time)
+                global_metrics = current_metrics
+            elif line == 'Slowest tests:':
+                current_metrics = None
+            elif current_metrics is not None and ': ' in line:
+                field_name, field_value = line.split(': ', 1)
+                if field_name == 'Time':
+                    current_metrics.finish_time = start_time + parse_timedelta_string(field_value)
+                elif field_name in _METRICS_FIELDS:
+                    setattr(current_metrics, _METRICS_FIELDS[field_name], int(field_value))
+    return testsets_metrics, global_metrics
+
+
+def read_results_file(results_file_path):
+    with open_results_file(results_file_path) as results_file:
+        return decode_metrics(json.load(results_file))
+
+
+def _merge_metrics_time(merged_metrics, metrics):
+    merged_metrics.finish_time = max(merged_metrics.finish_time,
+                                     merged_metrics.start_time + (metrics.finish_time - metrics.start_time))
+
+
+def merge_results(output_dirs, merged_output_dir):
+    """
+    Merges results.json and metrics.txt of several runs, usually shards of one run,
+    into results.json and metrics.txt in merged_output_dir.
+    Counts of tests are summed, time is the maximum time of runs, as they run in parallel.
+    Global resource usage percentiles are computed from merged histograms of results files,
+    runs, whose results files have no histograms, do not contribute to them.
+    Resource usage of testsets is not merged, as metrics.txt has only its percentiles.
+    Returns merged testsets metrics and global metrics.
+    """
+    start_time = datetime.now()
+    merged_testsets_metrics = dict()
+    merged_global_metrics = Metrics(start_time=start_time, finish_time=start_time)
+    for output_dir in output_dirs:
+        merged_global_metrics.merge(read_results_file(find_results_file(output_dir)))
+        metrics_file_path = os.path.join(output_dir, 'metrics.txt')
+        if not os.path.exists(metrics_file_path):
+            continue
+        testsets_metrics, global_metrics = read_metrics_file(metrics_file_path)
+        for test_dir, metrics in testsets_metrics.items():
+            merged_metrics = merged_testsets_metrics.setdefault(
+                test_dir, Metrics(start_time=start_time, finish_time=start_time))
+            merged_metrics.merge(metrics)
+            _merge_metrics_time(merged_metrics, metrics)
+        if global_metrics is not None:
+            _merge_metrics_time(merged_global_metrics, global_metrics)
+
+    if not os.path.exists(merged_output_dir):
+        os.makedirs(merged_output_dir)
+    metrics_output_file_path = init_metrics_output_file(merged_testsets_metrics, merged_output_dir)
+    with open(metrics_output_file_path, 'a') as metrics_output_file:
+        if len(merged_testsets_metrics) != 0:
+            metrics_output_file.write(''.join('Testdir: ' + test_dir + '\n' + str(metrics)
+                                              for test_dir, metrics in merged_testsets_metrics.items()) + '\n')
+        metrics_output_file.write('Global:\n' + str(merged_global_metrics) + '\n')
+    with open(init_results_file(merged_output_dir), 'w') as results_output_file:
+        json.dump(merged_global_metrics, results_output_file, cls=MetricsEncoder)
+    return merged_testsets_metrics, merged_global_metrics
+
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from ctestgen.runner import TestRunResult
+
+
+class RunProgress:
+    """
+    Progress of the run: count of completed tests of scheduled tests_count,
+    count of failures, throughput and estimated time to finish.
+    Throughput is exponential moving average of throughputs between reports,
+    reports are due every percent_step percents of tests and every report_interval seconds.
+    """
+    def __init__(self, tests_count=0, percent_step=10, report_interval=10, smoothing=0.3):
+        self.tests_count = tests_count
+        self.completed_count = 0
+        self.failures_count = 0
+        self.percent_step = percent_step
+        self.report_interval = report_interval
+        self.smoothing = smoothing
+        self.start_time = time.monotonic()
+        self.tests_per_second = None
+        self._last_report_time = self.start_time
+        self._last_report_completed_count = 0
+        self._next_report_percent = percent_step
+        self._next_report_time = self.start_time + report_interval if report_interval else None
+
+    def add_test_result(self, test_result):
+        """
+        Counts completed test, returns True if report is due.
+        """
+        self.completed_count += 1
+        if test_result.result_type not in (TestRunResult.ResultType.SUCCESS, TestRunResult.ResultType.FLAKY):
+            self.failures_count += 1
+        if self.percent_step and self.completed_count * 100 >= self._next_report_percent * self.tests_count:
+            self._next_report_percent = (self.get_percent() // self.percent_step + 1) * self.percent_step
+            self._update_throughput()
+            return True
+        if self._next_report_time is not None and time.monotonic() >= self._next_report_time:
+            self._update_throughput()
+            return True
+        return False
+
+    def _update_throughput(self):
+        report_time = time.monotonic()
+        if report_time > self._last_report_time:
+            tests_per_second = (self.completed_count - self._last_report_completed_count) / \
+                               (report_time - self._last_report_time)
+            self.tests_per_second = tests_per_second if self.tests_per_second is None else \
+                self.smoothing * tests_per_second + (1 - self.smoothing) * self.tests_per_second
+        self._last_report_time = report_time
+        self._last_report_completed_count = self.completed_count
+        if self.report_interval:
+            self._next_report_time = report_time + self.report_interval
+
+    def get_percent(self):
+        return self.completed_count * 100 / self.tests_count if self.tests_count != 0 else 100.0
+
+    def get_elapsed_time(self):
+        return time.monotonic() - self.start_time
+
+    def get_eta(self):
+        """
+        Returns estimated seconds to finish the run or None, if throughput is not known yet.
+        """
+        if not self.tests_per_second:
+            return None
+        return max(0, self.tests_count - self.completed_count) / self.tests_per_second
+
+    def get_description(self):
+        eta = self.get_eta()
+        return 'Progress: %d/%d (%.1f%%), %s tests/s, ETA %s, failures: %d' % (
+            self.completed_count, self.tests_count, self.get_percent(),
+            '%.1f' % self.tests_per_second if self.tests_per_second is not None else '-',
+            str(timedelta(seconds=round(eta))) if eta is not None else '-',
+            self.failures_count)
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import multiprocessing as mp
+
+from ctestgen.generator import CodeBlock
+from ctestgen.runner import TestRunResult, OutputSignatures, DEFAULT_OUTPUT_SCRUBBERS, get_default_workers_count, \
+    run_timed_test
+from ctestgen.runner.runner import _init_worker, _run_worker_test
+
+
+_PROGRAM_ELEMENTS_LISTS = ('includes', 'defines', 'enums', 'global_variables', 'functions')
+
+
+def _get_nested_code_blocks(element):
+    """
+    Returns CodeBlocks of function or control structure (bodies of loops, branches of if).
+    """
+    code_blocks = []
+    for attribute in ('body', 'true_body', 'else_body'):
+        code_block = getattr(element, attribute, None)
+        if isinstance(code_block, CodeBlock):
+            code_blocks.append(code_block)
+    return code_blocks
+
+
+class TestReducer:
+    """
+    Reduces failing test to a smaller program, that fails in the same way
+    with test_runner: with the same result type and, if keep_output_signature,
+    the same signature of normalised output.
+    Removal of lines (or elements of generator Program: functions, globals
+    and statements of code blocks, level by level) is searched by delta debugging,
+    candidates of every step are run by workers_count processes at once.
+    Results of tried candidates are cached by their text.
+    """
+    def __init__(self, test_runner, work_dir=None, workers_count=None, keep_output_signature=True,
+                 output_scrubbers=None):
+        self.test_runner = test_runner
+        self.work_dir = work_dir
+        self.workers_count = workers_count if workers_count is not None else get_default_workers_count()
+        self.keep_output_signature = keep_output_signature
+        self.output_signatures = OutputSignatures(output_scrubbers if output_scrubbers is not None
+                                                  else DEFAULT_OUTPUT_SCRUBBERS)
+        self.candidates_count = 0
+        self.runs_count = 0
+        self._tried_candidates = dict()
+        self._original_result = None
+        self._original_signature = None
+        self._test_filename = None
+        self._env = None
+        self._pool = None
+        self._candidates_dir = None
+
+    def _is_interesting(self, test_result):
+        """
+        Returns True, if candidate fails in the same way as the original test.
+        """
+        if test_result.result_type != self._original_result.result_type:
+            return False
+        if not self.keep_output_signature:
+            return True
+        signature, _ = self.output_signatures.get_signature(test_result.test_filename, test_result.test_output)
+        return signature == self._original_signature
+
+    def _run_candidates(self, candidate_texts):
+        """
+        Returns test results of candidate programs, run in parallel.
+        """
+        tests = []
+        for candidate_text in candidate_texts:
+            candidate_dir = os.path.join(self._candidates_dir, str(self.runs_count + len(tests)))
+            os.makedirs(candidate_dir)
+            with open(os.path.join(candidate_dir, self._test_filename), 'w') as candidate_file:
+                candidate_file.write(candidate_text)
+            tests.append((candidate_dir, self._test_filename))
+        self.runs_count += len(tests)
+        if self._pool is not None:
+            tests_results = [test_result for _, test_result in self._pool.imap(_run_worker_test, tests)]
+        else:
+            tests_results = [run_timed_test(self.test_runner, test_dir, test_filename, self._env)
+                             for test_dir, test_filename in tests]
+        for test_dir, _ in tests:
+            shutil.rmtree(test_dir, ignore_errors=True)
+        return tests_results
+
+    def _find_interesting_candidate(self, candidate_texts):
+        """
+        Returns index of the first interesting candidate, or None.
+        Candidates are run in chunks of workers_count, until one of them is interesting.
+        """
+        self.candidates_count += len(candidate_texts)
+        keys = [hashlib.sha1(candidate_text.encode()).hexdigest() for candidate_text in candidate_texts]
+        for chunk_start in range(0, len(candidate_texts), self.workers_count):
+            chunk_end = chunk_start + self.workers_count
+            not_tried = {}
+            for candidate_idx in range(chunk_start, min(chunk_end, len(candidate_texts))):
+                if keys[candidate_idx] not in self._tried_candidates:
+                    not_tried.setdefault(keys[candidate_idx], candidate_idx)
+            if len(not_tried) != 0:
+                tests_results = self._run_candidates([candidate_texts[candidate_idx]
+                                                      for candidate_idx in not_tried.values()])
+                for key, test_result in zip(not_tried.keys(), tests_results):
+                    self._tried_candidates[key] = self._is_interesting(test_result)
+            for candidate_idx in range(chunk_start, min(chunk_end, len(candidate_texts))):
+                if self._tried_candidates[keys[candidate_idx]]:
+                    return candidate_idx
+        return None
+
+    def _ddmin(self, units, render):
+        """
+        Returns subset of units, such that rendered program is interesting,
+        and removal of any single unit of it makes program not interesting.
+        render(kept_units) returns program text.
+        """
+        chunks_count = 2
+        while len(units) != 0:
+            chunks_count = min(chunks_count, len(units))
+            chunk_size = len(units) / chunks_count
+            complements = [units[:round(chunk_idx * chunk_size)] + units[round((chunk_idx + 1) * chunk_size):]
+                           for chunk_idx in range(chunks_count)]
+            interesting_idx = self._find_interesting_candidate([render(complement) for complement in complements])
+            if interesting_idx is not None:
+                units = complements[interesting_idx]
+                chunks_count = max(chunks_count - 1, 2)
+            elif chunks_count == len(units):
+                break
+            else:
+                chunks_count *= 2
+        return units
+
+    def reduce_lines(self, test_text):
+        """
+        Returns reduced test text, lines are removed.
+        """
+        lines = test_text.splitlines()
+        kept_lines = self._ddmin(lines, lambda kept_lines: '\n'.join(kept_lines) + '\n')
+        return '\n'.join(kept_lines) + '\n'
+
+    def reduce_program(self, program):
+        """
+        Reduces generator Program in place: elements of program, then statements
+        of functions bodies, then statements of nested code blocks.
+        Returns reduced program text.
+        """
+        units = [(program, list_name, element_idx)
+                 for list_name in _PROGRAM_ELEMENTS_LISTS for element_idx in range(len(getattr(program, list_name)))]
+        original_lists = {(id(program), list_name): (program, list_name, list(getattr(program, list_name)))
+                          for list_name in _PROGRAM_ELEMENTS_LISTS}
+
+        def render(kept_units):
+            kept_keys = set((id(owner), list_name, element_idx) for owner, list_name, element_idx in kept_units)
+            for owner, list_name, elements in original_lists.values():
+                setattr(owner, list_name, [element for element_idx, element in enumerate(elements)
+                                           if (id(owner), list_name, element_idx) in kept_keys])
+            return str(program)
+
+        level = 0
+        while len(units) != 0:
+            print("Reducing level " + str(level) + ": " + str(len(units)) + " elements")
+            kept_units = self._ddmin(units, render)
+            render(kept_units)
+            kept_elements = [original_lists[(id(owner), list_name)][2][element_idx]
+                             for owner, list_name, element_idx in kept_units]
+            units = []
+            original_lists = dict()
+            for element in kept_elements:
+                for code_block in _get_nested_code_blocks(element):
+                    if (id(code_block), 'body') not in original_lists:
+                        original_lists[(id(code_block), 'body')] = (code_block, 'body', list(code_block.body))
+                        units.extend((code_block, 'body', statement_idx)
+                                     for statement_idx in range(len(code_block.body)))
+            level += 1
+        return str(program)
+
+    def reduce(self, test_path, program=None, reduced_test_path=None):
+        """
+        Reduces failing test and writes the result to reduced_test_path
+        (test path with _reduced suffix by default), that is returned.
+        If generator Program of the test is given, its structure is reduced first,
+        then lines of the result.
+        """
+        self._test_filename = os.path.basename(test_path)
+        # Cached results depend on the original failure, so they are not shared between tests
+        self._tried_candidates = dict()
+        self.candidates_count = 0
+        self.runs_count = 0
+        if reduced_test_path is None:
+            test_name, test_extension = os.path.splitext(test_path)
+            reduced_test_path = test_name + '_reduced' + test_extension
+        with open(test_path, 'r') as test_file:
+            test_text = test_file.read()
+        self._env = self.test_runner._get_env()
+        self._candidates_dir = tempfile.mkdtemp(prefix='ctestgen_reduce_', dir=self.work_dir)
+        try:
+            # The original test is run from candidates dir too, so that paths in outputs look the same
+            self._original_result = self._run_candidates([test_text])[0]
+            if self._original_result.result_type in (TestRunResult.ResultType.SUCCESS,
+                                                     TestRunResult.ResultType.FLAKY):
+                raise ValueError('Test does not fail: ' + test_path)
+            self._original_signature, _ = self.output_signatures.get_signature(self._original_result.test_filename,
+                                                                               self._original_result.test_output)
+            if self.workers_count > 1:
+                self._pool = mp.Pool(self.workers_count, initializer=_init_worker,
+                                     initargs=(self.test_runner, self._env))
+            if program is not None:
+                test_text = self.reduce_program(program)
+            print("Reducing lines: " + str(len(test_text.splitlines())) + " lines")
+            test_text = self.reduce_lines(test_text)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+            shutil.rmtree(self._candidates_dir, ignore_errors=True)
+        with open(reduced_test_path, 'w') as reduced_test_file:
+            reduced_test_file.write(test_text)
+        print("Reduced to " + str(len(test_text.splitlines())) + " lines, " + str(self.candidates_count) +
+              " candidates, " + str(self.runs_count) + " runs")
+        return reduced_test_path
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from ctestgen.runner import TestRunResult
+
+
+def get_file_digest(file_path, chunk_size=1024 * 1024):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_executable_identity(executable, env=None):
+    """
+    Returns resolved path, modification time and size of executable,
+    that changes when the tool is rebuilt or replaced.
+    """
+    search_path = env.get('PATH') if env else None
+    executable_path = shutil.which(executable, path=search_path) or executable
+    if not os.path.exists(executable_path):
+        return [executable_path]
+    executable_path = os.path.realpath(executable_path)
+    executable_stat = os.stat(executable_path)
+    return [executable_path, executable_stat.st_mtime_ns, executable_stat.st_size]
+
+
+class TestResultCache:
+    """
+    On-disk storage of test results, addressed by key that describes
+    test contents and the way it was run.
+    Entries are stored in separate files, so it is safe to use
+    the cache from several worker processes.
+    Least recently used entries are removed by evict() when size
+    of the cache exceeds max_size bytes.
+    """
+    def __init__(self, cache_dir, max_size=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def make_key(test_file_path, key_parts):
+        key_hash = hashlib.sha256()
+        key_hash.update(get_file_digest(test_file_path).encode())
+        key_hash.update(json.dumps(key_parts, sort_keys=True).encode())
+        return key_hash.hexdigest()
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def get(self, key, test_filename):
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, 'r') as entry_file:
+                entry = json.load(entry_file)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return TestRunResult(TestRunResult.ResultType[entry['result_type']], entry['test_output'], test_filename)
+
+    def put(self, key, test_result):
+        entry_path = self._get_entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temp_entry_path = entry_path + '.' + uuid.uuid4().hex + '.tmp'
+        with open(temp_entry_path, 'w') as entry_file:
+            json.dump({'result_type': test_result.result_type.name, 'test_output': test_result.test_output},
+                      entry_file)
+        os.replace(temp_entry_path, entry_path)
+
+    def evict(self):
+        if not os.path.exists(self.cache_dir):
+            return
+        entries = []
+        cache_size = 0
+        for dir_path, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                entry_path = os.path.join(dir_path, filename)
+                entry_stat = os.stat(entry_path)
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+                cache_size += entry_stat.st_size
+        entries.sort()
+        for _, entry_size, entry_path in entries:
+            if cache_size <= self.max_size:
+                break
+            os.remove(entry_path)
+            cache_size -= entry_size
+
+    def clear(self):
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+from collections import namedtuple
+
+from ctestgen.runner import TestRunResult
+
+
+ResultsDiff = namedtuple('ResultsDiff', ['newly_failing', 'newly_passing', 'slowed_down'])
+
+
+class TestResultsStore:
+    """
+    SQLite database with results of every test of every run,
+    indexed by run id and test key (see get_test_key).
+    Output of test is referenced by output_file_path and output_offset:
+    offset of the test in outputs file of the run, or None, if the path
+    is of file with full output, that was cut in outputs file.
+    Results are inserted in batches of batch_size rows.
+    """
+    def __init__(self, db_path, batch_size=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS runs ('
+                                 'run_id TEXT PRIMARY KEY, runner_name TEXT, start_time TEXT, output_dir TEXT)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                 'run_id TEXT, test_key TEXT, test_dir TEXT, test_filename TEXT, result_type TEXT, '
+                                 'duration REAL, user_time REAL, system_time REAL, max_rss INTEGER, '
+                                 'output_file_path TEXT, output_offset INTEGER, '
+                                 'PRIMARY KEY (run_id, test_key)) WITHOUT ROWID')
+        self._connection.commit()
+        self._pending_rows = []
+
+    def add_run(self, run_id, runner_name=None, start_time=None, output_dir=None):
+        self._connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)',
+                                 (run_id, runner_name, str(start_time) if start_time is not None else None,
+                                  output_dir))
+        self._connection.commit()
+
+    def add_test_result(self, run_id, test_key, test_dir, test_result, output_file_path=None, output_offset=None):
+        self._pending_rows.append((run_id, test_key, test_dir, test_result.test_filename,
+                                   test_result.result_type.name, test_result.duration, test_result.user_time,
+                                   test_result.system_time, test_result.max_rss, output_file_path,
+                                   output_offset))
+        if len(self._pending_rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self._pending_rows) != 0:
+            self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                         self._pending_rows)
+            self._connection.commit()
+            self._pending_rows = []
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def get_runs(self):
+        """
+        Returns list of (run_id, runner_name, start_time, output_dir) in order of runs start.
+        """
+        return self._connection.execute('SELECT * FROM runs ORDER BY start_time').fetchall()
+
+    def get_test_results(self, run_id, result_type=None):
+        """
+        Yields rows of results table for tests of run, optionally with given result type.
+        """
+        if result_type is None:
+            return self._connection.execute('SELECT * FROM results WHERE run_id = ?', (run_id,))
+        return self._connection.execute('SELECT * FROM results WHERE run_id = ? AND result_type = ?',
+                                        (run_id, result_type.name))
+
+    def get_test_history(self, test_key):
+        """
+        Returns list of (run_id, result_type, duration) of test in all runs.
+        """
+        return self._connection.execute('SELECT results.run_id, result_type, duration FROM results '
+                                        'LEFT JOIN runs ON results.run_id = runs.run_id WHERE test_key = ? '
+                                        'ORDER BY runs.start_time', (test_key,)).fetchall()
+
+    def diff(self, run_a, run_b, slowdown_ratio=1.5, min_slowdown=0.1):
+        """
+        Compares results of tests, that were run in both runs.
+        Returns ResultsDiff with lists of keys of tests, that failed only in run_b,
+        that succeeded only in run_b, and (test_key, duration_a, duration_b) of tests,
+        that ran slowdown_ratio times and min_slowdown seconds longer in run_b.
+        """
+        success = TestRunResult.ResultType.SUCCESS.name
+        joined_results = 'FROM results AS a JOIN results AS b ON a.test_key = b.test_key ' \
+                         'WHERE a.run_id = ? AND b.run_id = ? '
+        newly_failing = [row[0] for row in self._connection.execute(
+            'SELECT a.test_key ' + joined_results + 'AND a.result_type = ? AND b.result_type != ? ORDER BY a.test_key',
+            (run_a, run_b, success, success))]
+        newly_passing = [row[0] for row in self._connection.execute(
+            'SELECT a.test_key ' + joined_results + 'AND a.result_type != ? AND b.result_type = ? ORDER BY a.test_key',
+            (run_a, run_b, success, success))]
+        slowed_down = self._connection.execute(
+            'SELECT a.test_key, a.duration, b.duration ' + joined_results +
+            'AND b.duration > a.duration * ? AND b.duration - a.duration > ? ORDER BY b.duration - a.duration DESC',
+            (run_a, run_b, slowdown_ratio, min_slowdown)).fetchall()
+        return ResultsDiff(newly_failing, newly_passing, slowed_down)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+
+from ctestgen.runner import TestRunResult, Metrics, MetricsEncoder, open_results_file
+
+
+class TestResultsWriter:
+    """
+    Appends results of tests to output files as they arrive,
+    so memory used by the run does not depend on tests count.
+    Time and resource usage of every test are written to timings file as JSON lines.
+    Names of tests are spooled to temporary files next to results file
+    and streamed to it by write_results(), spool files are kept
+    if the run was interrupted before that.
+    Results file is compressed, if its name ends with .gz or .xz.
+    If deduplicate_outputs_min_size is given, output of at least that size, that is the same
+    as output written before to the same file, is replaced with reference to that test.
+    write() returns offset of the test in its output file.
+    """
+    def __init__(self, successful_output_file_path, failed_output_file_path, results_output_file_path,
+                 timings_output_file_path=None, buffer_size=1024 * 1024, flush_interval=5,
+                 deduplicate_outputs_min_size=None):
+        self.results_output_file_path = results_output_file_path
+        self.flush_interval = flush_interval
+        self._last_flush_time = time.monotonic()
+        self._successful_output_file = open(successful_output_file_path, 'a', buffering=buffer_size)
+        self._failed_output_file = open(failed_output_file_path, 'a', buffering=buffer_size)
+        self._timings_output_file = open(timings_output_file_path, 'a', buffering=buffer_size) \
+            if timings_output_file_path is not None else None
+        self.deduplicate_outputs_min_size = deduplicate_outputs_min_size
+        self._output_hashes = {self._successful_output_file: dict(), self._failed_output_file: dict()}
+        # Offsets in bytes of the ends of output files, they are tracked, because tell() flushes the buffer
+        self._output_offsets = {self._successful_output_file: os.path.getsize(successful_output_file_path),
+                                self._failed_output_file: os.path.getsize(failed_output_file_path)}
+        self._spool_file_paths = dict()
+        self._spool_files = dict()
+        for result_type, (_, tests_field) in Metrics.RESULT_TYPE_FIELDS.items():
+            spool_file_path = results_output_file_path + '.' + tests_field
+            self._spool_file_paths[tests_field] = spool_file_path
+            self._spool_files[result_type] = open(spool_file_path, 'w', buffering=buffer_size)
+
+    def _deduplicate_output(self, output_file, test_path, test_output):
+        """
+        Returns reference to the first test with the same output in output file,
+        or test output, if it is small or was not written before.
+        """
+        if self.deduplicate_outputs_min_size is None or len(test_output) < self.deduplicate_outputs_min_size:
+            return test_output
+        output_hash = hashlib.sha1(test_output.encode(errors='surrogateescape')).digest()
+        first_test_path = self._output_hashes[output_file].setdefault(output_hash, test_path)
+        if first_test_path != test_path:
+            return 'Same output as ' + first_test_path
+        return test_output
+
+    def _write_output(self, output_file, text):
+        """
+        Writes text to output file, returns offset of its beginning.
+        """
+        offset = self._output_offsets[output_file]
+        output_file.write(text)
+        self._output_offsets[output_file] += len(text.encode(output_file.encoding, output_file.errors)) + \
+            text.count('\n') * (len(os.linesep) - 1)
+        return offset
+
+    def write_test_dir(self, test_dir):
+        """
+        Writes directory to output files, when it is discovered during the run.
+        """
+        self._write_output(self._successful_output_file, test_dir + '\n')
+        self._write_output(self._failed_output_file, test_dir + '\n')
+
+    def write(self, test_dir, test_result):
+        test_filename = test_result.test_filename
+        if test_result.result_type == TestRunResult.ResultType.SUCCESS:
+            output_file = self._successful_output_file
+        else:
+            output_file = self._failed_output_file
+        test_output = self._deduplicate_output(output_file, os.path.join(test_dir, test_filename),
+                                               test_result.test_output)
+        # Test entry starts after the empty line
+        test_offset = self._write_output(output_file, '\nTest: ' + test_filename + '\n' + test_output + '\n') + \
+            len(os.linesep)
+        self._spool_files[test_result.result_type].write(json.dumps(test_filename) + '\n')
+        if self._timings_output_file is not None:
+            self._timings_output_file.write(json.dumps({
+                'test_dir': test_dir,
+                'test_filename': test_filename,
+                'result_type': test_result.result_type.name,
+                'duration': test_result.duration,
+                'user_time': test_result.user_time,
+                'system_time': test_result.system_time,
+                'max_rss': test_result.max_rss
+            }) + '\n')
+        if time.monotonic() - self._last_flush_time >= self.flush_interval:
+            self.flush()
+        return test_offset
+
+    def flush(self):
+        self._successful_output_file.flush()
+        self._failed_output_file.flush()
+        if self._timings_output_file is not None:
+            self._timings_output_file.flush()
+        for spool_file in self._spool_files.values():
+            spool_file.flush()
+        self._last_flush_time = time.monotonic()
+
+    def write_results(self, metrics):
+        """
+        Writes metrics to results file in the same format as json.dump with MetricsEncoder,
+        but takes tests names lists from spool files line by line.
+        Closes the writer.
+        """
+        self.close()
+        metrics_dict = MetricsEncoder().default(metrics)
+        with open_results_file(self.results_output_file_path, 'w') as results_output_file:
+            results_output_file.write('{')
+            for key_idx, (key, value) in enumerate(metrics_dict.items()):
+                if key_idx != 0:
+                    results_output_file.write(', ')
+                results_output_file.write(json.dumps(key) + ': ')
+                if key in self._spool_file_paths:
+                    self._stream_spool_file(self._spool_file_paths[key], results_output_file)
+                else:
+                    results_output_file.write(json.dumps(value, cls=MetricsEncoder))
+            results_output_file.write('}')
+        for spool_file_path in self._spool_file_paths.values():
+            os.remove(spool_file_path)
+
+    @staticmethod
+    def _stream_spool_file(spool_file_path, output_file):
+        output_file.write('[')
+        with open(spool_file_path, 'r') as spool_file:
+            for line_idx, line in enumerate(spool_file):
+                if line_idx != 0:
+                    output_file.write(', ')
+                output_file.write(line.rstrip('\n'))
+        output_file.write(']')
+
+    def close(self):
+        self._successful_output_file.close()
+        self._failed_output_file.close()
+        if self._timings_output_file is not None:
+            self._timings_output_file.close()
+        for spool_file in self._spool_files.values():
+            spool_file.close()
@@ -1,13 +1,84 @@
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from typing import Dict
-import json
+import heapq
+import os
+import queue
+import signal
 import multiprocessing as mp
 
-from ctestgen.runner import find_tests, \
-    TestRunResult, init_failed_output_file, \
+from ctestgen.runner import find_tests, iter_tests, select_tests_shard, run_timed_test, get_test_key, \
+    TestDurationHistory, read_failed_tests, TestRunResult, init_failed_output_file, \
     init_successful_output_file, init_output_dir, init_metrics_output_file, \
-    init_results_file, Metrics, MetricsEncoder
+    init_results_file, init_timings_file, Metrics, TestResultsWriter, TestCoordinator, run_worker_agent, \
+    RunProgress, TestResultsStore, TestFlakinessHistory, get_default_workers_count, get_available_cpus, \
+    pin_process_to_cpu, WorkersThrottle, TestRunJournal, RESULTS_COMPRESSIONS, OutputSignatures, FailureClusters, \
+    DEFAULT_OUTPUT_SCRUBBERS, get_test_shard
+from ctestgen.runner.utils import _get_actual_datetime_string, _get_safe_filename
+
+
+_worker_runner = None
+_worker_env = None
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit(1)
+
+
+def _init_worker(runner, env, worker_cpus=None, started_workers_count=None):
+    """
+    Pool initializer, that stores runner in worker process once,
+    instead of sending it with every test.
+    Terminated worker exits with SystemExit, so that the tool it runs is killed too.
+    If worker_cpus are given, every worker is pinned to the next of them.
+    """
+    global _worker_runner, _worker_env
+    signal.signal(signal.SIGTERM, _exit_worker)
+    _worker_runner = runner
+    _worker_env = env
+    if worker_cpus is not None:
+        with started_workers_count.get_lock():
+            worker_index = started_workers_count.value
+            started_workers_count.value += 1
+        pin_process_to_cpu(worker_cpus[worker_index % len(worker_cpus)])
+
+
+def _run_worker_test(test):
+    test_dir, test_filename = test
+    return test_dir, run_timed_test(_worker_runner, test_dir, test_filename, _worker_env)
+
+
+def _run_worker_matrix_test(task):
+    """
+    Runs test with the runner of given index, the worker stores list of runners.
+    """
+    runner_idx, test_dir, test_filename = task
+    return runner_idx, test_dir, run_timed_test(_worker_runner[runner_idx], test_dir, test_filename, _worker_env)
+
+
+def _run_worker_method(task):
+    """
+    Calls runner method by name with given arguments and environment,
+    lets subclasses run their own kinds of tasks in the pool.
+    """
+    method_name, args = task
+    return getattr(_worker_runner, method_name)(*args, _worker_env)
+
+
+def _feed_pool_tasks(tasks_results, tasks, tasks_queue):
+    """
+    Puts tasks to queue, that pool takes them from, in the calling thread,
+    and yields results of pool, that are ready, in between.
+    """
+    for task in tasks:
+        tasks_queue.put(task)
+        while True:
+            try:
+                yield tasks_results.next(timeout=0)
+            except mp.TimeoutError:
+                break
+    tasks_queue.put(None)
+    yield from tasks_results
 
 
 class TestRunner(metaclass=ABCMeta):
@@ -20,7 +91,45 @@ class TestRunner(metaclass=ABCMeta):
                  print_run_progress=True,
                  print_percent_step=10,
                  print_global_metrics=True,
-                 print_testsets_metrics=True):
+                 print_testsets_metrics=True,
+                 keep_test_names=True,
+                 output_buffer_size=1024 * 1024,
+                 output_flush_interval=5,
+                 coordinator_address=None,
+                 lease_timeout=600,
+                 shard_index=None,
+                 shard_count=None,
+                 slowest_tests_count=10,
+                 schedule_by_duration=True,
+                 duration_history_file_path=None,
+                 default_test_duration=None,
+                 failed_first_from=None,
+                 fail_fast=False,
+                 max_failures=None,
+                 discovery_index_file_path=None,
+                 discovery_workers_count=8,
+                 lazy_discovery=False,
+                 progress_callback=None,
+                 progress_interval=10,
+                 results_store_path=None,
+                 retries=0,
+                 retry_result_types=None,
+                 flakiness_history_file_path=None,
+                 flaky_tests_policy=None,
+                 flaky_threshold=0.1,
+                 max_workers=None,
+                 pin_workers=False,
+                 max_load_per_cpu=None,
+                 min_available_memory=None,
+                 write_journal=True,
+                 journal_sync_interval=1,
+                 resume=None,
+                 results_compression=None,
+                 cluster_failures=False,
+                 deduplicate_outputs=False,
+                 deduplicate_outputs_min_size=4096,
+                 output_scrubbers=None,
+                 test_result_callback=None):
         self.test_base_dir = test_base_dir
         self.runner_name = runner_name if runner_name is not None else str(self.__class__)
         self.output_base_dir = output_base_dir
@@ -38,6 +147,93 @@ class TestRunner(metaclass=ABCMeta):
         self.failed_output_file_path = None
         self.metrics_output_file_path = None
         self.results_output_file_path = None
+        self.timings_output_file_path = None
+        self.keep_test_names = keep_test_names
+        self.output_buffer_size = output_buffer_size
+        self.output_flush_interval = output_flush_interval
+        self.coordinator_address = coordinator_address
+        self.lease_timeout = lease_timeout
+        if (shard_index is None) != (shard_count is None) or \
+                (shard_count is not None and not 0 <= shard_index < shard_count):
+            raise ValueError('Wrong shard ' + str(shard_index) + ' of ' + str(shard_count))
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.slowest_tests_count = slowest_tests_count
+        self.slowest_tests = []
+        self.schedule_by_duration = schedule_by_duration
+        self.duration_history_file_path = duration_history_file_path if duration_history_file_path is not None \
+            else os.path.join(output_base_dir, _get_safe_filename(self.runner_name) + '_durations.json')
+        # History at default path is saved only with results, so runs without output files
+        # do not write to output_base_dir
+        self.save_duration_history = dump_results_to_files or duration_history_file_path is not None
+        self.default_test_duration = default_test_duration
+        self.failed_first_from = failed_first_from
+        self.max_failures = 1 if fail_fast else max_failures
+        self.failures_count = 0
+        self.not_run_tests_count = 0
+        self.discovery_index_file_path = discovery_index_file_path
+        self.discovery_workers_count = discovery_workers_count
+        self.lazy_discovery = lazy_discovery
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.run_progress = None
+        self.results_store_path = results_store_path
+        self.run_id = None
+        self._results_store = None
+        self.retries = retries
+        # True while results of resumed run are replayed from its journal
+        self._replaying_journal = False
+        # Attempt of tests, that are run now, workers get it with the runner
+        self._attempt = 0
+        self.retry_result_types = retry_result_types if retry_result_types is not None \
+            else (TestRunResult.ResultType.FAIL, TestRunResult.ResultType.TIMEOUT)
+        self.flakiness_history_file_path = flakiness_history_file_path if flakiness_history_file_path is not None \
+            else os.path.join(output_base_dir, _get_safe_filename(self.runner_name) + '_flakiness.json')
+        if flaky_tests_policy not in (None, 'deprioritise', 'quarantine'):
+            raise ValueError('Unknown flaky tests policy: ' + str(flaky_tests_policy))
+        self.flaky_tests_policy = flaky_tests_policy
+        self.flaky_threshold = flaky_threshold
+        self._flakiness_history = None
+        self.max_workers = max_workers
+        self.pin_workers = pin_workers
+        self.max_load_per_cpu = max_load_per_cpu
+        self.min_available_memory = min_available_memory
+        if resume is not None and (lazy_discovery or not dump_results_to_files):
+            raise ValueError('Resumed run requires dump_results_to_files and no lazy_discovery')
+        if resume is not None and not os.path.exists(os.path.join(resume, 'journal.jsonl')):
+            raise ValueError('Run can not be resumed without journal: ' + os.path.join(resume, 'journal.jsonl'))
+        self.write_journal = write_journal
+        self.journal_sync_interval = journal_sync_interval
+        self.resume = resume
+        self._journal = None
+        if results_compression not in RESULTS_COMPRESSIONS:
+            raise ValueError('Unknown results compression: ' + str(results_compression))
+        self.results_compression = results_compression
+        self.cluster_failures = cluster_failures
+        self.deduplicate_outputs = deduplicate_outputs
+        self.deduplicate_outputs_min_size = deduplicate_outputs_min_size
+        self.output_signatures = OutputSignatures(output_scrubbers if output_scrubbers is not None
+                                                  else DEFAULT_OUTPUT_SCRUBBERS) \
+            if cluster_failures else None
+        self.failure_clusters = None
+        self.test_result_callback = test_result_callback
+        self._duration_history = None
+        self._results_writer = None
+        self._found_tests = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_results_writer'] = None
+        state['_duration_history'] = None
+        state['_found_tests'] = None
+        state['progress_callback'] = None
+        state['test_result_callback'] = None
+        state['run_progress'] = None
+        state['_results_store'] = None
+        state['_flakiness_history'] = None
+        state['_journal'] = None
+        state['failure_clusters'] = None
+        return state
 
     def _on_run_start(self, tests):
         pass
@@ -59,62 +255,439 @@ class TestRunner(metaclass=ABCMeta):
     def _on_test(self, test_dir, test_filename, env) -> TestRunResult:
         pass
 
-    def run(self):
-        tests = find_tests(self.test_base_dir, self.test_filename_extensions)
+    def _on_test_result(self, test_dir, test_result):
+        self.testsets_metrics[test_dir].add_test_result(test_result.result_type,
+                                                        test_result.test_filename if self.keep_test_names else None)
+        self.testsets_metrics[test_dir].add_test_resource_usage(test_result)
+        if test_result.result_type not in (TestRunResult.ResultType.SUCCESS, TestRunResult.ResultType.FLAKY):
+            self.failures_count += 1
+        if test_result.duration is not None and self._duration_history is not None and not self._replaying_journal:
+            self._duration_history.update(get_test_key(self.test_base_dir, test_dir, test_result.test_filename),
+                                          test_result.duration)
+        if test_result.duration is not None and self.slowest_tests_count > 0:
+            slowest_test = (test_result.duration, os.path.join(test_dir, test_result.test_filename))
+            if len(self.slowest_tests) < self.slowest_tests_count:
+                heapq.heappush(self.slowest_tests, slowest_test)
+            else:
+                heapq.heappushpop(self.slowest_tests, slowest_test)
+        if self.failure_clusters is not None and FailureClusters.is_clustered(test_result):
+            output_signature, normalised_output = self.output_signatures.get_signature(test_result.test_filename,
+                                                                                       test_result.test_output)
+            self.failure_clusters.add(test_dir, test_result, output_signature, normalised_output)
+        output_offset = None
+        if self._results_writer is not None:
+            output_offset = self._results_writer.write(test_dir, test_result)
+        if self._journal is not None:
+            self._journal.add(test_dir, test_result)
+        if self._results_store is not None:
+            # Full output is referenced, if it was cut in outputs file
+            if test_result.output_file_path is not None:
+                output_file_path, output_offset = test_result.output_file_path, None
+            elif test_result.result_type == TestRunResult.ResultType.SUCCESS:
+                output_file_path = self.successful_output_file_path
+            else:
+                output_file_path = self.failed_output_file_path
+            self._results_store.add_test_result(self.run_id,
+                                                get_test_key(self.test_base_dir, test_dir, test_result.test_filename),
+                                                test_dir, test_result, output_file_path, output_offset)
+
+    def _on_run_progress(self, run_progress):
+        """
+        Called every print_percent_step percents of completed tests
+        and every progress_interval seconds.
+        """
+        if self.print_run_progress:
+            print(run_progress.get_description())
+        if self.progress_callback is not None:
+            self.progress_callback(run_progress)
+
+    def _on_testset_finish(self, test_dir):
+        self.testsets_metrics[test_dir].finish_time = datetime.now()
+        self.global_metrics.merge(self.testsets_metrics[test_dir])
+        # Only counts of testset are printed, so its test names are kept only in global metrics
+        self.testsets_metrics[test_dir].clear_test_names()
+
+    def get_slowest_tests_description(self):
+        slowest_tests_descriptions = ['%.3fs %s\n' % slowest_test
+                                      for slowest_test in sorted(self.slowest_tests, reverse=True)]
+        return 'Slowest tests:\n' + ''.join(slowest_tests_descriptions)
+
+    def _find_tests(self):
+        tests = find_tests(self.test_base_dir, self.test_filename_extensions,
+                           self.discovery_index_file_path, self.discovery_workers_count)
+        if self.shard_count is not None:
+            tests = select_tests_shard(tests, self.test_base_dir, self.shard_index, self.shard_count)
+        return tests
+
+    def _schedule_testset(self, test_dir, test_filenames):
+        print("Tests dir: " + test_dir)
+        self.testsets_metrics[test_dir].start_time = datetime.now()
+        self.testsets_metrics[test_dir].tests_count = len(test_filenames)
+        self._on_testdir(test_dir, test_filenames)
+        test_filenames = self._filter_test_filenames(test_filenames)
+        return [(test_dir, test_filename) for test_filename in test_filenames]
+
+    def _schedule_tests(self, tests):
+        """
+        Calls testdir hooks and returns list of (test_dir, test_filename) pairs
+        for every test of the run, that forms single work queue.
+        """
+        scheduled_tests = []
+        for test_dir, test_filenames in tests.items():
+            scheduled_tests += self._schedule_testset(test_dir, test_filenames)
+        return scheduled_tests
+
+    def _schedule_discovered_tests(self, tests, remaining_tests_counts):
+        """
+        Yields (test_dir, test_filename) pairs of every directory as soon as it is discovered,
+        so tests run while discovery goes on. Discovered directories are added to tests.
+        Tests are not reordered by duration history or previous failures.
+        The generator is consumed by the thread, that processes results of tests.
+        """
+        discovered_tests = iter_tests(self.test_base_dir, self.test_filename_extensions,
+                                      self.discovery_index_file_path, self.discovery_workers_count)
+        for test_dir, test_filenames in discovered_tests:
+            if self.shard_count is not None:
+                test_filenames = select_tests_shard({test_dir: test_filenames}, self.test_base_dir,
+                                                    self.shard_index, self.shard_count).get(test_dir)
+                if test_filenames is None:
+                    continue
+            tests[test_dir] = test_filenames
+            if self.dump_results_to_files:
+                self._write_test_dir_headers(test_dir)
+            self.testsets_metrics[test_dir] = Metrics()
+            testset_tests = self._schedule_testset(test_dir, test_filenames)
+            remaining_tests_counts[test_dir] = len(testset_tests)
+            self.run_progress.tests_count += len(testset_tests)
+            yield from testset_tests
+
+    def _write_test_dir_headers(self, test_dir):
+        """
+        Adds discovered directory to the lists of directories, that output files start with.
+        """
+        self._results_writer.write_test_dir(test_dir)
+        with open(self.metrics_output_file_path, 'a') as metrics_output_file:
+            metrics_output_file.write(test_dir + '\n')
+
+    def _get_workers_count(self):
+        """
+        Returns max_workers if it is set, otherwise count of CPUs available
+        to this process, limited by its cgroup CPU quota.
+        """
+        return self.max_workers if self.max_workers is not None else get_default_workers_count()
+
+    def _create_workers_throttle(self, workers_count):
+        """
+        Returns WorkersThrottle if max_load_per_cpu or min_available_memory is set, otherwise None.
+        """
+        if self.max_load_per_cpu is None and self.min_available_memory is None:
+            return None
+        return WorkersThrottle(workers_count, self.max_load_per_cpu, self.min_available_memory)
 
+    def _order_tests(self, scheduled_tests):
+        """
+        Returns scheduled tests in order of their running.
+        With schedule_by_duration tests with longest durations in previous runs go first,
+        with failed_first_from tests, that did not succeed in that previous run, go before them.
+        """
+        if self.schedule_by_duration:
+            scheduled_tests = self._duration_history.sort_tests(
+                scheduled_tests, lambda test_dir, test_filename: get_test_key(self.test_base_dir, test_dir,
+                                                                              test_filename))
+        if self.flaky_tests_policy == 'deprioritise':
+            scheduled_tests = self._flakiness_history.sort_tests(
+                scheduled_tests, lambda test_dir, test_filename: get_test_key(self.test_base_dir, test_dir,
+                                                                              test_filename))
+        if self.failed_first_from is not None:
+            failed_test_keys, failed_test_filenames = read_failed_tests(self.failed_first_from, self.test_base_dir)
+            scheduled_tests = sorted(scheduled_tests,
+                                     key=lambda test: test[1] not in failed_test_filenames and
+                                     get_test_key(self.test_base_dir, *test) not in failed_test_keys)
+        return scheduled_tests
+
+    def _should_retry(self, test_result, attempt):
+        return attempt < self.retries and test_result.result_type in self.retry_result_types
+
+    def _get_final_test_result(self, test_dir, test_result, first_test_result, attempt):
+        """
+        Returns result of test after its last attempt: FLAKY if it passed on retry
+        or if known flaky test failed in quarantine, and updates flakiness history.
+        """
+        if self._flakiness_history is None:
+            return test_result
+        test_key = get_test_key(self.test_base_dir, test_dir, test_result.test_filename)
+        if test_result.result_type == TestRunResult.ResultType.SUCCESS and first_test_result is not None:
+            test_result.result_type = TestRunResult.ResultType.FLAKY
+            test_result.test_output = 'Passed on attempt ' + str(attempt + 1) + ', first attempt result: ' + \
+                                      first_test_result.result_type.name + '\n' + first_test_result.test_output + \
+                                      '\n' + test_result.test_output
+        elif test_result.result_type != TestRunResult.ResultType.SUCCESS and \
+                self.flaky_tests_policy == 'quarantine' and self._flakiness_history.is_flaky(test_key):
+            test_result.result_type = TestRunResult.ResultType.FLAKY
+            test_result.test_output = 'Quarantined flaky test failed\n' + test_result.test_output
+        self._flakiness_history.update(test_key, test_result.result_type == TestRunResult.ResultType.FLAKY)
+        return test_result
+
+    def _process_tests_results(self, tests_results, remaining_tests_counts, retried_tests, attempt=0):
+        """
+        Processes results in order of completion. Tests, that should be retried,
+        are put to retried_tests with their first results instead.
+        Returns False if the run was stopped by max_failures.
+        """
+        try:
+            for test_dir, test_result in tests_results:
+                test = (test_dir, test_result.test_filename)
+                first_test_result = retried_tests.pop(test, None)
+                if self._should_retry(test_result, attempt):
+                    retried_tests[test] = first_test_result if first_test_result is not None else test_result
+                    continue
+                test_result = self._get_final_test_result(test_dir, test_result, first_test_result, attempt)
+                if not self._on_final_test_result(test_dir, test_result, remaining_tests_counts):
+                    return False
+        finally:
+            if hasattr(tests_results, 'close'):
+                tests_results.close()
+        return True
+
+    def _on_final_test_result(self, test_dir, test_result, remaining_tests_counts):
+        """
+        Returns False if the run is stopped by max_failures.
+        """
+        self._on_test_result(test_dir, test_result)
+        if self.test_result_callback is not None:
+            self.test_result_callback(test_dir, test_result)
+        if self.run_progress.add_test_result(test_result):
+            self._on_run_progress(self.run_progress)
+        remaining_tests_counts[test_dir] -= 1
+        if remaining_tests_counts[test_dir] == 0:
+            self._on_testset_finish(test_dir)
+        return self.max_failures is None or self.failures_count < self.max_failures
+
+    def _resume_tests(self, scheduled_tests, remaining_tests_counts):
+        """
+        Processes results of tests, that were completed before the run was interrupted,
+        from its journal, and returns scheduled tests, that were not completed,
+        or None if the run was stopped by max_failures.
+        """
+        completed_tests = dict()
+        for test_dir, test_result in TestRunJournal.read(os.path.join(self.output_dir, 'journal.jsonl')):
+            completed_tests[(test_dir, test_result.test_filename)] = test_result
+        print("Resuming run with " + str(len(completed_tests)) + " completed tests")
+        not_completed_tests = []
+        self._replaying_journal = True
+        try:
+            for test in scheduled_tests:
+                test_result = completed_tests.get(test)
+                if test_result is None:
+                    not_completed_tests.append(test)
+                elif not self._on_final_test_result(test[0], test_result, remaining_tests_counts):
+                    return None
+        finally:
+            self._replaying_journal = False
+        return not_completed_tests
+
+    def _run_in_pool(self, worker_function, tasks, env, worker_runner=None, workers_count=None):
+        """
+        Yields results of worker function for tasks in order of completion.
+        Workers store worker_runner, this runner by default.
+        If workers_count is given, exactly workers_count processes run tasks without throttling.
+        Tasks, that are not a list (e.g. lazily discovered tests, that call testdir hooks),
+        are taken in this thread between results and passed to the pool through a queue,
+        instead of being taken by the task handler thread of the pool.
+        """
+        throttled = workers_count is None
+        workers_count = workers_count if workers_count is not None else self._get_workers_count()
+        worker_cpus = get_available_cpus() if self.pin_workers else None
+        threads_pool = mp.Pool(workers_count, initializer=_init_worker,
+                               initargs=(worker_runner if worker_runner is not None else self, env, worker_cpus,
+                                         mp.Value('i', 0) if self.pin_workers else None))
+        print("Using " + str(workers_count) + " threads")
+        tasks_queue = queue.Queue() if not isinstance(tasks, list) else None
+        pool_tasks = iter(tasks_queue.get, None) if tasks_queue is not None else tasks
+        workers_throttle = self._create_workers_throttle(workers_count) if throttled else None
+        if workers_throttle is not None:
+            pool_tasks = workers_throttle.throttle(pool_tasks)
+        try:
+            tasks_results = threads_pool.imap_unordered(worker_function, pool_tasks)
+            if tasks_queue is not None:
+                tasks_results = _feed_pool_tasks(tasks_results, tasks, tasks_queue)
+            for task_result in tasks_results:
+                if workers_throttle is not None:
+                    workers_throttle.release()
+                yield task_result
+        except BaseException:
+            if tasks_queue is not None:
+                tasks_queue.put(None)
+            if workers_throttle is not None:
+                workers_throttle.close()
+            threads_pool.terminate()
+            raise
+        else:
+            threads_pool.close()
+        finally:
+            threads_pool.join()
+
+    def _run_tests(self, scheduled_tests, env):
+        """
+        Yields (test_dir, test_result) pairs in order of tests completion.
+        """
+        return self._run_in_pool(_run_worker_test, scheduled_tests, env)
+
+    def _serve_tests(self, scheduled_tests):
+        """
+        Serves tests to worker agents, started with run_worker(),
+        and yields (test_dir, test_result) pairs in order of their completion.
+        """
+        coordinator = TestCoordinator(self.coordinator_address, scheduled_tests, self.test_base_dir,
+                                      lease_timeout=self.lease_timeout)
+        coordinator.start()
+        print("Serving tests on " + str(coordinator.address[0]) + ':' + str(coordinator.address[1]))
+        try:
+            yield from coordinator.results()
+        finally:
+            coordinator.stop()
+
+    def _run_worker_agent(self, coordinator_address, queue_done, env):
+        return run_worker_agent(self, coordinator_address, env, queue_done=queue_done)
+
+    def run_worker(self, coordinator_address, workers_count=1):
+        """
+        Runs tests, served by run() of the runner with coordinator_address,
+        in workers_count agent processes. Tests paths are resolved
+        relatively to test_base_dir of this runner.
+        Returns count of run tests.
+        """
+        env = self._get_env()
+        if workers_count == 1:
+            return self._run_worker_agent(coordinator_address, None, env)
+        with mp.Manager() as manager:
+            queue_done = manager.Event()
+            tasks = [('_run_worker_agent', (coordinator_address, queue_done))] * workers_count
+            return sum(self._run_in_pool(_run_worker_method, tasks, env, workers_count=workers_count))
+
+    def _start_run(self, tests, order_tests=True):
+        """
+        Prepares output files, histories and metrics of the run
+        and returns scheduled tests and counts of remaining tests of every test dir.
+        Scheduled tests are not ordered, if order_tests is False.
+        """
         if self.dump_results_to_files:
-            self.output_dir = init_output_dir(self.output_base_dir, self.runner_name)
+            self.output_dir = init_output_dir(self.output_base_dir, self.runner_name) if self.resume is None \
+                else self.resume
             self.successful_output_file_path = init_successful_output_file(tests, self.output_dir)
             self.failed_output_file_path = init_failed_output_file(tests, self.output_dir)
             self.metrics_output_file_path = init_metrics_output_file(tests, self.output_dir)
-            self.results_output_file_path = init_results_file(self.output_dir)
-
-        env = self._get_env()
+            self.results_output_file_path = init_results_file(self.output_dir, self.results_compression)
+            self.timings_output_file_path = init_timings_file(self.output_dir)
+            self._results_writer = TestResultsWriter(self.successful_output_file_path,
+                                                     self.failed_output_file_path,
+                                                     self.results_output_file_path,
+                                                     timings_output_file_path=self.timings_output_file_path,
+                                                     buffer_size=self.output_buffer_size,
+                                                     flush_interval=self.output_flush_interval,
+                                                     deduplicate_outputs_min_size=self.deduplicate_outputs_min_size
+                                                     if self.deduplicate_outputs else None)
 
+        self.global_metrics.start_time = datetime.now()
+        if self.results_store_path is not None:
+            self.run_id = os.path.basename(self.output_dir) if self.output_dir is not None \
+                else self.runner_name + '_' + _get_actual_datetime_string()
+            self._results_store = TestResultsStore(self.results_store_path)
+            self._results_store.add_run(self.run_id, self.runner_name, self.global_metrics.start_time, self.output_dir)
+        if self.cluster_failures:
+            self.failure_clusters = FailureClusters()
         self._on_run_start(tests)
 
-        successful_tests_output_for_file = []
-        failed_tests_output_for_file = []
+        self.run_progress = RunProgress(percent_step=self.print_percent_step, report_interval=self.progress_interval)
+        if self.schedule_by_duration:
+            self._duration_history = TestDurationHistory(self.duration_history_file_path,
+                                                         default_duration=self.default_test_duration).load()
+            self._found_tests = tests
+        if self.retries > 0 or self.flaky_tests_policy is not None:
+            self._flakiness_history = TestFlakinessHistory(self.flakiness_history_file_path,
+                                                           flaky_threshold=self.flaky_threshold).load()
+        if self.lazy_discovery:
+            remaining_tests_counts = dict()
+            scheduled_tests = self._schedule_discovered_tests(tests, remaining_tests_counts)
+            if self.coordinator_address is not None:
+                scheduled_tests = list(scheduled_tests)
+        else:
+            for test_dir in tests.keys():
+                self.testsets_metrics[test_dir] = Metrics()
 
-        for test_dir in tests.keys():
-            self.testsets_metrics[test_dir] = Metrics()
+            scheduled_tests = self._schedule_tests(tests)
+            if order_tests:
+                scheduled_tests = self._order_tests(scheduled_tests)
 
-        threads_pool = mp.Pool(mp.cpu_count())
-        print("Using " + str(mp.cpu_count()) + " threads")
+            self.run_progress.tests_count = len(scheduled_tests)
+            remaining_tests_counts = {test_dir: 0 for test_dir in tests.keys()}
+            for test_dir, _ in scheduled_tests:
+                remaining_tests_counts[test_dir] += 1
+            for test_dir, remaining_tests_count in remaining_tests_counts.items():
+                if remaining_tests_count == 0:
+                    self._on_testset_finish(test_dir)
+        return scheduled_tests, remaining_tests_counts
+
+    def _open_journal(self):
+        if self.dump_results_to_files and self.write_journal:
+            self._journal = TestRunJournal(os.path.join(self.output_dir, 'journal.jsonl'),
+                                           self.journal_sync_interval).open()
+
+    def _retry_tests(self, retried_tests, remaining_tests_counts, env):
+        """
+        Runs retried tests again, until they are not retried any more.
+        Returns False if the run was stopped by max_failures.
+        """
+        run_completed = True
+        try:
+            while run_completed and len(retried_tests) != 0:
+                self._attempt += 1
+                print("Retrying " + str(len(retried_tests)) + " tests, attempt " + str(self._attempt + 1))
+                run_completed = self._process_tests_results(self._run_tests(list(retried_tests.keys()), env),
+                                                            remaining_tests_counts, retried_tests, self._attempt)
+        finally:
+            self._attempt = 0
+        return run_completed
+
+    def _is_found_test(self, test_key):
+        """
+        Returns False for key of test, that belongs to the run, but was not found by it.
+        Tests of other shards and, with lazy discovery, of not discovered directories are kept.
+        """
+        test_dir_key, _, test_filename = test_key.rpartition('/')
+        test_dir = os.path.join(self.test_base_dir, *test_dir_key.split('/')) if test_dir_key else self.test_base_dir
+        if self.shard_count is not None and \
+                get_test_shard(self.test_base_dir, test_dir, test_filename, self.shard_count) != self.shard_index:
+            return True
+        test_filenames = self._found_tests.get(test_dir)
+        if test_filenames is None:
+            return self.lazy_discovery
+        return test_filename in test_filenames
+
+    def _close_run(self):
+        if self._results_writer is not None:
+            self._results_writer.close()
+        if self._duration_history is not None and self.save_duration_history:
+            self._duration_history.prune(self._is_found_test)
+            self._duration_history.save()
+        self._found_tests = None
+        if self._results_store is not None:
+            self._results_store.close()
+        if self._flakiness_history is not None:
+            self._flakiness_history.save()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _finish_run(self, tests, remaining_tests_counts):
+        """
+        Writes metrics and results of the run.
+        """
+        self.not_run_tests_count = sum(remaining_tests_counts.values())
+        for test_dir in tests.keys():
+            if self.testsets_metrics[test_dir].finish_time is None:
+                self._on_testset_finish(test_dir)
 
-        for test_dir, test_filenames in tests.items():
-            print("Tests dir: " + test_dir)
-            self.testsets_metrics[test_dir].start_time = datetime.now()
-            self.testsets_metrics[test_dir].tests_count = len(test_filenames)
-            self._on_testdir(test_dir, test_filenames)
-            test_filenames = self._filter_test_filenames(test_filenames)
-
-            test_result_objects = [threads_pool.apply_async(self._on_test, args=(test_dir, test_filename, env))
-                                   for test_filename in test_filenames]
-            test_results = [r.get() for r in test_result_objects]
-
-            for idx, test_result in enumerate(test_results):
-                test_filename = test_result.test_filename
-                if test_result.result_type == TestRunResult.ResultType.SUCCESS:
-                    self.testsets_metrics[test_dir].successful_count += 1
-                    self.testsets_metrics[test_dir].successful_tests.append(test_filename)
-                    if self.dump_results_to_files:
-                        successful_tests_output_for_file.append('\nTest: ' + test_filename + '\n' +
-                                                                test_result.test_output + '\n')
-                else:
-                    self.testsets_metrics[test_dir].failed_count += 1
-                    self.testsets_metrics[test_dir].failed_tests.append(test_filename)
-                    if self.dump_results_to_files:
-                        failed_tests_output_for_file.append('\nTest: ' + test_filename + '\n' +
-                                                            test_result.test_output + '\n')
-            self.testsets_metrics[test_dir].finish_time = datetime.now()
-            self.global_metrics.tests_count += self.testsets_metrics[test_dir].tests_count
-            self.global_metrics.successful_count += self.testsets_metrics[test_dir].successful_count
-            self.global_metrics.failed_count += self.testsets_metrics[test_dir].failed_count
-            self.global_metrics.successful_tests += self.testsets_metrics[test_dir].successful_tests
-            self.global_metrics.failed_tests += self.testsets_metrics[test_dir].failed_tests
-
-        threads_pool.close()
         self.global_metrics.finish_time = datetime.now()
 
         testsets_metrics_descriptions = []
@@ -126,16 +699,17 @@ class TestRunner(metaclass=ABCMeta):
             print(testsets_metrics_output)
 
         global_metrics_description = 'Global:\n' + str(self.global_metrics)
+        if len(self.slowest_tests) != 0:
+            global_metrics_description += self.get_slowest_tests_description()
+        if self.failure_clusters is not None and len(self.failure_clusters.clusters) != 0:
+            global_metrics_description += self.failure_clusters.get_description(clusters_count=10)
+        if self.not_run_tests_count != 0:
+            global_metrics_description += 'Run stopped after ' + str(self.failures_count) + ' failures, ' + \
+                                          str(self.not_run_tests_count) + ' tests were not run\n'
         if self.print_global_metrics:
             print(global_metrics_description)
 
         if self.dump_results_to_files:
-            with open(self.successful_output_file_path, 'a') as successful_output_file:
-                successful_output_file.write(''.join(successful_tests_output_for_file))
-
-            with open(self.failed_output_file_path, 'a') as failed_output_file:
-                failed_output_file.write(''.join(failed_tests_output_for_file))
-
             if self.print_testsets_metrics:
                 with open(self.metrics_output_file_path, 'a') as metrics_output_file:
                     metrics_output_file.write(testsets_metrics_output + '\n')
@@ -144,7 +718,32 @@ class TestRunner(metaclass=ABCMeta):
                 with open(self.metrics_output_file_path, 'a') as metrics_output_file:
                     metrics_output_file.write(global_metrics_description + '\n')
 
-            with open(self.results_output_file_path, 'w') as results_output_file:
-                json.dump(self.global_metrics, results_output_file, cls=MetricsEncoder)
+            self._results_writer.write_results(self.global_metrics)
+            if self.failure_clusters is not None:
+                self.failure_clusters.write_report(self.output_dir)
+            journal_file_path = os.path.join(self.output_dir, 'journal.jsonl')
+            if self.not_run_tests_count == 0 and os.path.exists(journal_file_path):
+                os.remove(journal_file_path)
 
         self._on_run_finish(tests, self.global_metrics)
+
+    def run(self):
+        tests = dict() if self.lazy_discovery else self._find_tests()
+        env = self._get_env()
+        scheduled_tests, remaining_tests_counts = self._start_run(tests)
+        retried_tests = dict()
+        try:
+            if self.resume is not None:
+                scheduled_tests = self._resume_tests(scheduled_tests, remaining_tests_counts)
+            self._open_journal()
+            if scheduled_tests is not None:
+                tests_results = self._serve_tests(scheduled_tests) if self.coordinator_address is not None \
+                    else self._run_tests(scheduled_tests, env)
+                if self._process_tests_results(tests_results, remaining_tests_counts, retried_tests):
+                    self._retry_tests(retried_tests, remaining_tests_counts, env)
+        finally:
+            if hasattr(scheduled_tests, 'close'):
+                # Lazy discovery stops, if the run was stopped before the whole tree was walked
+                scheduled_tests.close()
+            self._close_run()
+        self._finish_run(tests, remaining_tests_counts)
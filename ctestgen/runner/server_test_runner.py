@@ -0,0 +1,73 @@
+import os
+from multiprocessing import util
+from abc import abstractmethod
+from ctestgen.runner import TestRunner, TestRunResult, ProgramTimeoutExpired, \
+    find_environment_variables, ToolServer, ToolServerCrashed
+
+
+class ServerTestRunner(TestRunner):
+    """
+    Runs tests with resident tool server, one per worker process,
+    instead of starting the tool for every test.
+    Crashed servers are restarted and the test is sent again up to crash_retries times,
+    servers are restarted after max_requests_per_server requests to contain leaks.
+    """
+    def __init__(self, server_arguments, *args, print_test_info=True, protocol='line',
+                 response_terminator='<<<END>>>', max_requests_per_server=None, timeout=None, crash_retries=1,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.server_arguments = server_arguments
+        self.print_test_info = print_test_info
+        self.protocol = protocol
+        self.response_terminator = response_terminator
+        self.max_requests_per_server = max_requests_per_server
+        self.timeout = timeout
+        self.crash_retries = crash_retries
+        self._tool_server = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_tool_server'] = None
+        return state
+
+    def _get_env(self):
+        return find_environment_variables()
+
+    @abstractmethod
+    def _process_program_response(self, test_dir, test_filename, program_response) -> TestRunResult:
+        pass
+
+    def _get_tool_server(self, env):
+        if self._tool_server is None:
+            self._tool_server = ToolServer(self.server_arguments, env, protocol=self.protocol,
+                                           response_terminator=self.response_terminator)
+            util.Finalize(self, self._stop_tool_server, exitpriority=10)
+        if self.max_requests_per_server is not None and \
+                self._tool_server.requests_count >= self.max_requests_per_server:
+            self._tool_server.stop()
+        if not self._tool_server.is_running():
+            self._tool_server.kill()
+            self._tool_server.start()
+        return self._tool_server
+
+    def _stop_tool_server(self):
+        if self._tool_server is not None:
+            self._tool_server.stop()
+
+    def _on_test(self, test_dir, test_filename, env):
+        if self.print_test_info:
+            print(test_filename)
+        crash_error = None
+        for _ in range(self.crash_retries + 1):
+            tool_server = self._get_tool_server(env)
+            try:
+                response = tool_server.request(os.path.join(test_dir, test_filename), self.timeout)
+            except ProgramTimeoutExpired as timeout_expired:
+                tool_server.kill()
+                return TestRunResult(timeout_expired.result_type, str(timeout_expired), test_filename)
+            except ToolServerCrashed as server_crashed:
+                tool_server.kill()
+                crash_error = server_crashed
+                continue
+            return self._process_program_response(test_dir, test_filename, (response, ''))
+        return TestRunResult(TestRunResult.ResultType.FAIL, str(crash_error), test_filename)
@@ -0,0 +1,126 @@
+import queue
+import subprocess
+import sys
+import threading
+
+from ctestgen.runner import ProgramTimeoutExpired
+from ctestgen.runner.utils import _kill_process_group
+
+
+class ToolServerCrashed(Exception):
+    pass
+
+
+class ToolServer:
+    """
+    Resident tool process, that receives test paths on stdin, one per line,
+    and writes response for every of them to stdout.
+    With 'line' protocol response is a sequence of lines, that ends with
+    response_terminator line, with 'length' protocol response is a line with
+    length of response in bytes, followed by response itself.
+    Server must exit, when its stdin is closed.
+    """
+    PROTOCOLS = ('line', 'length')
+
+    def __init__(self, server_arguments, env=None, protocol='line', response_terminator='<<<END>>>',
+                 encoding='utf-8'):
+        if protocol not in ToolServer.PROTOCOLS:
+            raise ValueError('Unknown tool server protocol: ' + str(protocol))
+        self.server_arguments = server_arguments
+        self.env = env
+        self.protocol = protocol
+        self.response_terminator = response_terminator
+        self.encoding = encoding
+        self.requests_count = 0
+        self._process = None
+        self._responses = None
+
+    def is_running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        popen_kwargs = dict()
+        if sys.platform != 'win32':
+            popen_kwargs['start_new_session'] = True
+        self._process = subprocess.Popen(self.server_arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, env=self.env, **popen_kwargs)
+        self._responses = queue.Queue()
+        self.requests_count = 0
+        reader_thread = threading.Thread(target=self._read_responses,
+                                         args=(self._process.stdout, self._responses), daemon=True)
+        reader_thread.start()
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            _kill_process_group(self._process)
+            self._process.wait()
+        self._process = None
+        self._responses = None
+
+    def kill(self):
+        if self._process is None:
+            return
+        _kill_process_group(self._process)
+        self._process.wait()
+        self._process = None
+        self._responses = None
+
+    def request(self, test_path, timeout=None):
+        """
+        Sends test path to the server and returns its response.
+        Raises ToolServerCrashed if the server exited,
+        and ProgramTimeoutExpired if response was not received in time.
+        """
+        if not self.is_running():
+            raise ToolServerCrashed('Tool server is not running')
+        self.requests_count += 1
+        try:
+            self._process.stdin.write((test_path + '\n').encode(self.encoding))
+            self._process.stdin.flush()
+        except OSError:
+            raise ToolServerCrashed('Tool server closed its input')
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise ProgramTimeoutExpired('Timeout of ' + str(timeout) + 's expired', '', '')
+        if response is None:
+            raise ToolServerCrashed('Tool server exited with code ' + str(self._process.wait()))
+        return response
+
+    def _read_responses(self, server_output, responses):
+        try:
+            while True:
+                response = self._read_response(server_output)
+                responses.put(response)
+                if response is None:
+                    return
+        except (OSError, ValueError):
+            responses.put(None)
+
+    def _read_response(self, server_output):
+        if self.protocol == 'length':
+            header = server_output.readline()
+            if not header:
+                return None
+            response_length = int(header)
+            response = server_output.read(response_length)
+            if len(response) != response_length:
+                return None
+            return response.decode(self.encoding, errors='replace')
+        response_lines = []
+        while True:
+            line = server_output.readline()
+            if not line:
+                return None
+            line = line.decode(self.encoding, errors='replace')
+            if line.rstrip('\r\n') == self.response_terminator:
+                return ''.join(response_lines).replace('\r\n', '\n')
+            response_lines.append(line)
@@ -1,29 +1,82 @@
 import subprocess
 import os
 import sys
+import signal
+import functools
+import asyncio
+import locale
+import hashlib
+import math
+import time
 from datetime import datetime
-import pathlib
 import enum
 import json
+import re
+import threading
+import itertools
+import gzip
+import lzma
 
+if sys.platform != 'win32':
+    import resource
 
-def find_tests(base_dir, test_filename_extensions):
+
+def get_test_key(test_base_dir, test_dir, test_filename):
+    """
+    Returns path of test relative to test_base_dir with '/' separators,
+    that identifies test between runs and machines.
+    """
+    return os.path.relpath(os.path.join(test_dir, test_filename), test_base_dir).replace(os.sep, '/')
+
+
+def get_test_shard(test_base_dir, test_dir, test_filename, shard_count):
+    """
+    Returns shard index of test, that depends only on its path relative to test_base_dir,
+    so it is the same between runs and machines.
     """
-    Returns dictionary that collects pairs of
-    directory and test filenames from it.
+    test_key = get_test_key(test_base_dir, test_dir, test_filename)
+    return int(hashlib.sha1(test_key.encode()).hexdigest(), 16) % shard_count
+
+
+def select_tests_shard(tests, test_base_dir, shard_index, shard_count):
+    """
+    Returns tests, that belong to shard with shard_index of shard_count shards.
     """
-    tests = dict()
-    for dir_description in os.walk(base_dir):
-        dir_filenames = dir_description[2]
-        target_filenames = set()
-        if len(dir_filenames) != 0:
-            for filename in dir_filenames:
-                file_extension = ''.join(pathlib.Path(filename).suffixes)
-                if file_extension in test_filename_extensions:
-                    target_filenames.add(filename)
-            if len(target_filenames) != 0:
-                tests[dir_description[0]] = target_filenames
-    return tests
+    shard_tests = dict()
+    for test_dir, test_filenames in tests.items():
+        shard_test_filenames = {test_filename for test_filename in test_filenames
+                                if get_test_shard(test_base_dir, test_dir, test_filename, shard_count) == shard_index}
+        if len(shard_test_filenames) != 0:
+            shard_tests[test_dir] = shard_test_filenames
+    return shard_tests
+
+
+def read_failed_tests(previous_output_path, test_base_dir):
+    """
+    Returns set of keys (see get_test_key) of tests, that did not succeed in previous run,
+    read from timings.jsonl of its output dir, and set of filenames of such tests,
+    read from its results.json, if there are no timings.
+    previous_output_path is output dir of previous run or its results.json.
+    """
+    if os.path.isdir(previous_output_path):
+        timings_file_path = os.path.join(previous_output_path, 'timings.jsonl')
+        if os.path.exists(timings_file_path):
+            failed_test_keys = set()
+            with open(timings_file_path, 'r') as timings_file:
+                for line in timings_file:
+                    test_timing = json.loads(line)
+                    if test_timing['result_type'] != TestRunResult.ResultType.SUCCESS.name:
+                        failed_test_keys.add(get_test_key(test_base_dir, test_timing['test_dir'],
+                                                          test_timing['test_filename']))
+            return failed_test_keys, set()
+        previous_output_path = find_results_file(previous_output_path)
+    with open_results_file(previous_output_path) as results_file:
+        results = decode_metrics(json.load(results_file))
+    failed_test_filenames = set()
+    for result_type, (_, tests_field) in Metrics.RESULT_TYPE_FIELDS.items():
+        if result_type != TestRunResult.ResultType.SUCCESS:
+            failed_test_filenames.update(getattr(results, tests_field))
+    return set(), failed_test_filenames
 
 
 def _get_datetime_string(current_datetime):
@@ -34,6 +87,13 @@ def _get_actual_datetime_string():
     return _get_datetime_string(datetime.now())
 
 
+def _get_safe_filename(name):
+    """
+    Returns name with characters, that are not allowed in filenames on some systems, replaced by '_'.
+    """
+    return re.sub(r'[^\w.-]', '_', name)
+
+
 def init_output_dir(output_dir_base, runner_name):
     output_dir = os.path.join(output_dir_base, runner_name + '_' + _get_actual_datetime_string())
     if not os.path.exists(output_dir):
@@ -71,11 +131,41 @@ def _init_output_json_file(filename, output_dir):
     return output_file_path
 
 
-def init_results_file(output_dir):
-    results_output_filename = 'results.json'
+RESULTS_COMPRESSIONS = {None: '', 'gzip': '.gz', 'lzma': '.xz'}
+
+
+def init_results_file(output_dir, compression=None):
+    results_output_filename = 'results.json' + RESULTS_COMPRESSIONS[compression]
     return _init_output_json_file(results_output_filename, output_dir)
 
 
+def find_results_file(output_dir):
+    """
+    Returns path of results file of output dir, that may be compressed.
+    """
+    for results_file_suffix in RESULTS_COMPRESSIONS.values():
+        results_file_path = os.path.join(output_dir, 'results.json' + results_file_suffix)
+        if os.path.exists(results_file_path) and os.path.getsize(results_file_path) != 0:
+            return results_file_path
+    return os.path.join(output_dir, 'results.json')
+
+
+def open_results_file(results_file_path, mode='r'):
+    """
+    Opens results file in text mode, compression is chosen by its extension.
+    """
+    if results_file_path.endswith(RESULTS_COMPRESSIONS['gzip']):
+        return gzip.open(results_file_path, mode + 't')
+    if results_file_path.endswith(RESULTS_COMPRESSIONS['lzma']):
+        return lzma.open(results_file_path, mode + 't')
+    return open(results_file_path, mode)
+
+
+def init_timings_file(output_dir):
+    timings_output_filename = 'timings.jsonl'
+    return _init_output_json_file(timings_output_filename, output_dir)
+
+
 def find_environment_variables():
     compiler_environment_variables = dict()
     if sys.platform == 'win32':
@@ -112,10 +202,318 @@ def find_environment_variables():
     return compiler_environment_variables
 
 
-def get_program_response(args, env):
-    process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             universal_newlines=True, env=env)
-    return process.stdout, process.stderr
+MEMORY_ERROR_MARKERS = ('std::bad_alloc', 'Cannot allocate memory', 'out of memory', 'MemoryError')
+# Program, that printed a memory error marker, exceeded memory limit only if it was killed by a signal,
+# or its max RSS reached this part of the limit
+MEMORY_LIMIT_RSS_RATIO = 0.8
+
+
+def _limit_program_resources(cpu_time_limit, memory_limit):
+    if cpu_time_limit is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit, cpu_time_limit + 1))
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _kill_process_group(process):
+    """
+    Kills process group, that the process leads on POSIX systems,
+    or only the process, if there is no such group.
+    """
+    if sys.platform != 'win32':
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except (ProcessLookupError, PermissionError):
+            pass
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def _get_program_limits_kwargs(cpu_time_limit, memory_limit):
+    """
+    On POSIX systems program always runs in its own session,
+    so that its whole process group can be killed on timeout or when the run is stopped.
+    """
+    limits_kwargs = dict()
+    if sys.platform != 'win32':
+        limits_kwargs['start_new_session'] = True
+        if cpu_time_limit is not None or memory_limit is not None:
+            limits_kwargs['preexec_fn'] = functools.partial(_limit_program_resources, cpu_time_limit, memory_limit)
+    return limits_kwargs
+
+
+def _is_killed_by_limit(returncode, cpu_time_limit, memory_limit):
+    """
+    Returns True if program, that runs with setrlimit limits, was killed by a signal, they may send or cause.
+    """
+    if sys.platform == 'win32' or (cpu_time_limit is None and memory_limit is None):
+        return False
+    return returncode in (-signal.SIGXCPU, -signal.SIGKILL, -signal.SIGSEGV)
+
+
+def _check_program_limits(returncode, stdout, stderr, cpu_time_limit, memory_limit, resource_usage=None):
+    if sys.platform != 'win32' and cpu_time_limit is not None and \
+            returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        raise ProgramResourceExceeded('CPU time limit of ' + str(cpu_time_limit) + 's exceeded', stdout, stderr,
+                                      resource_usage)
+    if memory_limit is None or returncode == 0 or \
+            not any(marker in stderr or marker in stdout for marker in MEMORY_ERROR_MARKERS):
+        return
+    max_rss = resource_usage.get('max_rss') if resource_usage is not None else None
+    if returncode < 0 or (max_rss is not None and max_rss >= memory_limit * MEMORY_LIMIT_RSS_RATIO):
+        raise ProgramResourceExceeded('Memory limit of ' + str(memory_limit) + ' bytes exceeded', stdout, stderr,
+                                      resource_usage)
+
+
+def _get_resource_usage(rusage):
+    max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    return {'user_time': rusage.ru_utime, 'system_time': rusage.ru_stime, 'max_rss': max_rss}
+
+
+class _ResourceUsagePopen(subprocess.Popen):
+    """
+    Popen, that waits for the process with os.wait4 where it is available,
+    and keeps its resource usage.
+    """
+    resource_usage = None
+
+    def _try_wait(self, wait_flags):
+        if not hasattr(os, 'wait4'):
+            return super()._try_wait(wait_flags)
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            self.resource_usage = _get_resource_usage(rusage)
+        return pid, status
+
+
+class ProgramResponse(tuple):
+    """
+    Pair of program stdout and stderr, that also keeps its return code
+    and resource usage (user_time, system_time, max_rss), if it is known.
+    If output was bounded, output_file_paths keeps paths of files
+    with full stdout and stderr, or None for outputs, that were not cut.
+    """
+    def __new__(cls, stdout, stderr, returncode=None, resource_usage=None, output_file_paths=(None, None)):
+        program_response = super().__new__(cls, (stdout, stderr))
+        program_response.returncode = returncode
+        program_response.resource_usage = resource_usage
+        program_response.output_file_paths = output_file_paths
+        return program_response
+
+    def __getnewargs__(self):
+        return self[0], self[1], self.returncode, self.resource_usage, self.output_file_paths
+
+
+class BoundedOutput:
+    """
+    Program output, that is read incrementally in bytes.
+    Only head_size first and tail_size last bytes are kept in memory,
+    the whole output is written to spill_file_path, if it is given.
+    The spill file is created only when output is cut, so spill_file_path
+    is None after close(), if nothing was cut.
+    """
+    def __init__(self, head_size, tail_size, spill_file_path=None):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.spill_file_path = spill_file_path
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.size = 0
+        self._spill_file = None
+
+    def _open_spill_file(self):
+        """
+        Opens spill file and writes output, that was kept before it was cut.
+        """
+        os.makedirs(os.path.dirname(self.spill_file_path), exist_ok=True)
+        self._spill_file = open(self.spill_file_path, 'wb')
+        self._spill_file.write(self.head)
+        self._spill_file.write(self.tail)
+
+    def write(self, data):
+        self.size += len(data)
+        if self._spill_file is None and self.spill_file_path is not None and \
+                self.size > self.head_size + self.tail_size:
+            self._open_spill_file()
+        if self._spill_file is not None:
+            self._spill_file.write(data)
+        head_data = data[:max(0, self.head_size - len(self.head))]
+        self.head += head_data
+        self.tail += data[len(head_data):]
+        if len(self.tail) > self.tail_size:
+            del self.tail[:len(self.tail) - self.tail_size]
+
+    def get_skipped_size(self):
+        return self.size - len(self.head) - len(self.tail)
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        elif self.get_skipped_size() == 0:
+            self.spill_file_path = None
+
+    def get_text(self):
+        skipped_size = self.get_skipped_size()
+        if skipped_size == 0:
+            return _decode_program_output(bytes(self.head + self.tail))
+        skipped_description = '\n... ' + str(skipped_size) + ' bytes skipped'
+        if self.spill_file_path is not None:
+            skipped_description += ', full output: ' + self.spill_file_path
+        return _decode_program_output(bytes(self.head)) + skipped_description + ' ...\n' + \
+            _decode_program_output(bytes(self.tail))
+
+
+def _create_bounded_outputs(output_limit, output_spill_path):
+    """
+    Returns bounded outputs for stdout and stderr, that keep output_limit bytes each,
+    half of them from the beginning and half from the end of output.
+    Full outputs are written to output_spill_path with .stdout and .stderr suffixes.
+    If output_limit is None, outputs are kept whole.
+    """
+    if output_limit is None:
+        return [BoundedOutput(sys.maxsize, 0), BoundedOutput(sys.maxsize, 0)]
+    return [BoundedOutput(output_limit // 2, output_limit - output_limit // 2,
+                          output_spill_path + suffix if output_spill_path is not None else None)
+            for suffix in ('.stdout', '.stderr')]
+
+
+def _read_program_output(stream, bounded_output, chunk_size=64 * 1024):
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        bounded_output.write(chunk)
+
+
+def get_program_response(args, env, timeout=None, cpu_time_limit=None, memory_limit=None,
+                         output_limit=None, output_spill_path=None):
+    """
+    Runs program and returns ProgramResponse with its stdout and stderr.
+    Program runs in its own process group, that is killed if the caller is interrupted.
+    If timeout (wall-clock seconds) is set, the group is killed when timeout expires,
+    and ProgramTimeoutExpired is raised.
+    cpu_time_limit (seconds) and memory_limit (address space bytes) are applied
+    with setrlimit on POSIX systems, ProgramResourceExceeded is raised if
+    the program was terminated by them. The group is killed as soon as the program
+    is killed by a limit, so that its children, that keep outputs open, do not delay the response.
+    If output_limit (bytes) is set, only beginning and end of every output
+    are kept in memory, see BoundedOutput.
+    """
+    bounded_outputs = _create_bounded_outputs(output_limit, output_spill_path)
+    timeout_expired = False
+    with _ResourceUsagePopen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                             **_get_program_limits_kwargs(cpu_time_limit, memory_limit)) as process:
+        output_readers = [threading.Thread(target=_read_program_output, args=(stream, bounded_output), daemon=True)
+                          for stream, bounded_output in zip((process.stdout, process.stderr), bounded_outputs)]
+        for output_reader in output_readers:
+            output_reader.start()
+        try:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process_group(process)
+                process.wait()
+                timeout_expired = True
+            if _is_killed_by_limit(process.returncode, cpu_time_limit, memory_limit):
+                _kill_process_group(process)
+        except BaseException:
+            _kill_process_group(process)
+            raise
+        finally:
+            for output_reader in output_readers:
+                output_reader.join()
+            for bounded_output in bounded_outputs:
+                bounded_output.close()
+    stdout, stderr = (bounded_output.get_text() for bounded_output in bounded_outputs)
+    if timeout_expired:
+        raise ProgramTimeoutExpired('Timeout of ' + str(timeout) + 's expired', stdout, stderr,
+                                    process.resource_usage)
+    _check_program_limits(process.returncode, stdout, stderr, cpu_time_limit, memory_limit, process.resource_usage)
+    return ProgramResponse(stdout, stderr, process.returncode, process.resource_usage,
+                           tuple(bounded_output.spill_file_path for bounded_output in bounded_outputs))
+
+
+def _decode_program_output(output):
+    return output.decode(locale.getpreferredencoding(False), errors='replace') \
+        .replace('\r\n', '\n').replace('\r', '\n')
+
+
+class _ExitNotifyingProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """
+    Subprocess protocol, that resolves exited future as soon as the process itself exits,
+    while its children may still keep its outputs open.
+    """
+    def __init__(self, limit, loop):
+        super().__init__(limit=limit, loop=loop)
+        self.exited = loop.create_future()
+
+    def process_exited(self):
+        super().process_exited()
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+
+async def _read_program_output_async(stream, bounded_output, chunk_size=64 * 1024):
+    while True:
+        chunk = await stream.read(chunk_size)
+        if not chunk:
+            break
+        bounded_output.write(chunk)
+
+
+async def _communicate_async(process, exited, bounded_outputs, cpu_time_limit, memory_limit):
+    output_readers = [asyncio.ensure_future(_read_program_output_async(stream, bounded_output))
+                      for stream, bounded_output in zip((process.stdout, process.stderr), bounded_outputs)]
+    try:
+        await exited
+        if _is_killed_by_limit(process.returncode, cpu_time_limit, memory_limit):
+            _kill_process_group(process)
+        for output_reader in output_readers:
+            await output_reader
+        await process.wait()
+    finally:
+        for output_reader in output_readers:
+            output_reader.cancel()
+        await asyncio.wait(output_readers)
+        for bounded_output in bounded_outputs:
+            bounded_output.close()
+    return bounded_outputs[0].get_text(), bounded_outputs[1].get_text()
+
+
+async def get_program_response_async(args, env, timeout=None, cpu_time_limit=None, memory_limit=None,
+                                     output_limit=None, output_spill_path=None):
+    """
+    Coroutine version of get_program_response,
+    that runs program with asyncio subprocess.
+    Resource usage of the program is not collected.
+    """
+    loop = asyncio.get_event_loop()
+    transport, protocol = await loop.subprocess_exec(
+        lambda: _ExitNotifyingProtocol(2 ** 16, loop), *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=env, **_get_program_limits_kwargs(cpu_time_limit, memory_limit))
+    process = asyncio.subprocess.Process(transport, protocol, loop)
+    bounded_outputs = _create_bounded_outputs(output_limit, output_spill_path)
+    communicate_task = asyncio.ensure_future(_communicate_async(process, protocol.exited, bounded_outputs,
+                                                                cpu_time_limit, memory_limit))
+    try:
+        done_tasks, _ = await asyncio.wait({communicate_task}, timeout=timeout)
+        if not done_tasks:
+            _kill_process_group(process)
+            stdout, stderr = await communicate_task
+            raise ProgramTimeoutExpired('Timeout of ' + str(timeout) + 's expired', stdout, stderr)
+    except asyncio.CancelledError:
+        _kill_process_group(process)
+        communicate_task.cancel()
+        await process.wait()
+        raise
+    stdout, stderr = communicate_task.result()
+    _check_program_limits(process.returncode, stdout, stderr, cpu_time_limit, memory_limit)
+    output_file_paths = tuple(bounded_output.spill_file_path for bounded_output in bounded_outputs)
+    return ProgramResponse(stdout, stderr, process.returncode, output_file_paths=output_file_paths)
 
 
 def get_timedelta_string(delta):
@@ -131,32 +529,269 @@ class TestRunResult:
     class ResultType(enum.Enum):
         FAIL = 0
         SUCCESS = 1
+        TIMEOUT = 2
+        RESOURCE_EXCEEDED = 3
+        FLAKY = 4
 
-    def __init__(self, result_type, test_output, test_filename):
+    def __init__(self, result_type, test_output, test_filename,
+                 duration=None, user_time=None, system_time=None, max_rss=None):
         self.result_type = result_type
         self.test_output = test_output
         self.test_filename = test_filename
+        self.duration = duration
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+        # Key of result in result cache, set by worker, that ran the test
+        self.result_cache_key = None
+        # File with full output of the test, if it was cut by output capture limit
+        self.output_file_path = None
+
+    def set_resource_usage(self, duration, resource_usage=None):
+        """
+        Stores wall time of the test in seconds and resource usage of its program,
+        returned by get_program_response.
+        """
+        self.duration = duration
+        if resource_usage is not None:
+            self.user_time = resource_usage['user_time']
+            self.system_time = resource_usage['system_time']
+            self.max_rss = resource_usage['max_rss']
+        return self
+
+    def get_cpu_time(self):
+        if self.user_time is None:
+            return None
+        return self.user_time + self.system_time
+
+
+def _encode_test_result(test_result):
+    return {'result_type': test_result.result_type.name,
+            'test_output': test_result.test_output,
+            'test_filename': test_result.test_filename,
+            'duration': test_result.duration,
+            'user_time': test_result.user_time,
+            'system_time': test_result.system_time,
+            'max_rss': test_result.max_rss,
+            'result_cache_key': test_result.result_cache_key,
+            'output_file_path': test_result.output_file_path}
+
+
+def _decode_test_result(message):
+    test_result = TestRunResult(TestRunResult.ResultType[message['result_type']], message['test_output'],
+                                message['test_filename'], message.get('duration'), message.get('user_time'),
+                                message.get('system_time'), message.get('max_rss'))
+    test_result.result_cache_key = message.get('result_cache_key')
+    test_result.output_file_path = message.get('output_file_path')
+    return test_result
+
+
+def run_timed_test(runner, test_dir, test_filename, env):
+    """
+    Runs test with runner._on_test and sets its duration,
+    if it was not measured by the runner itself.
+    """
+    start_time = time.perf_counter()
+    test_result = runner._on_test(test_dir, test_filename, env)
+    if test_result.duration is None:
+        test_result.duration = time.perf_counter() - start_time
+    return test_result
+
+
+class ProgramLimitExceeded(Exception):
+    result_type = None
+
+    def __init__(self, message, stdout, stderr, resource_usage=None):
+        super().__init__(message)
+        self.stdout = stdout
+        self.stderr = stderr
+        self.resource_usage = resource_usage
+
+
+class ProgramTimeoutExpired(ProgramLimitExceeded):
+    result_type = TestRunResult.ResultType.TIMEOUT
+
+
+class ProgramResourceExceeded(ProgramLimitExceeded):
+    result_type = TestRunResult.ResultType.RESOURCE_EXCEEDED
+
+
+class ValuesHistogram:
+    """
+    Histogram with logarithmic buckets, that approximates percentiles of values
+    with relative error less than base - 1, using memory independent of values count.
+    """
+    def __init__(self, base=1.02):
+        self.base = base
+        self.buckets = dict()
+        self.count = 0
+        self.max_value = None
+
+    def add(self, value):
+        bucket = math.floor(math.log(value, self.base)) if value > 0 else -math.inf
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def merge(self, histogram):
+        for bucket, bucket_count in histogram.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + bucket_count
+        self.count += histogram.count
+        if histogram.max_value is not None and (self.max_value is None or histogram.max_value > self.max_value):
+            self.max_value = histogram.max_value
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        for bucket in sorted(self.buckets.keys()):
+            rank -= self.buckets[bucket]
+            if rank <= 0:
+                if bucket == -math.inf:
+                    return 0
+                return min(self.base ** (bucket + 1), self.max_value)
+        return self.max_value
+
+    def get_summary(self):
+        return {'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'max': self.max_value}
+
+    def to_dict(self):
+        """
+        Returns histogram as JSON serializable dictionary, bucket of zero values is None.
+        """
+        return {'base': self.base, 'max': self.max_value,
+                'buckets': [[bucket if bucket != -math.inf else None, bucket_count]
+                            for bucket, bucket_count in sorted(self.buckets.items())]}
+
+    @staticmethod
+    def from_dict(histogram_dict):
+        histogram = ValuesHistogram(histogram_dict['base'])
+        for bucket, bucket_count in histogram_dict['buckets']:
+            histogram.buckets[bucket if bucket is not None else -math.inf] = bucket_count
+            histogram.count += bucket_count
+        histogram.max_value = histogram_dict['max']
+        return histogram
+
+
+class TestNamesList(list):
+    """
+    List of test filenames of metrics, sum with another list is TestNamesList too.
+    """
+    def __add__(self, names):
+        return TestNamesList(itertools.chain(self, names))
+
+    def __iadd__(self, names):
+        self.extend(names)
+        return self
 
 
 class Metrics:
+    RESULT_TYPE_FIELDS = {
+        TestRunResult.ResultType.SUCCESS: ('successful_count', 'successful_tests'),
+        TestRunResult.ResultType.FAIL: ('failed_count', 'failed_tests'),
+        TestRunResult.ResultType.TIMEOUT: ('timeout_count', 'timeout_tests'),
+        TestRunResult.ResultType.RESOURCE_EXCEEDED: ('resource_exceeded_count', 'resource_exceeded_tests'),
+        TestRunResult.ResultType.FLAKY: ('flaky_count', 'flaky_tests')
+    }
+
     def __init__(self, tests_count=0, successful_count=0, failed_count=0, successful_tests=None,
-                 failed_tests=None, start_time=datetime.now(), finish_time=None):
-        if failed_tests is None:
-            failed_tests = list()
+                 failed_tests=None, start_time=None, finish_time=None,
+                 timeout_count=0, resource_exceeded_count=0, timeout_tests=None, resource_exceeded_tests=None,
+                 flaky_count=0, flaky_tests=None):
         self.tests_count = tests_count
         self.successful_count = successful_count
         self.failed_count = failed_count
-        self.successful_tests = successful_tests or list()
-        self.failed_tests = failed_tests or list()
-        self.start_time = start_time
+        self.successful_tests = TestNamesList(successful_tests or ())
+        self.failed_tests = TestNamesList(failed_tests or ())
+        self.timeout_count = timeout_count
+        self.resource_exceeded_count = resource_exceeded_count
+        self.timeout_tests = TestNamesList(timeout_tests or ())
+        self.resource_exceeded_tests = TestNamesList(resource_exceeded_tests or ())
+        self.flaky_count = flaky_count
+        self.flaky_tests = TestNamesList(flaky_tests or ())
+        self.start_time = start_time if start_time is not None else datetime.now()
         self.finish_time = finish_time
+        self.duration_histogram = ValuesHistogram()
+        self.cpu_time_histogram = ValuesHistogram()
+        self.max_rss_histogram = ValuesHistogram()
+
+    def add_test_result(self, result_type, test_filename=None):
+        """
+        Counts test result, test filename is stored if it is given.
+        """
+        count_field, tests_field = Metrics.RESULT_TYPE_FIELDS[result_type]
+        setattr(self, count_field, getattr(self, count_field) + 1)
+        if test_filename is not None:
+            getattr(self, tests_field).append(test_filename)
+
+    def add_test_resource_usage(self, test_result):
+        if test_result.duration is not None:
+            self.duration_histogram.add(test_result.duration)
+        if test_result.user_time is not None:
+            self.cpu_time_histogram.add(test_result.get_cpu_time())
+        if test_result.max_rss is not None:
+            self.max_rss_histogram.add(test_result.max_rss)
+
+    def merge(self, metrics):
+        self.tests_count += metrics.tests_count
+        for count_field, tests_field in Metrics.RESULT_TYPE_FIELDS.values():
+            setattr(self, count_field, getattr(self, count_field) + getattr(metrics, count_field))
+            getattr(self, tests_field).extend(getattr(metrics, tests_field))
+        self.duration_histogram.merge(metrics.duration_histogram)
+        self.cpu_time_histogram.merge(metrics.cpu_time_histogram)
+        self.max_rss_histogram.merge(metrics.max_rss_histogram)
+
+    def clear_test_names(self):
+        """
+        Clears test names, e.g. after they were merged to other metrics, counts are kept.
+        """
+        for _, tests_field in Metrics.RESULT_TYPE_FIELDS.values():
+            setattr(self, tests_field, TestNamesList())
+
+    def get_resource_usage_histograms(self):
+        """
+        Returns dictionary of resource names and histograms of their usage by tests.
+        """
+        return {'duration': self.duration_histogram, 'cpu_time': self.cpu_time_histogram,
+                'max_rss': self.max_rss_histogram}
+
+    def get_resource_usage_summary(self):
+        """
+        Returns p50, p90, p99 and max of tests duration, cpu time and max rss,
+        that were collected.
+        """
+        resource_usage_summary = dict()
+        for name, histogram in self.get_resource_usage_histograms().items():
+            if histogram.count != 0:
+                resource_usage_summary[name] = histogram.get_summary()
+        return resource_usage_summary
+
+    @staticmethod
+    def _get_summary_description(title, summary, value_format):
+        return title + ' p50/p90/p99/max: ' + \
+            ' / '.join(value_format(summary[key]) for key in ('p50', 'p90', 'p99', 'max')) + '\n'
 
     def __str__(self):
         delta = self.finish_time - self.start_time
         metrics_description = 'Time: ' + get_timedelta_string(delta) + '\n' + \
                               'Tests count: ' + str(self.tests_count) + '\n' + \
                               'Successful count: ' + str(self.successful_count) + '\n' + \
-                              'Failed count: ' + str(self.failed_count) + '\n'
+                              'Failed count: ' + str(self.failed_count) + '\n' + \
+                              'Timeout count: ' + str(self.timeout_count) + '\n' + \
+                              'Resource exceeded count: ' + str(self.resource_exceeded_count) + '\n' + \
+                              'Flaky count: ' + str(self.flaky_count) + '\n'
+        resource_usage_summary = self.get_resource_usage_summary()
+        if 'duration' in resource_usage_summary:
+            metrics_description += self._get_summary_description('Duration', resource_usage_summary['duration'],
+                                                                 lambda value: '%.3fs' % value)
+        if 'cpu_time' in resource_usage_summary:
+            metrics_description += self._get_summary_description('CPU time', resource_usage_summary['cpu_time'],
+                                                                 lambda value: '%.3fs' % value)
+        if 'max_rss' in resource_usage_summary:
+            metrics_description += self._get_summary_description('Max RSS', resource_usage_summary['max_rss'],
+                                                                 lambda value: '%dKB' % (value // 1024))
         return metrics_description
 
 
@@ -166,11 +801,32 @@ class MetricsEncoder(json.JSONEncoder):
             metrics_dict = metrics.__dict__.copy()
             metrics_dict.pop('start_time', None)
             metrics_dict.pop('finish_time', None)
+            metrics_dict.pop('duration_histogram', None)
+            metrics_dict.pop('cpu_time_histogram', None)
+            metrics_dict.pop('max_rss_histogram', None)
+            metrics_dict['resource_usage'] = metrics.get_resource_usage_summary()
+            metrics_dict['resource_usage_histograms'] = {
+                name: histogram.to_dict() for name, histogram in metrics.get_resource_usage_histograms().items()
+                if histogram.count != 0}
             return metrics_dict
         else:
             return super().default(metrics)
 
 
 def decode_metrics(metrics_dict):
-    return Metrics(metrics_dict['tests_count'], metrics_dict['successful_count'], metrics_dict['failed_count'],
-                   metrics_dict['successful_tests'], metrics_dict['failed_tests'])
+    """
+    Decodes metrics from results file contents,
+    fields, that were added later, are optional.
+    """
+    metrics = Metrics(metrics_dict['tests_count'], metrics_dict['successful_count'], metrics_dict['failed_count'],
+                      metrics_dict['successful_tests'], metrics_dict['failed_tests'],
+                      timeout_count=metrics_dict.get('timeout_count', 0),
+                      resource_exceeded_count=metrics_dict.get('resource_exceeded_count', 0),
+                      timeout_tests=metrics_dict.get('timeout_tests'),
+                      resource_exceeded_tests=metrics_dict.get('resource_exceeded_tests'),
+                      flaky_count=metrics_dict.get('flaky_count', 0),
+                      flaky_tests=metrics_dict.get('flaky_tests'))
+    histograms = metrics.get_resource_usage_histograms()
+    for name, histogram_dict in metrics_dict.get('resource_usage_histograms', dict()).items():
+        histograms[name].merge(ValuesHistogram.from_dict(histogram_dict))
+    return metrics
@@ -0,0 +1,137 @@
+import math
+import os
+import threading
+import time
+import multiprocessing as mp
+
+
+def get_available_cpus():
+    """
+    Returns sorted list of CPUs, that this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(mp.cpu_count()))
+
+
+def _read_first_line(file_path):
+    try:
+        with open(file_path, 'r') as file:
+            return file.readline().strip()
+    except OSError:
+        return None
+
+
+def get_cgroup_cpu_limit():
+    """
+    Returns CPU quota of the cgroup of this process in CPUs (cgroup v2 or v1),
+    or None if there is no quota.
+    """
+    cpu_max = _read_first_line('/sys/fs/cgroup/cpu.max')
+    if cpu_max is not None:
+        quota, period = cpu_max.split()[:2]
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    quota = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota is None or period is None or int(quota) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def get_default_workers_count():
+    """
+    Returns count of CPUs, that this process may run on,
+    limited by CPU quota of its cgroup.
+    """
+    workers_count = len(get_available_cpus())
+    cgroup_cpu_limit = get_cgroup_cpu_limit()
+    if cgroup_cpu_limit is not None:
+        workers_count = min(workers_count, math.ceil(cgroup_cpu_limit))
+    return max(1, workers_count)
+
+
+def get_available_memory():
+    """
+    Returns bytes of memory available for new processes, or None if it is unknown.
+    """
+    try:
+        with open('/proc/meminfo', 'r') as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def pin_process_to_cpu(cpu):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+
+
+class WorkersThrottle:
+    """
+    Limit of concurrently running tasks, that is lowered by one every check_interval seconds,
+    while system load average per CPU is above max_load_per_cpu or available memory
+    is below min_available_memory bytes, and is raised back to workers_count otherwise.
+    """
+    def __init__(self, workers_count, max_load_per_cpu=None, min_available_memory=None, check_interval=1):
+        self.workers_count = workers_count
+        self.max_load_per_cpu = max_load_per_cpu
+        self.min_available_memory = min_available_memory
+        self.check_interval = check_interval
+        self.limit = workers_count
+        self.running_count = 0
+        self._cpus_count = len(get_available_cpus())
+        self._next_check_time = time.monotonic()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _is_overloaded(self):
+        if self.max_load_per_cpu is not None and hasattr(os, 'getloadavg') and \
+                os.getloadavg()[0] / self._cpus_count > self.max_load_per_cpu:
+            return True
+        if self.min_available_memory is not None:
+            available_memory = get_available_memory()
+            if available_memory is not None and available_memory < self.min_available_memory:
+                return True
+        return False
+
+    def get_limit(self):
+        if time.monotonic() >= self._next_check_time:
+            if self._is_overloaded():
+                self.limit = max(1, self.limit - 1)
+            else:
+                self.limit = min(self.workers_count, self.limit + 1)
+            self._next_check_time = time.monotonic() + self.check_interval
+        return self.limit
+
+    def acquire(self):
+        with self._condition:
+            while not self._closed and self.running_count >= self.get_limit():
+                self._condition.wait(self.check_interval)
+            self.running_count += 1
+
+    def release(self):
+        with self._condition:
+            self.running_count -= 1
+            self._condition.notify()
+
+    def close(self):
+        """
+        Lets tasks, that wait in acquire(), go on.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def throttle(self, tasks):
+        """
+        Yields tasks, waiting for a free place before each of them,
+        release() should be called on completion of every task.
+        """
+        for task in tasks:
+            self.acquire()
+            yield task
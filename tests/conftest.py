@@ -0,0 +1,47 @@
+import os
+
+from ctestgen.runner import BasicTestRunner, TestRunResult as RunResult
+
+# Default keyword arguments of runners in tests: quiet, sequential and independent of previous runs
+RUNNER_KWARGS = dict(print_test_info=False, print_run_progress=False, print_global_metrics=False,
+                     print_testsets_metrics=False, schedule_by_duration=False, max_workers=1)
+
+
+class ErrorTestRunner(BasicTestRunner):
+    """
+    Runner, whose test fails if output of the tool contains "error".
+    """
+    def _process_program_response(self, test_dir, test_filename, program_response):
+        result_type = RunResult.ResultType.FAIL if 'error' in program_response[0] else RunResult.ResultType.SUCCESS
+        return RunResult(result_type, program_response[0], test_filename)
+
+
+def create_runner(test_base_dir, run_arguments=('cat',), runner_class=ErrorTestRunner, **kwargs):
+    return runner_class(list(run_arguments), str(test_base_dir), **dict(RUNNER_KWARGS, **kwargs))
+
+
+def write_tests(base_dir, tests_contents):
+    """
+    Writes tests from dictionary of their paths relative to base_dir and contents.
+    Returns base_dir as string.
+    """
+    for test_path, test_contents in tests_contents.items():
+        test_path = os.path.join(str(base_dir), test_path)
+        os.makedirs(os.path.dirname(test_path), exist_ok=True)
+        with open(test_path, 'w') as test_file:
+            test_file.write(test_contents)
+    return str(base_dir)
+
+
+def write_test_tree(base_dir, dirs_count, dir_tests_count, get_test_contents=None):
+    """
+    Writes dirs_count directories dir_<idx> with dir_tests_count tests test_<idx>.c,
+    contents of test are get_test_contents(dir_idx, test_idx), "test <dir_idx> <test_idx>" by default.
+    Returns base_dir as string.
+    """
+    if get_test_contents is None:
+        def get_test_contents(dir_idx, test_idx):
+            return 'test ' + str(dir_idx) + ' ' + str(test_idx) + '\n'
+    return write_tests(base_dir, {os.path.join('dir_' + str(dir_idx), 'test_' + str(test_idx) + '.c'):
+                                  get_test_contents(dir_idx, test_idx)
+                                  for dir_idx in range(dirs_count) for test_idx in range(dir_tests_count)})
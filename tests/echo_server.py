@@ -0,0 +1,33 @@
+"""
+Stand-in tool server for tests: for every test path read from stdin it responds
+with its pid, count of served requests and contents of the test file.
+Test file with 'crash' exits the server, unless crash marker file next to it exists
+(the marker is created, so the test passes after restart), 'sleep' makes the server
+not respond in time.
+"""
+import os
+import sys
+import time
+
+
+def main():
+    requests_count = 0
+    for line in sys.stdin:
+        test_path = line.rstrip('\n')
+        requests_count += 1
+        with open(test_path) as test_file:
+            test_contents = test_file.read()
+        if 'crash' in test_contents:
+            crash_marker_path = test_path + '.crashed'
+            if not os.path.exists(crash_marker_path):
+                open(crash_marker_path, 'w').close()
+                os._exit(1)
+        if 'sleep' in test_contents:
+            time.sleep(30)
+        sys.stdout.write('pid ' + str(os.getpid()) + ' requests ' + str(requests_count) + '\n' +
+                         test_contents.rstrip('\n') + '\n<<<END>>>\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from ctestgen.runner import CompilingTestRunner, TestRunResult as RunResult
+
+from conftest import RUNNER_KWARGS, write_tests
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='Compiler is a shell script')
+
+# "Compiles" test with shell commands to a script, that runs them, every stage is logged
+COMPILER_SCRIPT = '''#!/bin/sh
+echo "compile start" >> "{log_path}"
+sleep 0.2
+if grep -q "syntax error" "$1"; then
+    echo "$1: syntax error" >&2
+    echo "compile end" >> "{log_path}"
+    exit 1
+fi
+{{ echo '#!/bin/sh'; echo 'echo "run start" >> "{log_path}"'; cat "$1"; echo 'sleep 0.2'
+   echo 'echo "run end" >> "{log_path}"'; }} > "$3"
+chmod +x "$3"
+echo "compile end" >> "{log_path}"
+'''
+
+
+class ScriptTestRunner(CompilingTestRunner):
+    def _process_program_response(self, test_dir, test_filename, program_response):
+        result_type = RunResult.ResultType.FAIL if 'error' in program_response[0] else RunResult.ResultType.SUCCESS
+        return RunResult(result_type, program_response[0], test_filename)
+
+
+def _write_compiler(base_dir):
+    compiler_path = os.path.join(str(base_dir), 'compiler.sh')
+    if os.path.exists(compiler_path):
+        return compiler_path
+    with open(compiler_path, 'w') as compiler_file:
+        compiler_file.write(COMPILER_SCRIPT.format(log_path=os.path.join(str(base_dir), 'stages.log')))
+    os.chmod(compiler_path, os.stat(compiler_path).st_mode | stat.S_IXUSR)
+    return compiler_path
+
+
+def _read_stages(base_dir):
+    stages_log_path = os.path.join(str(base_dir), 'stages.log')
+    if not os.path.exists(stages_log_path):
+        return []
+    with open(stages_log_path) as stages_log:
+        stages = stages_log.read().splitlines()
+    os.remove(stages_log_path)
+    return stages
+
+
+def _run(base_dir, test_base_dir, test_results, **kwargs):
+    runner = ScriptTestRunner(test_base_dir, compiler=_write_compiler(base_dir), compiler_flags=[],
+                              object_cache_dir=os.path.join(str(base_dir), 'objects'), dump_results_to_files=False,
+                              test_result_callback=lambda _, test_result: test_results.__setitem__(
+                                  test_result.test_filename, test_result), **dict(RUNNER_KWARGS, **kwargs))
+    runner.run()
+    return _read_stages(base_dir)
+
+
+def test_compilation_failure(tmp_path):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'),
+                                {'good.c': 'echo good\n', 'bad.c': 'syntax error\n'})
+    test_results = dict()
+    _run(tmp_path, test_base_dir, test_results)
+    assert test_results['good.c'].result_type == RunResult.ResultType.SUCCESS
+    assert test_results['good.c'].test_output == 'good\n'
+    assert test_results['bad.c'].result_type == RunResult.ResultType.FAIL
+    assert test_results['bad.c'].test_output.startswith('Compilation failed\n')
+    assert 'syntax error' in test_results['bad.c'].test_output
+
+
+@pytest.mark.parametrize('execution_engine', ['pool', 'asyncio'])
+def test_compiled_tests_are_reused(tmp_path, execution_engine):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), {'a.c': 'echo a\n', 'b.c': 'echo b\n'})
+    test_results = dict()
+    stages = _run(tmp_path, test_base_dir, test_results, execution_engine=execution_engine)
+    assert stages.count('compile start') == 2
+
+    stages = _run(tmp_path, test_base_dir, test_results, execution_engine=execution_engine)
+    assert stages.count('compile start') == 0
+    assert stages.count('run start') == 2
+    assert test_results['a.c'].test_output == 'a\n'
+
+    # Changed test is compiled again
+    write_tests(test_base_dir, {'a.c': 'echo changed\n'})
+    stages = _run(tmp_path, test_base_dir, test_results, execution_engine=execution_engine)
+    assert stages.count('compile start') == 1
+    assert test_results['a.c'].test_output == 'changed\n'
+
+
+def test_compilation_and_runs_overlap(tmp_path):
+    # Tests differ, otherwise they share one compiled object
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'),
+                                {'test_{}.c'.format(test_idx): 'echo {}\n'.format(test_idx) for test_idx in range(4)})
+    test_results = dict()
+    stages = _run(tmp_path, test_base_dir, test_results, compile_workers_count=1, run_workers_count=1)
+    assert len(test_results) == 4
+
+    active_stages = {'compile': 0, 'run': 0}
+    max_active_stages = {'compile': 0, 'run': 0}
+    overlapped = False
+    for stage in stages:
+        stage_name, event = stage.split()
+        active_stages[stage_name] += 1 if event == 'start' else -1
+        max_active_stages[stage_name] = max(max_active_stages[stage_name], active_stages[stage_name])
+        overlapped = overlapped or (active_stages['compile'] != 0 and active_stages['run'] != 0)
+    # Every stage runs one process at once, but compilation of the next test overlaps the previous run
+    assert max_active_stages == {'compile': 1, 'run': 1}
+    assert overlapped
@@ -0,0 +1,76 @@
+import multiprocessing as mp
+import os
+import socket
+import threading
+
+from ctestgen.runner import BasicTestRunner, TestRunResult as RunResult
+
+TESTS_COUNT = 12
+
+
+class CatTestRunner(BasicTestRunner):
+    def _process_program_response(self, test_dir, test_filename, program_response):
+        return RunResult(RunResult.ResultType.SUCCESS, program_response[0], test_filename)
+
+
+def _write_tests(base_dir):
+    for test_idx in range(TESTS_COUNT):
+        test_dir = os.path.join(str(base_dir), 'dir_' + str(test_idx % 3))
+        os.makedirs(test_dir, exist_ok=True)
+        with open(os.path.join(test_dir, 'test_' + str(test_idx) + '.c'), 'w') as test_file:
+            test_file.write('test ' + str(test_idx) + '\n')
+
+
+def _get_free_address():
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()
+
+
+def _create_coordinator_runner(base_dir, coordinator_address, test_results):
+    return CatTestRunner(['cat'], str(base_dir), print_test_info=False, dump_results_to_files=False,
+                         schedule_by_duration=False, print_run_progress=False, print_global_metrics=False,
+                         print_testsets_metrics=False, coordinator_address=coordinator_address,
+                         test_result_callback=lambda test_dir, test_result: test_results.append(test_result))
+
+
+def _create_worker_runner(base_dir):
+    return CatTestRunner(['sh', '-c', 'sleep 0.05; cat "$1"', 'sh'], str(base_dir), print_test_info=False,
+                         max_workers=1)
+
+
+def _run_coordinator(base_dir, coordinator_address, results_queue):
+    test_results = []
+    _create_coordinator_runner(base_dir, coordinator_address, test_results).run()
+    results_queue.put(sorted(test_result.test_output for test_result in test_results))
+
+
+def test_several_agents_with_coordinator_process(tmp_path):
+    _write_tests(tmp_path)
+    coordinator_address = _get_free_address()
+    results_queue = mp.Queue()
+    coordinator_process = mp.Process(target=_run_coordinator, args=(tmp_path, coordinator_address, results_queue))
+    coordinator_process.start()
+    try:
+        run_tests_count = _create_worker_runner(tmp_path).run_worker(coordinator_address, workers_count=3)
+        test_outputs = results_queue.get(timeout=60)
+    finally:
+        coordinator_process.join(60)
+    assert coordinator_process.exitcode == 0
+    assert run_tests_count == TESTS_COUNT
+    assert test_outputs == sorted('test ' + str(test_idx) + '\n' for test_idx in range(TESTS_COUNT))
+
+
+def test_several_agents_with_coordinator_thread(tmp_path):
+    _write_tests(tmp_path)
+    coordinator_address = _get_free_address()
+    test_results = []
+    coordinator_runner = _create_coordinator_runner(tmp_path, coordinator_address, test_results)
+    coordinator_thread = threading.Thread(target=coordinator_runner.run, daemon=True)
+    coordinator_thread.start()
+    run_tests_count = _create_worker_runner(tmp_path).run_worker(coordinator_address, workers_count=3)
+    coordinator_thread.join(60)
+    assert not coordinator_thread.is_alive()
+    assert run_tests_count == TESTS_COUNT
+    assert coordinator_runner.global_metrics.successful_count == TESTS_COUNT
+    assert len(test_results) == TESTS_COUNT
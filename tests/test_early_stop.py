@@ -0,0 +1,42 @@
+import glob
+import os
+import sys
+import time
+
+import pytest
+
+from conftest import create_runner, write_test_tree
+
+# Test with "error" fails after a second, other tests sleep, every tool writes its pid
+TOOL_SCRIPT = 'echo $$ > "$1.pid"; if grep -q error "$1"; then sleep 1; echo error; else exec sleep 30; fi'
+
+
+def _is_running(pid):
+    try:
+        with open('/proc/' + str(pid) + '/stat') as stat_file:
+            return stat_file.read().rsplit(')', 1)[1].split()[0] not in ('Z', 'X')
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='Processes are looked up in /proc')
+@pytest.mark.parametrize('execution_engine', ['pool', 'asyncio'])
+def test_fail_fast_kills_running_tools(tmp_path, execution_engine):
+    test_base_dir = write_test_tree(tmp_path, 1, 6, lambda dir_idx, test_idx: 'error\n' if test_idx == 0 else 'test\n')
+    runner = create_runner(test_base_dir, ['sh', '-c', TOOL_SCRIPT, 'sh'], dump_results_to_files=False,
+                           execution_engine=execution_engine, max_workers=6, fail_fast=True)
+    start_time = time.monotonic()
+    runner.run()
+
+    assert time.monotonic() - start_time < 20
+    assert runner.global_metrics.failed_count == 1
+    tool_pids = []
+    for pid_path in glob.glob(os.path.join(test_base_dir, 'dir_0', '*.pid')):
+        with open(pid_path) as pid_file:
+            tool_pids.append(int(pid_file.read()))
+    assert len(tool_pids) == 6
+    # Killed processes may take a moment to exit
+    deadline = time.monotonic() + 5
+    while any(_is_running(pid) for pid in tool_pids) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert [pid for pid in tool_pids if _is_running(pid)] == []
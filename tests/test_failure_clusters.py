@@ -0,0 +1,31 @@
+from ctestgen.runner import FailureClusters, OutputSignatures, TestRunResult as RunResult
+
+from conftest import create_runner, write_tests
+
+
+class CountingOutputSignatures(OutputSignatures):
+    def __init__(self):
+        super().__init__()
+        self.signed_tests = []
+
+    def get_signature(self, test_filename, test_output):
+        self.signed_tests.append(test_filename)
+        return super().get_signature(test_filename, test_output)
+
+
+def test_clusters_are_split_by_result_type():
+    clusters = FailureClusters()
+    for result_type, test_filename in ((RunResult.ResultType.FAIL, 'a.c'), (RunResult.ResultType.TIMEOUT, 'b.c'),
+                                       (RunResult.ResultType.FAIL, 'c.c')):
+        clusters.add('dir', RunResult(result_type, 'output', test_filename), 'signature', 'output')
+    assert [(cluster['result_type'], cluster['count']) for cluster in clusters.get_sorted_clusters()] == \
+        [('FAIL', 2), ('TIMEOUT', 1)]
+
+
+def test_only_failures_are_signed(tmp_path):
+    test_base_dir = write_tests(tmp_path, {'a.c': 'test\n', 'b.c': 'error\n', 'c.c': 'test\n'})
+    runner = create_runner(test_base_dir, dump_results_to_files=False, cluster_failures=True)
+    runner.output_signatures = CountingOutputSignatures()
+    runner.run()
+    assert runner.output_signatures.signed_tests == ['b.c']
+    assert len(runner.failure_clusters.clusters) == 1
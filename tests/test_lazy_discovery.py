@@ -0,0 +1,84 @@
+import json
+import os
+import queue
+import threading
+
+from ctestgen.runner import TestsDiscoveryIndex as DiscoveryIndex, iter_tests
+from ctestgen.runner.discovery import _walk_tests_subtree
+
+from conftest import ErrorTestRunner, create_runner, write_test_tree
+
+DIRS_COUNT = 5
+DIR_TESTS_COUNT = 4
+
+
+class ThreadCheckingTestRunner(ErrorTestRunner):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hook_threads = []
+
+    def _on_testdir(self, test_dir, test_filenames):
+        self.hook_threads.append(threading.current_thread())
+
+
+def _write_tests(base_dir, failing_test_idx=None):
+    return write_test_tree(base_dir, DIRS_COUNT, DIR_TESTS_COUNT,
+                    lambda dir_idx, test_idx: 'error\n' if test_idx == failing_test_idx else 'test\n')
+
+
+def _create_runner(base_dir, dump_results_to_files=False, **kwargs):
+    return create_runner(base_dir, runner_class=ThreadCheckingTestRunner, dump_results_to_files=dump_results_to_files,
+                         lazy_discovery=True, max_workers=2, **kwargs)
+
+
+def test_lazy_discovery_hooks_run_in_main_thread(tmp_path):
+    _write_tests(tmp_path)
+    runner = _create_runner(tmp_path)
+    runner.run()
+    assert runner.hook_threads == [threading.main_thread()] * DIRS_COUNT
+    assert runner.global_metrics.successful_count == DIRS_COUNT * DIR_TESTS_COUNT
+
+
+def test_lazy_discovery_stops_on_max_failures(tmp_path):
+    test_base_dir = _write_tests(os.path.join(str(tmp_path), 'tests'), failing_test_idx=0)
+    index_file_path = os.path.join(str(tmp_path), 'index.json')
+    runner = _create_runner(test_base_dir, fail_fast=True, discovery_index_file_path=index_file_path)
+    runner.run()
+    assert runner.global_metrics.failed_count == 1
+    assert runner.not_run_tests_count < DIRS_COUNT * DIR_TESTS_COUNT
+    assert os.path.exists(index_file_path)
+
+
+def test_lazy_discovery_writes_test_dirs(tmp_path):
+    test_base_dir = _write_tests(os.path.join(str(tmp_path), 'tests'))
+    runner = _create_runner(test_base_dir, dump_results_to_files=True,
+                            output_base_dir=os.path.join(str(tmp_path), 'out'))
+    runner.run()
+    test_dirs = sorted(os.path.join(test_base_dir, 'dir_' + str(dir_idx)) for dir_idx in range(DIRS_COUNT))
+    for output_filename in ('success.txt', 'fail.txt', 'metrics.txt'):
+        with open(os.path.join(runner.output_dir, output_filename)) as output_file:
+            output_lines = output_file.read().splitlines()
+        assert sorted(line for line in output_lines if line in test_dirs) == test_dirs
+    with open(os.path.join(runner.output_dir, 'metrics.txt')) as metrics_file:
+        assert sorted(metrics_file.read().splitlines()[:DIRS_COUNT]) == test_dirs
+
+
+def test_stopped_discovery_saves_scanned_dirs(tmp_path):
+    test_base_dir = _write_tests(os.path.join(str(tmp_path), 'tests'))
+    index_file_path = os.path.join(str(tmp_path), 'index.json')
+    discovered_tests = iter_tests(test_base_dir, ['.c'], index_file_path)
+    first_test_dir, _ = next(discovered_tests)
+    discovered_tests.close()
+    with open(index_file_path) as index_file:
+        assert first_test_dir in json.load(index_file)['dirs']
+
+
+def test_stopped_walk_scans_nothing(tmp_path):
+    test_base_dir = _write_tests(tmp_path)
+    discovery_index = DiscoveryIndex(None, ['.c'])
+    discovered_tests = queue.Queue()
+    stop_event = threading.Event()
+    stop_event.set()
+    _walk_tests_subtree(test_base_dir, discovery_index, discovered_tests, stop_event)
+    assert discovered_tests.get_nowait() is None
+    assert discovered_tests.empty()
@@ -0,0 +1,35 @@
+import os
+
+from ctestgen.runner import MatrixTestRunner
+
+from conftest import create_runner, write_test_tree
+
+
+def _create_runner(base_dir, runner_name, run_arguments):
+    return create_runner(base_dir, run_arguments, runner_name=runner_name,
+                         output_base_dir=os.path.join(str(base_dir), 'out'))
+
+
+def test_matrix_keeps_only_differing_tests(tmp_path):
+    write_test_tree(tmp_path, 1, 6)
+    test_dir = os.path.join(str(tmp_path), 'dir_0')
+    matrix = MatrixTestRunner([
+        _create_runner(tmp_path, 'cat', ['cat']),
+        _create_runner(tmp_path, 'fails_1', ['sh', '-c', 'case "$1" in *_1.c) echo error;; esac; cat "$1"', 'sh'])])
+    matrix.run()
+
+    assert list(matrix.tests_result_types.keys()) == [(test_dir, 'test_1.c')]
+    assert matrix.get_differing_tests() == [(test_dir, 'test_1.c', ['SUCCESS', 'FAIL'])]
+    assert matrix.test_runners[1].global_metrics.failed_count == 1
+
+
+def test_matrix_tasks_of_test_go_back_to_back(tmp_path):
+    matrix = MatrixTestRunner([_create_runner(tmp_path, 'first', ['cat']),
+                               _create_runner(tmp_path, 'second', ['cat'])])
+    runs = [([('dir', 'b.c'), ('dir', 'a.c')], None),
+            ([('dir', 'a.c'), ('dir', 'c.c'), ('dir', 'b.c')], None)]
+    matrix._tests_runners = matrix._get_tests_runners(runs)
+    assert list(matrix._get_tasks(set())) == [(0, 'dir', 'b.c'), (1, 'dir', 'b.c'),
+                                             (0, 'dir', 'a.c'), (1, 'dir', 'a.c'),
+                                             (1, 'dir', 'c.c')]
+    assert list(matrix._get_tasks({1})) == [(0, 'dir', 'b.c'), (0, 'dir', 'a.c')]
@@ -0,0 +1,34 @@
+import json
+import os
+
+from ctestgen.runner import Metrics, MetricsEncoder, TestRunResult as RunResult
+from ctestgen.runner.merge_results import merge_results
+
+
+def _write_results(output_dir, durations):
+    metrics = Metrics()
+    for duration in durations:
+        metrics.add_test_result(RunResult.ResultType.SUCCESS, 'test.c')
+        metrics.add_test_resource_usage(RunResult(RunResult.ResultType.SUCCESS, '', 'test.c', duration=duration))
+    metrics.tests_count = len(durations)
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, 'results.json'), 'w') as results_file:
+        json.dump(metrics, results_file, cls=MetricsEncoder)
+
+
+def test_merges_resource_usage_histograms(tmp_path):
+    shard_dirs = [os.path.join(str(tmp_path), 'shard_0'), os.path.join(str(tmp_path), 'shard_1')]
+    _write_results(shard_dirs[0], [1.0] * 90)
+    _write_results(shard_dirs[1], [10.0] * 10)
+    merged_dir = os.path.join(str(tmp_path), 'merged')
+    _, global_metrics = merge_results(shard_dirs, merged_dir)
+
+    assert global_metrics.tests_count == 100
+    assert global_metrics.duration_histogram.count == 100
+    with open(os.path.join(merged_dir, 'results.json')) as results_file:
+        duration_summary = json.load(results_file)['resource_usage']['duration']
+    assert abs(duration_summary['p50'] - 1.0) < 0.03
+    assert duration_summary['p99'] == 10.0
+    assert duration_summary['max'] == 10.0
+    with open(os.path.join(merged_dir, 'metrics.txt')) as metrics_file:
+        assert 'Duration p50/p90/p99/max: ' in metrics_file.read()
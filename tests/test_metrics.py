@@ -0,0 +1,54 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from ctestgen.runner import Metrics, MetricsEncoder, TestNamesList as NamesList, TestResultsWriter as ResultsWriter, \
+    TestRunResult as RunResult, decode_metrics, open_results_file
+
+
+def test_test_names_list_is_list():
+    metrics = Metrics(successful_tests=['a.c'])
+    metrics.successful_tests += ['b.c']
+    assert isinstance(metrics.successful_tests, NamesList)
+    assert isinstance(metrics.successful_tests + ['c.c'], NamesList)
+    assert metrics.successful_tests + ['c.c'] == ['a.c', 'b.c', 'c.c']
+    assert metrics.successful_tests[-1] == 'b.c'
+    assert json.dumps(metrics.successful_tests) == '["a.c", "b.c"]'
+    assert pickle.loads(pickle.dumps(metrics.successful_tests)) == ['a.c', 'b.c']
+
+
+def test_decode_old_metrics():
+    # Results file, that was written before timeout, flaky and resource usage fields were added
+    metrics = decode_metrics({'tests_count': 3, 'successful_count': 2, 'failed_count': 1,
+                              'successful_tests': ['a.c', 'b.c'], 'failed_tests': ['c.c']})
+    assert metrics.successful_tests == ['a.c', 'b.c']
+    assert metrics.failed_tests == ['c.c']
+    assert metrics.timeout_count == 0
+    assert metrics.flaky_tests == []
+    assert metrics.duration_histogram.count == 0
+
+
+@pytest.mark.parametrize('results_filename', ['results.json', 'results.json.gz', 'results.json.xz'])
+def test_decode_written_metrics(tmp_path, results_filename):
+    results_path = os.path.join(str(tmp_path), results_filename)
+    writer = ResultsWriter(os.path.join(str(tmp_path), 'success.txt'), os.path.join(str(tmp_path), 'fail.txt'),
+                           results_path)
+    metrics = Metrics(tests_count=3)
+    for result_type, test_filename in ((RunResult.ResultType.SUCCESS, 'a.c'), (RunResult.ResultType.FAIL, 'b.c'),
+                                       (RunResult.ResultType.TIMEOUT, 'c.c')):
+        test_result = RunResult(result_type, 'output', test_filename, duration=2.0)
+        writer.write('dir', test_result)
+        metrics.add_test_result(result_type, test_filename)
+        metrics.add_test_resource_usage(test_result)
+    writer.write_results(metrics)
+
+    with open_results_file(results_path) as results_file:
+        decoded_metrics = decode_metrics(json.load(results_file))
+    assert decoded_metrics.successful_tests == ['a.c']
+    assert decoded_metrics.failed_tests == ['b.c']
+    assert decoded_metrics.timeout_tests == ['c.c']
+    assert (decoded_metrics.successful_count, decoded_metrics.failed_count, decoded_metrics.timeout_count) == (1, 1, 1)
+    assert decoded_metrics.duration_histogram.count == 3
+    assert json.loads(json.dumps(decoded_metrics, cls=MetricsEncoder))['failed_tests'] == ['b.c']
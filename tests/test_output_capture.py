@@ -0,0 +1,47 @@
+import os
+
+from ctestgen.runner import BoundedOutput, TestRunResult as RunResult
+
+from conftest import create_runner, write_tests
+
+# Prints 100 lines, and fails on its first run
+TOOL_SCRIPT = 'for i in $(seq 100); do echo "line $i of $1"; done; ' \
+              'if [ ! -e "$1.ran" ]; then touch "$1.ran"; echo error; fi'
+
+
+def _read(file_path):
+    with open(file_path) as output_file:
+        return output_file.read()
+
+
+def test_spill_file_is_created_only_when_output_is_cut(tmp_path):
+    spill_file_path = os.path.join(str(tmp_path), 'outputs', 'test.stdout')
+    bounded_output = BoundedOutput(4, 4, spill_file_path)
+    bounded_output.write(b'12345678')
+    assert not os.path.exists(spill_file_path)
+    bounded_output.close()
+    assert bounded_output.spill_file_path is None
+
+    bounded_output = BoundedOutput(4, 4, spill_file_path)
+    for chunk in (b'123', b'456', b'789', b'abc'):
+        bounded_output.write(chunk)
+    bounded_output.close()
+    assert bounded_output.spill_file_path == spill_file_path
+    assert _read(spill_file_path) == '123456789abc'
+    assert bounded_output.get_text() == '1234\n... 4 bytes skipped, full output: ' + spill_file_path + ' ...\n9abc'
+
+
+def test_retries_keep_their_own_spill_files(tmp_path):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), {'test.c': 'test\n'})
+    test_results = []
+    runner = create_runner(test_base_dir, ['sh', '-c', TOOL_SCRIPT, 'sh'], output_capture_limit=100, retries=1,
+                           output_base_dir=os.path.join(str(tmp_path), 'out'),
+                           test_result_callback=lambda _, test_result: test_results.append(test_result))
+    runner.run()
+
+    assert [test_result.result_type for test_result in test_results] == [RunResult.ResultType.FLAKY]
+    spill_file_paths = sorted(os.listdir(os.path.join(runner.output_dir, 'outputs')))
+    assert spill_file_paths == ['test.c.attempt_2.stdout', 'test.c.stdout']
+    first_spill_file_path = os.path.join(runner.output_dir, 'outputs', 'test.c.stdout')
+    assert 'full output: ' + first_spill_file_path in test_results[0].test_output
+    assert _read(first_spill_file_path).endswith('error\n')
@@ -0,0 +1,36 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from ctestgen.runner import ProgramResourceExceeded, get_program_response, get_program_response_async
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='Limits are applied with setrlimit')
+
+# Leader burns CPU, while its child keeps outputs open
+CPU_BURNER_ARGS = ['sh', '-c', 'sleep 30 & while :; do :; done']
+
+
+def _get_program_response_async(*args, **kwargs):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(get_program_response_async(*args, **kwargs))
+    finally:
+        loop.close()
+
+
+@pytest.mark.parametrize('get_response', [get_program_response, _get_program_response_async])
+def test_cpu_time_limit_kills_process_group(get_response):
+    start_time = time.monotonic()
+    with pytest.raises(ProgramResourceExceeded):
+        get_response(CPU_BURNER_ARGS, None, cpu_time_limit=1)
+    assert time.monotonic() - start_time < 10
+
+
+@pytest.mark.parametrize('get_response', [get_program_response, _get_program_response_async])
+def test_memory_error_marker_needs_evidence(get_response):
+    program_response = get_response(['sh', '-c', 'echo out of memory; exit 1'], None, memory_limit=2 ** 30)
+    assert program_response.returncode == 1
+    with pytest.raises(ProgramResourceExceeded):
+        get_response(['sh', '-c', 'echo out of memory; kill -SEGV $$'], None, memory_limit=2 ** 30)
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from ctestgen.generator import Assignment, CodeBlock, ConstInt, Define, Enum, Function, If, Include, Int, Pointer, \
+    Program, Return, VarDeclaration, free, malloc
+from ctestgen.runner import TestReducer as Reducer
+
+from conftest import create_runner, write_tests
+
+# Fails, if test contains lines with both "x" and "y"
+TWO_LINES_TOOL = ['sh', '-c', 'grep -q x "$1" && grep -q y "$1" && echo error', 'sh']
+
+
+def _reduce(tmp_path, test_text, run_arguments, program=None, workers_count=1):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), {'test.c': test_text})
+    reducer = Reducer(create_runner(test_base_dir, run_arguments), work_dir=str(tmp_path),
+                      workers_count=workers_count)
+    reduced_test_path = reducer.reduce(os.path.join(test_base_dir, 'test.c'), program)
+    with open(reduced_test_path) as reduced_test_file:
+        return reducer, reduced_test_file.read()
+
+
+@pytest.mark.parametrize('workers_count', [1, 2])
+def test_reduced_lines_are_minimal(tmp_path, workers_count):
+    test_lines = ['line ' + str(line_idx) for line_idx in range(20)]
+    test_lines[5] = 'x'
+    test_lines[13] = 'y'
+    _, reduced_text = _reduce(tmp_path, '\n'.join(test_lines) + '\n', TWO_LINES_TOOL, workers_count=workers_count)
+    # Removal of any of the lines makes test pass
+    assert reduced_text == 'x\ny\n'
+
+
+def test_passing_test_is_not_reduced(tmp_path):
+    with pytest.raises(ValueError):
+        _reduce(tmp_path, 'x\nline\n', TWO_LINES_TOOL)
+
+
+def test_candidates_are_run_once(tmp_path):
+    runs_log_path = os.path.join(str(tmp_path), 'runs.log')
+    run_arguments = ['sh', '-c', 'cat "$1" >> "{0}"; echo "====" >> "{0}"; grep -q x "$1" && echo error'
+                     .format(runs_log_path), 'sh']
+    # Duplicate lines make equal candidates
+    reducer, reduced_text = _reduce(tmp_path, 'a\na\na\na\nx\na\na\na\n', run_arguments)
+    assert reduced_text == 'x\n'
+    with open(runs_log_path) as runs_log:
+        run_texts = runs_log.read().split('====\n')[:-1]
+    assert len(run_texts) == reducer.runs_count
+    assert len(set(run_texts)) == len(run_texts)
+    # The original test is run too
+    assert reducer.runs_count < reducer.candidates_count + 1
+
+
+def test_program_is_reduced_by_elements(tmp_path):
+    # Program of examples/program_example.py with a failing statement in nested code block
+    program = Program('test')
+    program.add_include(Include('stdlib.h'))
+    max_define = Define('MAX(a,b)', '(a > b ? a : b)')
+    program.add_define(max_define)
+    enum = Enum(('N', 100), ('M', 10), 'G')
+    program.add_enum(enum)
+    const_a = ConstInt('a', 15)
+    program.add_global_variable(const_a)
+    var_b = Int('b')
+    var_ptr = Pointer(Int)('ptr')
+    failing_statement = Assignment(Int('x_y'), 1)
+    failing_if = If(var_b, CodeBlock(Assignment(var_b, 2), failing_statement, Assignment(var_b, 3)))
+    main_function = Function('main', Int)
+    main_function.set_body(CodeBlock(
+        Assignment(VarDeclaration(var_b), max_define.process_macros(const_a, 1)),
+        Assignment(VarDeclaration(var_ptr), malloc(enum[0])),
+        failing_if,
+        free(var_ptr),
+        Return(0)
+    ))
+    program.add_function(main_function)
+    program.add_function(Function('unused', Int))
+
+    _, reduced_text = _reduce(tmp_path, str(program), TWO_LINES_TOOL, program)
+    # Structure is reduced level by level, down to the failing statement
+    assert (program.includes, program.defines, program.enums, program.global_variables) == ([], [], [], [])
+    assert program.functions == [main_function]
+    assert main_function.body.body == [failing_if]
+    assert failing_if.true_body.body == [failing_statement]
+    # Then lines of the reduced program
+    assert reduced_text.strip() == 'x_y = 1;'
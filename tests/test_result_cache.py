@@ -0,0 +1,47 @@
+import os
+
+from ctestgen.runner import TestRunResult as RunResult
+
+from conftest import create_runner, write_tests
+
+# Test fails if it contains "fail", or on its first run if it contains "flaky"
+TOOL_SCRIPT = 'echo "$1" >> "$0.log"; ' \
+              'if grep -q fail "$1"; then echo error; fi; ' \
+              'if grep -q flaky "$1" && [ ! -e "$1.ran" ]; then touch "$1.ran"; echo error; fi; ' \
+              'cat "$1"'
+
+
+def _write_tests(base_dir):
+    write_tests(base_dir, {os.path.join('tests', test_name + '.c'): test_name + '\n'
+                           for test_name in ('success', 'fail', 'flaky')})
+    return os.path.join(str(base_dir), 'tests')
+
+
+def _run(base_dir, test_dir):
+    log_path = os.path.join(str(base_dir), 'tool')
+    if os.path.exists(log_path + '.log'):
+        os.remove(log_path + '.log')
+    test_results = dict()
+    runner = create_runner(test_dir, ['sh', '-c', TOOL_SCRIPT, log_path], dump_results_to_files=False,
+                           result_cache_dir=os.path.join(str(base_dir), 'cache'), retries=1,
+                           flakiness_history_file_path=os.path.join(str(base_dir), 'flakiness.json'),
+                           test_result_callback=lambda _, test_result: test_results.__setitem__(
+                               test_result.test_filename, test_result.result_type))
+    runner.run()
+    with open(log_path + '.log') as log_file:
+        run_tests = sorted(os.path.basename(line.strip()) for line in log_file)
+    return test_results, run_tests
+
+
+def test_retries_skip_result_cache(tmp_path):
+    test_dir = _write_tests(tmp_path)
+    test_results, run_tests = _run(tmp_path, test_dir)
+    assert test_results == {'success.c': RunResult.ResultType.SUCCESS, 'fail.c': RunResult.ResultType.FAIL,
+                            'flaky.c': RunResult.ResultType.FLAKY}
+    assert run_tests == ['fail.c', 'fail.c', 'flaky.c', 'flaky.c', 'success.c']
+
+    # Cached failure is retried, flaky result was not cached
+    test_results, run_tests = _run(tmp_path, test_dir)
+    assert test_results == {'success.c': RunResult.ResultType.SUCCESS, 'fail.c': RunResult.ResultType.FAIL,
+                            'flaky.c': RunResult.ResultType.SUCCESS}
+    assert run_tests == ['fail.c', 'flaky.c']
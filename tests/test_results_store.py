@@ -0,0 +1,104 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from ctestgen.runner import TestResultsStore as ResultsStore, TestRunResult as RunResult
+
+from conftest import create_runner, write_tests
+
+# Prints a lot before contents of tests, that contain "long"
+TOOL_SCRIPT = 'if grep -q long "$1"; then seq 1000; fi; cat "$1"'
+
+TESTS = {'a.c': 'test a\n', 'b.c': 'error b\n', 'c.c': 'test c long\n', 'd.c': 'error d long\n', 'e.c': 'test e\n'}
+
+
+@pytest.fixture
+def results_store(tmp_path):
+    results_store = ResultsStore(os.path.join(str(tmp_path), 'results.db'))
+    yield results_store
+    results_store.close()
+
+
+def _add_results(results_store, run_id, start_time, results):
+    results_store.add_run(run_id, start_time=start_time)
+    for test_key, (result_type, duration) in results.items():
+        results_store.add_test_result(run_id, test_key, 'dir', RunResult(result_type, '', test_key, duration))
+    results_store.flush()
+
+
+def test_diff(results_store):
+    success, fail = RunResult.ResultType.SUCCESS, RunResult.ResultType.FAIL
+    _add_results(results_store, 'a', datetime(2020, 1, 1), {
+        'failing.c': (success, 1.0), 'passing.c': (fail, 1.0), 'slow.c': (success, 1.0),
+        'noisy.c': (success, 1.0), 'fast.c': (fail, 0.01)})
+    _add_results(results_store, 'b', datetime(2020, 1, 2), {
+        'failing.c': (RunResult.ResultType.TIMEOUT, 1.0), 'passing.c': (success, 1.0), 'slow.c': (success, 2.0),
+        'noisy.c': (success, 1.2), 'fast.c': (fail, 0.05), 'new.c': (fail, 1.0)})
+    results_diff = results_store.diff('a', 'b')
+    assert results_diff.newly_failing == ['failing.c']
+    assert results_diff.newly_passing == ['passing.c']
+    # Only tests, that are both 1.5 times and 0.1s slower
+    assert results_diff.slowed_down == [('slow.c', 1.0, 2.0)]
+
+
+def test_test_history_is_in_order_of_runs(results_store):
+    success, fail = RunResult.ResultType.SUCCESS, RunResult.ResultType.FAIL
+    _add_results(results_store, 'second', datetime(2020, 1, 2), {'test.c': (fail, 2.0)})
+    _add_results(results_store, 'first', datetime(2020, 1, 1), {'test.c': (success, 1.0), 'other.c': (fail, 1.0)})
+    assert results_store.get_test_history('test.c') == [('first', 'SUCCESS', 1.0), ('second', 'FAIL', 2.0)]
+
+
+def _get_stored_results(results_store_path):
+    results_store = ResultsStore(results_store_path)
+    try:
+        run_ids = [run[0] for run in results_store.get_runs()]
+        assert len(run_ids) == 1
+        return {row[1]: row for row in results_store.get_test_results(run_ids[0])}
+    finally:
+        results_store.close()
+
+
+def test_resumed_run_replaces_results(tmp_path):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), TESTS)
+    results_store_path = os.path.join(str(tmp_path), 'results.db')
+    completed_tests = []
+
+    def interrupt(test_dir, test_result):
+        completed_tests.append(test_result.test_filename)
+        if len(completed_tests) == 3:
+            raise KeyboardInterrupt()
+    runner = create_runner(test_base_dir, results_store_path=results_store_path, test_result_callback=interrupt,
+                           output_base_dir=os.path.join(str(tmp_path), 'out'))
+    with pytest.raises(KeyboardInterrupt):
+        runner.run()
+    assert len(_get_stored_results(results_store_path)) in (2, 3)
+
+    # Replayed results are stored again in the same run
+    create_runner(test_base_dir, results_store_path=results_store_path, resume=runner.output_dir).run()
+    stored_results = _get_stored_results(results_store_path)
+    assert sorted(stored_results.keys()) == sorted(TESTS.keys())
+    for test_key, stored_result in stored_results.items():
+        assert stored_result[4] == ('FAIL' if 'error' in TESTS[test_key] else 'SUCCESS')
+
+
+def test_outputs_are_referenced(tmp_path):
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), TESTS)
+    results_store_path = os.path.join(str(tmp_path), 'results.db')
+    runner = create_runner(test_base_dir, ['sh', '-c', TOOL_SCRIPT, 'sh'], results_store_path=results_store_path,
+                           output_capture_limit=1000, output_base_dir=os.path.join(str(tmp_path), 'out'))
+    runner.run()
+
+    for test_key, stored_result in _get_stored_results(results_store_path).items():
+        output_file_path, output_offset = stored_result[9:]
+        with open(output_file_path, 'rb') as output_file:
+            if 'long' in TESTS[test_key]:
+                # Output was cut in outputs file
+                assert output_file_path == os.path.join(runner.output_dir, 'outputs', test_key + '.stdout')
+                assert output_offset is None
+                assert output_file.read().decode().endswith(TESTS[test_key])
+            else:
+                assert os.path.basename(output_file_path) == ('fail.txt' if 'error' in TESTS[test_key]
+                                                              else 'success.txt')
+                output_file.seek(output_offset)
+                assert output_file.read().decode().splitlines()[:2] == ['Test: ' + test_key, TESTS[test_key][:-1]]
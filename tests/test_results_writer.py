@@ -0,0 +1,33 @@
+import os
+
+from ctestgen.runner import TestResultsWriter as ResultsWriter, TestRunResult as RunResult
+
+
+def _read(file_path):
+    with open(file_path) as output_file:
+        return output_file.read()
+
+
+def test_deduplicates_large_outputs_within_file(tmp_path):
+    successful_path = os.path.join(str(tmp_path), 'success.txt')
+    failed_path = os.path.join(str(tmp_path), 'fail.txt')
+    writer = ResultsWriter(successful_path, failed_path, os.path.join(str(tmp_path), 'results.json'),
+                           deduplicate_outputs_min_size=10)
+    large_output = 'x' * 20
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, large_output, 'a.c'))
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, large_output, 'b.c'))
+    writer.write('dir', RunResult(RunResult.ResultType.SUCCESS, large_output, 'c.c'))
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, 'small', 'd.c'))
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, 'small', 'e.c'))
+    # Outputs, that differ only in a scrubbed part, are not the same
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, 'crash at 0x1234', 'f.c'))
+    writer.write('dir', RunResult(RunResult.ResultType.FAIL, 'crash at 0xabcd', 'g.c'))
+    writer.close()
+
+    assert _read(failed_path) == '\nTest: a.c\n' + large_output + '\n' + \
+                                 '\nTest: b.c\nSame output as ' + os.path.join('dir', 'a.c') + '\n' + \
+                                 '\nTest: d.c\nsmall\n' + \
+                                 '\nTest: e.c\nsmall\n' + \
+                                 '\nTest: f.c\ncrash at 0x1234\n' + \
+                                 '\nTest: g.c\ncrash at 0xabcd\n'
+    assert _read(successful_path) == '\nTest: c.c\n' + large_output + '\n'
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from ctestgen.runner import TestDurationHistory as DurationHistory
+
+from conftest import create_runner, write_tests
+
+TESTS = {'a.c': 'test a\n', 'b.c': 'error b\n', 'c.c': 'test c\n', 'd.c': 'error d\n', 'e.c': 'test e\n'}
+
+
+class RunInterrupted(Exception):
+    pass
+
+
+def _interrupt_after(results_count):
+    completed_tests = []
+
+    def test_result_callback(test_dir, test_result):
+        completed_tests.append(test_result.test_filename)
+        if len(completed_tests) == results_count:
+            raise RunInterrupted()
+    return test_result_callback
+
+
+def _read_outputs(output_dir):
+    outputs = dict()
+    for output_filename in ('success.txt', 'fail.txt'):
+        with open(os.path.join(output_dir, output_filename)) as output_file:
+            outputs[output_filename] = output_file.read()
+    with open(os.path.join(output_dir, 'results.json')) as results_file:
+        results = json.load(results_file)
+    # Durations differ between runs
+    results.pop('resource_usage')
+    results.pop('resource_usage_histograms')
+    outputs['results.json'] = results
+    return outputs
+
+
+@pytest.fixture
+def run_dirs(tmp_path):
+    """
+    Returns tests dir and outputs of run of all its tests without interruption.
+    """
+    test_base_dir = write_tests(os.path.join(str(tmp_path), 'tests'), TESTS)
+    runner = create_runner(test_base_dir, output_base_dir=os.path.join(str(tmp_path), 'full'))
+    runner.run()
+    return test_base_dir, _read_outputs(runner.output_dir)
+
+
+def _run_interrupted(tmp_path, test_base_dir, results_count, **kwargs):
+    runner = create_runner(test_base_dir, output_base_dir=os.path.join(str(tmp_path), 'interrupted'),
+                           test_result_callback=_interrupt_after(results_count), **kwargs)
+    with pytest.raises(RunInterrupted):
+        runner.run()
+    return runner.output_dir
+
+
+def test_resumed_run_is_same_as_uninterrupted(tmp_path, run_dirs):
+    test_base_dir, full_outputs = run_dirs
+    output_dir = _run_interrupted(tmp_path, test_base_dir, 2)
+    run_tests = []
+    create_runner(test_base_dir, resume=output_dir,
+                  test_result_callback=lambda _, test_result: run_tests.append(test_result.test_filename)).run()
+    assert sorted(run_tests) == sorted(TESTS.keys())
+    assert _read_outputs(output_dir) == full_outputs
+    assert not os.path.exists(os.path.join(output_dir, 'journal.jsonl'))
+
+
+def test_resume_ignores_torn_journal_line(tmp_path, run_dirs):
+    test_base_dir, full_outputs = run_dirs
+    output_dir = _run_interrupted(tmp_path, test_base_dir, 3)
+    with open(os.path.join(output_dir, 'journal.jsonl'), 'ab') as journal_file:
+        journal_file.write(b'{"test_dir": "' + test_base_dir.encode())
+    create_runner(test_base_dir, resume=output_dir).run()
+    assert _read_outputs(output_dir) == full_outputs
+
+
+def test_resume_after_max_failures(tmp_path, run_dirs):
+    test_base_dir, full_outputs = run_dirs
+    runner = create_runner(test_base_dir, output_base_dir=os.path.join(str(tmp_path), 'stopped'), max_failures=1)
+    runner.run()
+    not_run_tests_count = runner.not_run_tests_count
+    assert not_run_tests_count != 0
+
+    # Replayed failure stops the run again
+    runner = create_runner(test_base_dir, resume=runner.output_dir, max_failures=1)
+    runner.run()
+    assert runner.not_run_tests_count == not_run_tests_count
+
+    runner = create_runner(test_base_dir, resume=runner.output_dir)
+    runner.run()
+    assert runner.not_run_tests_count == 0
+    assert _read_outputs(runner.output_dir) == full_outputs
+
+
+def test_replayed_results_do_not_update_duration_history(tmp_path, run_dirs, monkeypatch):
+    test_base_dir, _ = run_dirs
+    duration_history_file_path = os.path.join(str(tmp_path), 'durations.json')
+    output_dir = _run_interrupted(tmp_path, test_base_dir, 2, schedule_by_duration=True,
+                                  duration_history_file_path=duration_history_file_path)
+    with open(os.path.join(output_dir, 'journal.jsonl')) as journal_file:
+        replayed_tests = [json.loads(line)['test_filename'] for line in journal_file]
+    updated_tests = []
+    history_update = DurationHistory.update
+
+    def update(history, test_key, duration):
+        updated_tests.append(test_key)
+        history_update(history, test_key, duration)
+    monkeypatch.setattr(DurationHistory, 'update', update)
+    create_runner(test_base_dir, resume=output_dir, schedule_by_duration=True,
+                  duration_history_file_path=duration_history_file_path).run()
+    assert len(replayed_tests) == 2
+    assert sorted(updated_tests + replayed_tests) == sorted(TESTS.keys())
@@ -0,0 +1,99 @@
+import os
+import sys
+
+from ctestgen.runner import ServerTestRunner, TestRunResult as RunResult
+
+ECHO_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'echo_server.py')
+
+
+class EchoTestRunner(ServerTestRunner):
+    def _process_program_response(self, test_dir, test_filename, program_response):
+        return RunResult(RunResult.ResultType.SUCCESS, program_response[0], test_filename)
+
+
+def _write_tests(test_dir, tests_contents):
+    for test_idx, test_contents in enumerate(tests_contents):
+        with open(os.path.join(str(test_dir), 'test_' + str(test_idx) + '.c'), 'w') as test_file:
+            test_file.write(test_contents)
+
+
+def _create_runner(test_dir, **kwargs):
+    return EchoTestRunner([sys.executable, ECHO_SERVER_PATH], str(test_dir), print_test_info=False,
+                          dump_results_to_files=False, schedule_by_duration=False, **kwargs)
+
+
+def _get_server_pid(test_result):
+    return test_result.test_output.split()[1]
+
+
+def test_server_is_reused(tmp_path):
+    _write_tests(tmp_path, ['a', 'b', 'c'])
+    runner = _create_runner(tmp_path)
+    try:
+        test_results = [runner._on_test(str(tmp_path), 'test_' + str(test_idx) + '.c', runner._get_env())
+                        for test_idx in range(3)]
+    finally:
+        runner._stop_tool_server()
+    assert [test_result.test_output.split('\n')[1] for test_result in test_results] == ['a', 'b', 'c']
+    assert len(set(_get_server_pid(test_result) for test_result in test_results)) == 1
+
+
+def test_server_is_restarted_after_crash(tmp_path):
+    _write_tests(tmp_path, ['a', 'crash', 'b'])
+    runner = _create_runner(tmp_path)
+    try:
+        test_results = [runner._on_test(str(tmp_path), 'test_' + str(test_idx) + '.c', runner._get_env())
+                        for test_idx in range(3)]
+    finally:
+        runner._stop_tool_server()
+    assert [test_result.result_type for test_result in test_results] == [RunResult.ResultType.SUCCESS] * 3
+    assert 'crash' in test_results[1].test_output
+    assert _get_server_pid(test_results[0]) != _get_server_pid(test_results[1])
+    assert _get_server_pid(test_results[1]) == _get_server_pid(test_results[2])
+
+
+def test_crashes_over_retries_fail_test(tmp_path):
+    _write_tests(tmp_path, ['crash'])
+    runner = _create_runner(tmp_path, crash_retries=0)
+    try:
+        test_result = runner._on_test(str(tmp_path), 'test_0.c', runner._get_env())
+    finally:
+        runner._stop_tool_server()
+    assert test_result.result_type == RunResult.ResultType.FAIL
+
+
+def test_server_is_recycled(tmp_path):
+    _write_tests(tmp_path, ['a', 'b', 'c', 'd', 'e'])
+    runner = _create_runner(tmp_path, max_requests_per_server=2)
+    try:
+        test_results = [runner._on_test(str(tmp_path), 'test_' + str(test_idx) + '.c', runner._get_env())
+                        for test_idx in range(5)]
+    finally:
+        runner._stop_tool_server()
+    server_pids = [_get_server_pid(test_result) for test_result in test_results]
+    assert server_pids[0] == server_pids[1] != server_pids[2] == server_pids[3] != server_pids[4]
+    assert [test_result.test_output.split()[3] for test_result in test_results] == ['1', '2', '1', '2', '1']
+
+
+def test_server_timeout(tmp_path):
+    _write_tests(tmp_path, ['sleep', 'a'])
+    runner = _create_runner(tmp_path, timeout=0.5)
+    try:
+        timeout_result = runner._on_test(str(tmp_path), 'test_0.c', runner._get_env())
+        next_result = runner._on_test(str(tmp_path), 'test_1.c', runner._get_env())
+    finally:
+        runner._stop_tool_server()
+    assert timeout_result.result_type == RunResult.ResultType.TIMEOUT
+    assert next_result.result_type == RunResult.ResultType.SUCCESS
+    assert next_result.test_output.split('\n')[1] == 'a'
+
+
+def test_run_with_pool(tmp_path):
+    _write_tests(tmp_path, ['a', 'crash', 'b', 'c'])
+    test_results = []
+    runner = _create_runner(tmp_path, max_workers=2, print_run_progress=False, print_global_metrics=False,
+                            print_testsets_metrics=False, test_result_callback=lambda test_dir, test_result:
+                            test_results.append(test_result))
+    runner.run()
+    assert len(test_results) == 4
+    assert runner.global_metrics.successful_count == 4